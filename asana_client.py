@@ -1,12 +1,29 @@
-import os, logging
+import os, re, logging
 import requests
-from datetime import datetime, timedelta
+import rate_limit
+from datetime import date, timedelta
+from functools import lru_cache
 from utils import send_slack
+from metrics import track_upstream
 from dotenv import load_dotenv
 
 load_dotenv()
 
 ASANA_PAT = os.getenv('ASANA_PERSONAL_ACCESS_TOKEN')
+ASANA_API_URL = os.getenv('ASANA_API_URL', 'https://app.asana.com/api/1.0')
+
+def _asana_request(route, path, **kwargs):
+    """
+    Llamada a la API de Asana; `route` es la etiqueta de la métrica
+    ('GET /tasks/{gid}'). Espera el límite de tasa, la mide y si es un 429
+    pausa el límite por el Retry-After
+    """
+    rate_limit.acquire('asana', route)
+    with track_upstream('asana', route) as call:
+        response = requests.request(route.split(' ', 1)[0], f'{ASANA_API_URL}{path}', **kwargs)
+        call.status = response.status_code
+    rate_limit.after_response('asana', route, response)
+    return response
 
 def create_asana_task(name, assignee_email, project_id, due_on=None, description=None, subtasks=None, assignee_gid=None):
     logging.info("Args received:")
@@ -54,11 +71,7 @@ def create_asana_task(name, assignee_email, project_id, due_on=None, description
         except Exception as e:
             logging.error(f"❌ Error parsing date '{due_on}': {str(e)}")
     
-    response = requests.post(
-        'https://app.asana.com/api/1.0/tasks',
-        headers=headers,
-        json=task_data
-    )
+    response = _asana_request('POST /tasks', '/tasks', headers=headers, json=task_data)
     
     if response.status_code == 201:
         task = response.json()['data']
@@ -94,11 +107,7 @@ def create_subtask(parent_task_gid, name, assignee_gid=None):
     if assignee_gid:
         subtask_data['data']['assignee'] = assignee_gid
     
-    response = requests.post(
-        'https://app.asana.com/api/1.0/tasks',
-        headers=headers,
-        json=subtask_data
-    )
+    response = _asana_request('POST /tasks', '/tasks', headers=headers, json=subtask_data)
     
     if response.status_code != 201:
         logging.error(f"Error creating subtask: {response.status_code} - {response.text}")
@@ -121,10 +130,7 @@ def get_user_by_email(email):
         return None
     
     # Intentar buscar por email exacto
-    response = requests.get(
-        f'https://app.asana.com/api/1.0/workspaces/{workspace_gid}/users',
-        headers=headers
-    )
+    response = _asana_request('GET /workspaces/{gid}/users', f'/workspaces/{workspace_gid}/users', headers=headers)
     
     if response.status_code == 200:
         all_users = response.json()['data']
@@ -132,10 +138,7 @@ def get_user_by_email(email):
         
         # Buscar coincidencia exacta por email
         for user in all_users:
-            user_detail = requests.get(
-                f'https://app.asana.com/api/1.0/users/{user["gid"]}',
-                headers=headers
-            )
+            user_detail = _asana_request('GET /users/{gid}', f'/users/{user["gid"]}', headers=headers)
             if user_detail.status_code == 200:
                 user_data = user_detail.json()['data']
                 if user_data.get('email', '').lower() == email.lower():
@@ -149,10 +152,7 @@ def get_workspace_gid():
         'Authorization': f'Bearer {ASANA_PAT}'
     }
     
-    response = requests.get(
-        'https://app.asana.com/api/1.0/workspaces',
-        headers=headers
-    )
+    response = _asana_request('GET /workspaces', '/workspaces', headers=headers)
     
     if response.status_code == 200:
         workspaces = response.json()['data']
@@ -161,106 +161,139 @@ def get_workspace_gid():
     
     raise Exception("No workspace found")
 
+# --------------------------------------------------------------------
+# Parseo de fechas: tablas precalculadas + una sola regex combinada
+# --------------------------------------------------------------------
+# Expresiones relativas -> días desde hoy
+_RELATIVE_DAYS = {
+    'hoy': 0, 'today': 0,
+    'mañana': 1, 'manana': 1, 'tomorrow': 1,
+    'pasado mañana': 2, 'pasado manana': 2, 'day after tomorrow': 2,
+    'ayer': -1, 'yesterday': -1,
+    'próxima semana': 7, 'proxima semana': 7, 'semana que viene': 7,
+    'la semana que viene': 7, 'next week': 7,
+}
+
+# Expresiones relativas al día de la semana -> día objetivo (0 = lunes)
+# Se resuelven a la próxima ocurrencia dentro de esta semana (puede ser hoy)
+_WEEK_ANCHORS = {
+    'esta semana': 4, 'this week': 4,  # Viernes de esta semana
+    'fin de semana': 5, 'este fin de semana': 5, 'weekend': 5, 'this weekend': 5,  # Sábado más cercano
+}
+
+_WEEKDAYS = {
+    'lunes': 0, 'monday': 0,
+    'martes': 1, 'tuesday': 1,
+    'miércoles': 2, 'miercoles': 2, 'wednesday': 2,
+    'jueves': 3, 'thursday': 3,
+    'viernes': 4, 'friday': 4,
+    'sábado': 5, 'sabado': 5, 'saturday': 5,
+    'domingo': 6, 'sunday': 6,
+}
+
+_MONTHS = {
+    'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4, 'mayo': 5, 'junio': 6,
+    'julio': 7, 'agosto': 8, 'septiembre': 9, 'setiembre': 9, 'octubre': 10,
+    'noviembre': 11, 'diciembre': 12,
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+}
+
+
+def _alternation(words):
+    # Más largas primero para que "pasado mañana" gane sobre "mañana"
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_MONTH_RE = _alternation(_MONTHS)
+_DATE_RE = re.compile(
+    r'(?<!\w)(?:'
+    r'(?P<in_n>(?:en|dentro\s+de|in)\s+(?P<n>\d+)\s+(?P<unit>d[ií]as?|days?|semanas?|weeks?))'
+    r'|(?P<iso>(?P<iy>\d{4})[-/](?P<im>\d{1,2})[-/](?P<id>\d{1,2}))'
+    r'|(?P<num>(?P<na>\d{1,2})[-/](?P<nb>\d{1,2})(?:[-/](?P<ny>\d{4}|\d{2}))?)'
+    r'|(?P<dmon>(?P<dd>\d{1,2})\s+(?:de\s+)?(?P<dm>' + _MONTH_RE + r')(?:\s+(?:de\s+|del\s+)?(?P<dy>\d{4}))?)'
+    r'|(?P<mond>(?P<mm>' + _MONTH_RE + r')\s+(?P<md>\d{1,2})(?:,?\s+(?P<my>\d{4}))?)'
+    r'|(?P<next_wd>(?:el\s+)?(?:pr[oó]ximo|next)\s+(?P<nwd>' + _alternation(_WEEKDAYS) + r'))'
+    r'|(?P<rel>' + _alternation(_RELATIVE_DAYS) + r')'
+    r'|(?P<anchor>' + _alternation(_WEEK_ANCHORS) + r')'
+    r'|(?P<wd>' + _alternation(_WEEKDAYS) + r')'
+    r')(?!\w)'
+)
+
+
+def _safe_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _next_yearless(today, month, day):
+    """Fecha sin año: este año, o el próximo si ya pasó"""
+    result = _safe_date(today.year, month, day)
+    if result and result < today:
+        result = _safe_date(today.year + 1, month, day)
+    return result
+
+
+def _full_year(year):
+    year = int(year)
+    return year + 2000 if year < 100 else year
+
+
+def _resolve(m, today):
+    kind = m.lastgroup
+    if kind == 'rel':
+        return today + timedelta(days=_RELATIVE_DAYS[m.group('rel')])
+    if kind in ('wd', 'next_wd'):
+        target = _WEEKDAYS[m.group('wd') or m.group('nwd')]
+        # Siempre el próximo, nunca hoy
+        return today + timedelta(days=(target - today.weekday()) % 7 or 7)
+    if kind == 'anchor':
+        return today + timedelta(days=(_WEEK_ANCHORS[m.group('anchor')] - today.weekday()) % 7)
+    if kind == 'in_n':
+        n = int(m.group('n'))
+        weeks = m.group('unit').startswith(('semana', 'week'))
+        return today + timedelta(days=n * 7 if weeks else n)
+    if kind == 'iso':
+        return _safe_date(int(m.group('iy')), int(m.group('im')), int(m.group('id')))
+    if kind == 'num':
+        a, b = int(m.group('na')), int(m.group('nb'))
+        year = m.group('ny')
+        # Día/mes primero; si no es válido, mes/día (formato US)
+        for day, month in ((a, b), (b, a)):
+            result = _safe_date(_full_year(year), month, day) if year else _next_yearless(today, month, day)
+            if result:
+                return result
+        return None
+    if kind == 'dmon':
+        month, day, year = _MONTHS[m.group('dm')], int(m.group('dd')), m.group('dy')
+    else:
+        month, day, year = _MONTHS[m.group('mm')], int(m.group('md')), m.group('my')
+    return _safe_date(int(year), month, day) if year else _next_yearless(today, month, day)
+
+
+@lru_cache(maxsize=2048)
+def _parse_date_on(date_lower, today):
+    m = _DATE_RE.search(date_lower)
+    if not m:
+        return None
+    result = _resolve(m, today)
+    return result.strftime('%Y-%m-%d') if result else None
+
+
 def parse_date(date_str):
     """
     Parsea una fecha que puede ser:
-    - Una fecha en formato ISO o común
-    - Una fecha relativa como "hoy", "mañana", etc.
+    - Una fecha en formato ISO o común (2025-08-15, 15/08/2025, 08/15/2025, 15/08)
+    - Una fecha con nombre de mes ("15 de agosto", "agosto 15", "august 15, 2025")
+    - Una fecha relativa como "hoy", "mañana", "pasado mañana", "viernes",
+      "próximo lunes", "en 3 días", "en 2 semanas", "next week"
+    El resultado se memoiza por (expresión, día).
     """
     if not date_str:
         return None
-    
-    # Convertir a minúsculas para comparación
-    date_lower = date_str.lower().strip()
-    
-    # Obtener fecha actual
-    today = datetime.now()
-    
-    # Diccionario de fechas relativas en español
-    relative_dates = {
-        'hoy': today,
-        'today': today,
-        'mañana': today + timedelta(days=1),
-        'manana': today + timedelta(days=1),
-        'tomorrow': today + timedelta(days=1),
-        'pasado mañana': today + timedelta(days=2),
-        'pasado manana': today + timedelta(days=2),
-        'ayer': today - timedelta(days=1),
-        'yesterday': today - timedelta(days=1),
-        'esta semana': today + timedelta(days=(4 - today.weekday()) % 7),  # Viernes de esta semana
-        'próxima semana': today + timedelta(days=7),
-        'proxima semana': today + timedelta(days=7),
-        'next week': today + timedelta(days=7),
-        'fin de semana': today + timedelta(days=(5 - today.weekday()) % 7),  # Sábado más cercano
-        'lunes': today + timedelta(days=(0 - today.weekday()) % 7),
-        'martes': today + timedelta(days=(1 - today.weekday()) % 7),
-        'miércoles': today + timedelta(days=(2 - today.weekday()) % 7),
-        'miercoles': today + timedelta(days=(2 - today.weekday()) % 7),
-        'jueves': today + timedelta(days=(3 - today.weekday()) % 7),
-        'viernes': today + timedelta(days=(4 - today.weekday()) % 7),
-        'sábado': today + timedelta(days=(5 - today.weekday()) % 7),
-        'sabado': today + timedelta(days=(5 - today.weekday()) % 7),
-        'domingo': today + timedelta(days=(6 - today.weekday()) % 7),
-    }
-    
-    # Verificar si es una fecha relativa
-    for key, value in relative_dates.items():
-        if key in date_lower:
-            # Si el día ya pasó esta semana, asumimos la próxima semana
-            result_date = value
-            if key in ['lunes', 'martes', 'miércoles', 'miercoles', 'jueves', 'viernes', 'sábado', 'sabado', 'domingo']:
-                if result_date.date() <= today.date():
-                    result_date = result_date + timedelta(days=7)
-            return result_date.strftime('%Y-%m-%d')
-    
-    # Verificar patrones como "en X días"
-    import re
-    days_pattern = re.match(r'en (\d+) días?', date_lower)
-    if days_pattern:
-        days = int(days_pattern.group(1))
-        return (today + timedelta(days=days)).strftime('%Y-%m-%d')
-    
-    # Intentar parsear formatos de fecha tradicionales
-    date_formats = [
-        '%Y-%m-%d',
-        '%d/%m/%Y',
-        '%d-%m-%Y',
-        '%m/%d/%Y',
-        '%m-%d-%Y',
-        '%d/%m/%y',
-        '%d-%m-%y',
-        '%Y/%m/%d',
-        '%d de %B',  # "15 de agosto"
-        '%d %B',      # "15 agosto"
-    ]
-    
-    # Mapeo de meses en español
-    spanish_months = {
-        'enero': 'January', 'febrero': 'February', 'marzo': 'March',
-        'abril': 'April', 'mayo': 'May', 'junio': 'June',
-        'julio': 'July', 'agosto': 'August', 'septiembre': 'September',
-        'octubre': 'October', 'noviembre': 'November', 'diciembre': 'December'
-    }
-    
-    # Reemplazar meses en español por inglés para el parsing
-    date_str_en = date_str
-    for spanish, english in spanish_months.items():
-        date_str_en = date_str_en.replace(spanish, english)
-    
-    for fmt in date_formats:
-        try:
-            parsed_date = datetime.strptime(date_str_en, fmt)
-            # Si no tiene año, asumimos el año actual
-            if '%Y' not in fmt and '%y' not in fmt:
-                parsed_date = parsed_date.replace(year=today.year)
-                # Si la fecha ya pasó este año, asumimos el próximo año
-                if parsed_date.date() < today.date():
-                    parsed_date = parsed_date.replace(year=today.year + 1)
-            return parsed_date.strftime('%Y-%m-%d')
-        except ValueError:
-            continue
-    
-    return None
+    return _parse_date_on(' '.join(date_str.lower().split()), date.today())
 
 def delete_asana_task(task_gid):
     """Elimina una tarea de Asana"""
@@ -268,10 +301,7 @@ def delete_asana_task(task_gid):
         'Authorization': f'Bearer {ASANA_PAT}'
     }
     
-    response = requests.delete(
-        f'https://app.asana.com/api/1.0/tasks/{task_gid}',
-        headers=headers
-    )
+    response = _asana_request('DELETE /tasks/{gid}', f'/tasks/{task_gid}', headers=headers)
     
     if response.status_code == 200:
         logging.info(f"Tarea {task_gid} eliminada exitosamente")
@@ -280,19 +310,107 @@ def delete_asana_task(task_gid):
         logging.error(f"Error eliminando tarea: {response.status_code} - {response.text}")
         raise Exception(f"Error eliminando tarea: {response.status_code}")
 
+def update_asana_task(task_gid, name=None, due_on=None, notes=None):
+    """Actualiza nombre, fecha límite y/o notas de una tarea existente"""
+    headers = {
+        'Authorization': f'Bearer {ASANA_PAT}',
+        'Content-Type': 'application/json'
+    }
+    
+    data = {}
+    if name:
+        data['name'] = name
+    if notes:
+        data['notes'] = notes
+    if due_on:
+        parsed_date = parse_date(due_on)
+        if parsed_date:
+            data['due_on'] = parsed_date
+        else:
+            logging.warning(f"⚠️ Could not parse date: '{due_on}'")
+    if not data:
+        return True
+    
+    response = _asana_request('PUT /tasks/{gid}', f'/tasks/{task_gid}', headers=headers, json={'data': data})
+    
+    if response.status_code == 200:
+        logging.info(f"Tarea {task_gid} actualizada: {sorted(data)}")
+        return True
+    else:
+        logging.error(f"Error actualizando tarea: {response.status_code} - {response.text}")
+        raise Exception(f"Error actualizando tarea: {response.status_code}")
+
 def get_task_details(task_gid):
     """Obtiene los detalles de una tarea de Asana"""
     headers = {
         'Authorization': f'Bearer {ASANA_PAT}'
     }
     
-    response = requests.get(
-        f'https://app.asana.com/api/1.0/tasks/{task_gid}',
-        headers=headers
-    )
+    response = _asana_request('GET /tasks/{gid}', f'/tasks/{task_gid}', headers=headers)
     
     if response.status_code == 200:
         return response.json()['data']
     else:
         logging.error(f"Error obteniendo detalles de tarea: {response.status_code} - {response.text}")
-        return None
\ No newline at end of file
+        return None
+
+
+def get_task_completion(task_gid):
+    """
+    Estado de completado de una tarea: {'gid', 'completed'}, o None si la
+    tarea ya no existe en Asana (404). Otros errores levantan excepción.
+    """
+    headers = {
+        'Authorization': f'Bearer {ASANA_PAT}'
+    }
+
+    response = _asana_request('GET /tasks/{gid}', f'/tasks/{task_gid}', headers=headers, params={'opt_fields': 'completed'})
+
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise Exception(f"Error obteniendo tarea {task_gid}: {response.status_code} - {response.text}")
+    return response.json()['data']
+
+
+def get_project_tasks(project_id, opt_fields='completed', limit=100):
+    """Todas las tareas de un proyecto con `opt_fields`, paginando de a `limit`"""
+    headers = {
+        'Authorization': f'Bearer {ASANA_PAT}'
+    }
+    params = {'project': project_id, 'opt_fields': opt_fields, 'limit': limit}
+    tasks = []
+    while True:
+        response = _asana_request('GET /tasks', '/tasks', headers=headers, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Error listando tareas del proyecto {project_id}: {response.status_code} - {response.text}")
+        body = response.json()
+        tasks.extend(body.get('data', []))
+        next_page = body.get('next_page') or {}
+        if not next_page.get('offset'):
+            return tasks
+        params['offset'] = next_page['offset']
+
+
+def get_project_events(project_id, sync=None):
+    """
+    Eventos del proyecto desde el sync token `sync` (API /events de Asana).
+    Devuelve (events, sync, has_more). Sin token, o con uno vencido, Asana
+    responde 412 con un token nuevo: en ese caso events es None y quien llama
+    tiene que resincronizar el proyecto entero.
+    """
+    headers = {
+        'Authorization': f'Bearer {ASANA_PAT}'
+    }
+    params = {'resource': project_id}
+    if sync:
+        params['sync'] = sync
+
+    response = _asana_request('GET /events', '/events', headers=headers, params=params)
+
+    body = response.json() if response.content else {}
+    if response.status_code == 412:
+        return None, body.get('sync'), False
+    if response.status_code != 200:
+        raise Exception(f"Error obteniendo eventos del proyecto {project_id}: {response.status_code} - {response.text}")
+    return body.get('data', []), body.get('sync'), body.get('has_more', False)
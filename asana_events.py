@@ -0,0 +1,157 @@
+"""
+Procesamiento asíncrono de los eventos que llegan por el webhook de Asana.
+
+El endpoint solo encola el lote y responde 200 de inmediato; un worker en
+background agrupa los eventos por tarea, descarta las reentregas de Asana
+y dispara las llamadas a Slack en paralelo.
+
+Asana ya recibió el 200, así que un lote encolado no vuelve a llegar: al
+apagar, drain() devuelve los lotes y las notificaciones que todavía no
+empezaron para que sigan en la próxima instancia (lifecycle.py).
+"""
+
+import os
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+# Ventana durante la cual se juntan lotes consecutivos antes de procesarlos
+BATCH_WINDOW = float(os.getenv('ASANA_WEBHOOK_BATCH_WINDOW', '0.2'))
+# Cantidad máxima de tareas notificadas a Slack en paralelo
+MAX_WORKERS = int(os.getenv('ASANA_WEBHOOK_MAX_WORKERS', '8'))
+# Cantidad de eventos recordados para detectar reentregas
+SEEN_EVENTS_LIMIT = 5000
+
+
+def event_key(event):
+    """Clave estable de un evento de Asana, igual entre reentregas"""
+    change = event.get('change') or {}
+    new_value = change.get('new_value') or {}
+    return (
+        (event.get('resource') or {}).get('gid'),
+        event.get('action'),
+        change.get('field'),
+        new_value.get('resource_subtype'),
+        event.get('created_at'),
+    )
+
+
+def is_completion_change(event):
+    """True si el evento es un cambio del campo `completed` de una tarea"""
+    if event.get('action') != 'changed':
+        return False
+    if (event.get('resource') or {}).get('resource_type') != 'task':
+        return False
+    return 'completed' in (event.get('change') or {}).get('field', '')
+
+
+class AsanaEventWorker:
+    """Cola + worker que procesa los lotes del webhook de Asana"""
+
+    def __init__(self, on_task_completed, batch_window=BATCH_WINDOW, max_workers=MAX_WORKERS):
+        self._on_task_completed = on_task_completed
+        self._batch_window = batch_window
+        self._queue = queue.Queue()
+        self._seen = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asana-events')
+        # id -> (task_gid, event); notificaciones enviadas al pool que no empezaron
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='asana-events-worker')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def enqueue(self, events):
+        """Encola un lote de eventos; no bloquea"""
+        if not events:
+            return
+        self.start()
+        self._queue.put(list(events))
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def drain(self):
+        """
+        Saca los lotes encolados y las notificaciones que no empezaron
+        (apagado); devuelve (lotes, [(task_gid, event)])
+        """
+        batches = []
+        while True:
+            try:
+                batches.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._pending_lock:
+            notifications, self._pending = list(self._pending.values()), {}
+        return batches, notifications
+
+    def _run(self):
+        while True:
+            events = self._queue.get()
+            # Juntar los lotes que lleguen dentro de la ventana
+            while True:
+                try:
+                    events.extend(self._queue.get(timeout=self._batch_window))
+                except queue.Empty:
+                    break
+            try:
+                self._process(events)
+            except Exception:
+                logging.exception("❌ Error procesando lote de eventos de Asana")
+
+    def _is_duplicate(self, event):
+        key = event_key(event)
+        duplicate = key in self._seen
+        metrics.record_cache('asana_seen_events', hit=duplicate)
+        if duplicate:
+            return True
+        self._seen[key] = True
+        if len(self._seen) > SEEN_EVENTS_LIMIT:
+            self._seen.popitem(last=False)
+        return False
+
+    def _process(self, events):
+        # Asana entrega los eventos en orden; el último cambio de cada tarea gana
+        latest_by_task = {}
+        duplicates = 0
+        for event in events:
+            if not is_completion_change(event):
+                continue
+            if self._is_duplicate(event):
+                duplicates += 1
+                continue
+            latest_by_task[event['resource']['gid']] = event
+
+        logging.info(f"📊 Asana batch: {len(events)} events, {len(latest_by_task)} tasks, {duplicates} duplicates")
+
+        for task_gid, event in latest_by_task.items():
+            new_value = (event.get('change') or {}).get('new_value') or {}
+            if new_value.get('resource_subtype') == 'completed':
+                job_id = uuid.uuid4().hex
+                with self._pending_lock:
+                    self._pending[job_id] = (task_gid, event)
+                self._executor.submit(self._notify, job_id, task_gid, event)
+            else:
+                logging.info(f"↩️ Task {task_gid} was uncompleted or status changed to: {new_value.get('resource_subtype')}")
+
+    def _notify(self, job_id, task_gid, event):
+        with self._pending_lock:
+            # drain() ya la entregó a la próxima instancia
+            if self._pending.pop(job_id, None) is None:
+                return
+        try:
+            self._on_task_completed(task_gid, event)
+        except Exception as e:
+            logging.exception(f"❌ Error notificando tarea completada {task_gid}: {e}")
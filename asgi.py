@@ -0,0 +1,214 @@
+"""
+Entry point ASGI que sirve las mismas rutas que la app Flask de main.py.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+La lógica de cada ruta es la misma (main.handle_slack_events,
+main.handle_slack_interactions, main.handle_asana_webhook); lo que cambia
+es cómo se espera la I/O:
+- la evaluación del LLM de cada mensaje es una corrutina
+  (llm_evaluator.evaluate_commitment_async), así que miles de eventos
+  pueden esperar a OpenAI sin ocupar un thread cada uno
+- el resto del trabajo bloqueante (verificación, helpers de Slack/Asana
+  con requests) corre en un pool de ASGI_MAX_THREADS threads
+
+Requiere `uvicorn` y `httpx` (requirements-asgi.txt). Sin httpx la
+evaluación cae en el pool de threads.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import contextvars
+from urllib.parse import parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+import metrics
+import tracing
+from llm_evaluator import evaluate_commitment_async
+from log_config import debug_payloads_enabled
+
+ASGI_MAX_THREADS = int(os.getenv('ASGI_MAX_THREADS', '256'))
+
+main.init()
+main.start_background_jobs()
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_MAX_THREADS, thread_name_prefix='asgi')
+# Referencias a las evaluaciones en curso (asyncio solo guarda referencias débiles)
+_pending_evaluations = set()
+
+
+class Headers(dict):
+    """Headers con acceso case-insensitive, como los de Flask"""
+
+    def __init__(self, raw_headers):
+        super().__init__()
+        for key, value in raw_headers:
+            super().__setitem__(key.decode('latin-1').lower(), value.decode('latin-1'))
+
+    def __getitem__(self, key):
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super().__contains__(key.lower())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_response(send, status, body, content_type='application/json', headers=None):
+    if body is None:
+        body = b''
+    elif not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    raw_headers = [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode(), value.encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _run_blocking(func, *args):
+    """Corre func en el pool conservando el contexto (trace actual)"""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, ctx.run, func, *args)
+
+
+async def _evaluate_message(event, context, on_result):
+    try:
+        commitment_data = await evaluate_commitment_async(event['text'], context)
+    except Exception:
+        logging.exception("❌ ERROR evaluating message %s", event.get('ts'))
+        return
+    await _run_blocking(on_result, event, commitment_data)
+
+
+def _defer_evaluation(loop):
+    """
+    Callback para handle_slack_events: se invoca desde un thread del pool y
+    agenda la evaluación en el event loop con el contexto del trace.
+    """
+    def defer(event, context, on_result):
+        ctx = contextvars.copy_context()
+
+        def schedule():
+            task = loop.create_task(_evaluate_message(event, context, on_result), context=ctx)
+            _pending_evaluations.add(task)
+            task.add_done_callback(_pending_evaluations.discard)
+        loop.call_soon_threadsafe(schedule)
+    return defer
+
+
+async def slack_events(scope, receive, send, headers):
+    body = await _read_body(receive)
+    loop = asyncio.get_running_loop()
+    payload, status = await _run_blocking(
+        main.handle_slack_events, headers, body.decode('utf-8', 'replace'),
+        headers.get('Content-Type'), _defer_evaluation(loop))
+    return status, payload, {}
+
+
+async def slack_interactions(scope, receive, send, headers):
+    body = await _read_body(receive)
+    content_type = (headers.get('Content-Type') or '').split(';')[0].strip()
+    payload, status = await _run_blocking(
+        main.handle_slack_interactions, headers, body.decode('utf-8', 'replace'), content_type)
+    return status, payload, {}
+
+
+async def asana_webhook(scope, receive, send, headers):
+    body = await _read_body(receive)
+    args = dict(parse_qsl(scope.get('query_string', b'').decode()))
+    payload, status, extra = await _run_blocking(main.handle_asana_webhook, headers, body, args)
+    return status, payload, extra
+
+
+async def health(scope, receive, send, headers):
+    return 200, main.health_payload(), {}
+
+
+async def debug_traces(scope, receive, send, headers):
+    if not debug_payloads_enabled(headers):
+        return 403, {'error': 'Forbidden'}, {}
+    args = dict(parse_qsl(scope.get('query_string', b'').decode()))
+    try:
+        limit = int(args.get('limit', 20))
+    except ValueError:
+        limit = 20
+    return 200, {'traces': tracing.recent_traces(limit=limit, trace_id=args.get('trace_id'))}, {}
+
+
+ROUTES = {
+    ('POST', '/slack/events'): slack_events,
+    ('POST', '/slack/interactions'): slack_interactions,
+    ('POST', '/asana/webhook'): asana_webhook,
+    ('GET', '/health'): health,
+    ('GET', '/debug/traces'): debug_traces,
+}
+
+
+async def _shutdown():
+    """
+    Apagado ordenado: la mitad del plazo para las evaluaciones del LLM en
+    curso (sus resultados lanzan la creación de tareas) y el resto para
+    main.shutdown, que drena y guarda los jobs de fondo
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + main.SHUTDOWN_GRACE
+    if _pending_evaluations:
+        _, pending = await asyncio.wait(set(_pending_evaluations), timeout=main.SHUTDOWN_GRACE / 2)
+        if pending:
+            logging.warning("⚠️ Shutting down with %s LLM evaluations still running", len(pending))
+    await loop.run_in_executor(_executor, main.shutdown, max(0.0, deadline - loop.time()))
+    _executor.shutdown(wait=False)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await _shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'GET' and path == '/':
+        await _send_response(send, 200, b'Slack-Asana Integration Service is running!', 'text/html; charset=utf-8')
+        route = path
+        status = 200
+    elif method == 'GET' and path == '/metrics':
+        await _send_response(send, 200, metrics.render().encode(), 'text/plain; version=0.0.4')
+        route = path
+        status = 200
+    else:
+        handler = ROUTES.get((method, path))
+        if handler is None:
+            route = 'unmatched'
+            status = 405 if any(p == path for _, p in ROUTES) else 404
+            await _send_response(send, status, {'error': 'Not Found' if status == 404 else 'Method Not Allowed'})
+        else:
+            route = path
+            status, payload, extra = await handler(scope, receive, send, Headers(scope['headers']))
+            await _send_response(send, status, payload, headers=extra)
+    metrics.HTTP_RESPONSES.inc(route=route, status=status)
@@ -0,0 +1,439 @@
+"""
+Backfill: evalúa el historial de los canales mapeados y crea las tareas que
+falten.
+
+    python backfill.py                      # todos los canales de channel_map.json, últimos 30 días
+    python backfill.py --channels C0123 --days 90 --dry-run
+    python backfill.py --reset              # ignora el checkpoint y empieza de cero
+
+Cuando se mapea un canal nuevo, sus mensajes anteriores nunca pasaron por
+el LLM. Este comando pagina conversations.history y pasa los mensajes por
+un pipeline acotado (colas de tamaño fijo, así la lectura no se adelanta
+más de lo que el resto procesa):
+
+    historial -> pre-filtro -> LLM en lotes -> creación en Asana
+
+- el pre-filtro descarta, sin llamar al LLM, lo que el servicio tampoco
+  evaluaría (bots, joins, mensajes vacíos) y los mensajes que ya tienen tarea
+- el LLM evalúa --batch-size mensajes por llamada
+  (llm_evaluator.evaluate_commitments_batch); los que el modelo omite se
+  reintentan de a uno
+- los compromisos se crean con main.process_asana_task_creation, igual que
+  en vivo (tarea, 💡 y efímero al autor)
+
+Todas las llamadas salientes pasan por los límites de rate_limit.py, que
+comparten todos los threads del proceso; --history-rate, --asana-rate,
+--openai-rate y --slack-rate los fijan. Si Slack igual responde 429 a una
+página del historial, se espera el Retry-After y se pide la misma página
+(hasta HISTORY_RETRIES veces) en lugar de abandonar el canal.
+
+El checkpoint (--checkpoint, backfill_checkpoint.json) guarda por canal el ts
+hasta el cual todo el historial ya se procesó (del más nuevo hacia atrás). Si
+el proceso se corta, la próxima corrida sigue desde ahí; lo que quedó a medio
+procesar se vuelve a leer y lo que ya tiene tarea lo descarta el pre-filtro.
+Solo se evalúan mensajes de nivel superior del canal (las respuestas en
+hilos no vienen en conversations.history).
+
+Las tareas se escriben en el mismo estado que el servicio (task_mapping.json
+y el log de eventos en STATE_DIR), así el servicio las ve. Dos procesos
+guardando el mapeo a la vez se pisan, por eso sin --dry-run el backfill se
+niega a correr mientras algún proceso del servicio tenga tomado el estado
+(persistence.exclusive_state_lock): se corre con el servicio parado, y en
+Cloud Run con el mismo volumen en STATE_DIR y el servicio en 0 instancias.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import Counter
+
+from dotenv import load_dotenv
+
+import main
+import rate_limit
+from persistence import atomic_write, exclusive_state_lock
+
+load_dotenv()
+
+BACKFILL_CHECKPOINT_FILE = os.getenv('BACKFILL_CHECKPOINT_FILE', 'backfill_checkpoint.json')
+# Cada cuánto se escribe el checkpoint mientras corre (además de al final)
+CHECKPOINT_INTERVAL = 2.0
+# Espera máxima para completar un lote antes de mandarlo incompleto
+BATCH_WAIT = 0.5
+# Espera máxima al final para que el outbox mande las reacciones y efímeros
+OUTBOX_DRAIN_TIMEOUT = 60
+# Reintentos de una misma página del historial que recibió 429
+HISTORY_RETRIES = 5
+
+_DONE = object()
+
+
+class ChannelProgress:
+    """
+    Avance de un canal. Los mensajes se numeran en el orden en que llegan
+    (del más nuevo al más viejo); el checkpoint avanza hasta el último
+    mensaje de la racha que ya terminó sin huecos, así nunca saltea uno que
+    sigue en el pipeline o que falló.
+    """
+
+    def __init__(self, channel, entry):
+        self.channel = channel
+        self.entry = entry
+        self.fetched_all = False
+        self.failed = 0
+        self._ts = {}
+        self._finished = set()
+        self._next_seq = 0
+        self._low = 0
+
+    def add(self, ts):
+        seq = self._next_seq
+        self._next_seq += 1
+        self._ts[seq] = ts
+        return seq
+
+    def complete(self, seq):
+        self._finished.add(seq)
+        while self._low in self._finished:
+            self._finished.discard(self._low)
+            self.entry['latest'] = self._ts.pop(self._low)
+            self._low += 1
+        self._update_done()
+
+    def fail(self, seq):
+        # Queda como hueco: el checkpoint no pasa de este mensaje
+        self.failed += 1
+
+    def fetch_finished(self):
+        self.fetched_all = True
+        self._update_done()
+
+    def _update_done(self):
+        self.entry['done'] = self.fetched_all and self._low == self._next_seq
+
+
+class Backfill:
+    def __init__(self, channels, checkpoint_path=BACKFILL_CHECKPOINT_FILE, oldest=None, batch_size=10,
+                 llm_workers=4, asana_workers=2, queue_size=500, page_size=200, dry_run=False):
+        self.channels = channels
+        self.checkpoint_path = checkpoint_path
+        self.oldest = oldest
+        self.batch_size = batch_size
+        self.llm_workers = llm_workers
+        self.asana_workers = asana_workers
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.stats = Counter()
+        self._messages = queue.Queue(maxsize=queue_size)
+        self._batches = queue.Queue(maxsize=max(1, llm_workers * 2))
+        self._commitments = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stop_saving = threading.Event()
+        self._checkpoint = self._load_checkpoint()
+
+    # ------------------------------------------------------------------
+    # Checkpoint
+    # ------------------------------------------------------------------
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            checkpoint = {}
+        checkpoint.setdefault('channels', {})
+        return checkpoint
+
+    def save_checkpoint(self):
+        with self._lock:
+            data = json.dumps(self._checkpoint, indent=2)
+        atomic_write(self.checkpoint_path, data.encode('utf-8'))
+
+    def _checkpoint_loop(self):
+        while not self._stop_saving.wait(CHECKPOINT_INTERVAL):
+            self.save_checkpoint()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _complete(self, progress, seq):
+        with self._lock:
+            progress.complete(seq)
+
+    def _fail(self, progress, seq):
+        with self._lock:
+            progress.fail(seq)
+            self.stats['failed'] += 1
+
+    # ------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------
+    def _fetch(self, progress):
+        """Pagina el historial del canal desde el checkpoint hacia atrás"""
+        from slack_helpers import get_channel_history, SlackRateLimited
+        latest = progress.entry.get('latest')
+        cursor = None
+        retries = 0
+        while True:
+            try:
+                messages, next_cursor = get_channel_history(progress.channel, latest=latest, oldest=self.oldest,
+                                                            cursor=cursor, limit=self.page_size)
+            except SlackRateLimited as e:
+                retries += 1
+                if retries > HISTORY_RETRIES:
+                    raise
+                self._count('rate_limited')
+                logging.warning("⏳ Backfill: history of %s rate limited, retrying in %ss", progress.channel, e.retry_after)
+                time.sleep(e.retry_after)
+                continue
+            retries = 0
+            cursor = next_cursor
+            self._count('pages')
+            for message in messages:
+                with self._lock:
+                    seq = progress.add(message['ts'])
+                    self.stats['scanned'] += 1
+                self._messages.put((progress, seq, message))
+            if not cursor:
+                break
+        with self._lock:
+            progress.fetch_finished()
+
+    def _fetcher(self, channels):
+        while True:
+            try:
+                progress = channels.get_nowait()
+            except queue.Empty:
+                return
+            logging.info("📜 Backfill: reading history of %s", progress.channel)
+            try:
+                self._fetch(progress)
+            except Exception:
+                logging.exception("❌ Backfill: error reading history of %s", progress.channel)
+                with self._lock:
+                    progress.failed += 1
+                    self.stats['failed'] += 1
+
+    def _accepts(self, channel, message):
+        """Pre-filtro: lo mismo que el servicio no evaluaría, más lo que ya tiene tarea"""
+        if message.get('subtype') not in main.HUMAN_MESSAGE_SUBTYPES:
+            return False
+        if message.get('bot_id') or not message.get('user') or not message.get('text'):
+            return False
+        return not main.has_task(f"{channel}:{message['ts']}")
+
+    def _batcher(self):
+        """Pre-filtra y agrupa los mensajes en lotes para el LLM"""
+        batch = []
+        deadline = None
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._messages.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                if batch:
+                    self._batches.put(batch)
+                return
+            if item is not None:
+                progress, seq, message = item
+                if self._accepts(progress.channel, message):
+                    if not batch:
+                        deadline = time.monotonic() + BATCH_WAIT
+                    batch.append(item)
+                else:
+                    self._count('filtered')
+                    self._complete(progress, seq)
+            if batch and (len(batch) >= self.batch_size or item is None):
+                self._batches.put(batch)
+                batch = []
+
+    def _evaluate(self, batch):
+        from llm_evaluator import evaluate_commitments_batch, evaluate_commitment
+        texts = [message['text'] for _, _, message in batch]
+        try:
+            results = evaluate_commitments_batch(texts)
+        except Exception:
+            logging.exception("❌ Backfill: batch evaluation failed")
+            results = [None] * len(batch)
+        self._count('llm_batches')
+        for (progress, seq, message), result in zip(batch, results):
+            if result is None:
+                # El modelo omitió el mensaje o falló el lote: de a uno
+                self._count('llm_retries')
+                try:
+                    result = evaluate_commitment(message['text'])
+                except Exception:
+                    logging.exception("❌ Backfill: evaluation failed for %s", message['ts'])
+                if result is None:
+                    self._fail(progress, seq)
+                    continue
+            self._count('evaluated')
+            event = {
+                'type': 'message',
+                'channel': progress.channel,
+                'user': message['user'],
+                'text': message['text'],
+                'ts': message['ts'],
+                'thread_ts': message.get('thread_ts'),
+            }
+            if main.prepare_commitment(event, result):
+                self._count('commitments')
+                self._commitments.put((progress, seq, event, result))
+            else:
+                self._complete(progress, seq)
+
+    def _llm_worker(self):
+        while True:
+            batch = self._batches.get()
+            if batch is _DONE:
+                return
+            self._evaluate(batch)
+
+    def _asana_worker(self):
+        while True:
+            item = self._commitments.get()
+            if item is _DONE:
+                return
+            progress, seq, event, commitment_data = item
+            if self.dry_run:
+                logging.info("📝 [dry-run] Commitment in %s at %s: %s", event['channel'], event['ts'],
+                             commitment_data.get('descripcion'))
+                self._complete(progress, seq)
+                continue
+            main.process_asana_task_creation(event, commitment_data)
+            if f"{event['channel']}:{event['ts']}" in main.state.task_mapping:
+                self._count('created')
+                self._complete(progress, seq)
+            else:
+                self._fail(progress, seq)
+
+    # ------------------------------------------------------------------
+    def run(self, fetchers=2):
+        channels = queue.Queue()
+        progresses = []
+        for channel in self.channels:
+            entry = self._checkpoint['channels'].setdefault(channel, {'latest': None, 'done': False})
+            if entry.get('done'):
+                logging.info("⏭️ Backfill: %s already done", channel)
+                continue
+            progress = ChannelProgress(channel, entry)
+            progresses.append(progress)
+            channels.put(progress)
+
+        def start(target, count, name):
+            threads = []
+            for i in range(count):
+                thread = threading.Thread(target=target, name=f'backfill-{name}-{i}')
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            return threads
+
+        saver = start(self._checkpoint_loop, 1, 'checkpoint')
+        asana = start(self._asana_worker, self.asana_workers, 'asana')
+        llm = start(self._llm_worker, self.llm_workers, 'llm')
+        batcher = start(self._batcher, 1, 'batcher')
+        fetch = start(lambda: self._fetcher(channels), min(fetchers, max(1, len(progresses))), 'fetch')
+
+        # Cierre en orden: cada etapa termina cuando la anterior ya no produce
+        for thread in fetch:
+            thread.join()
+        self._messages.put(_DONE)
+        batcher[0].join()
+        for _ in llm:
+            self._batches.put(_DONE)
+        for thread in llm:
+            thread.join()
+        for _ in asana:
+            self._commitments.put(_DONE)
+        for thread in asana:
+            thread.join()
+
+        self._stop_saving.set()
+        saver[0].join()
+        self.save_checkpoint()
+        return progresses
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluar el historial de los canales mapeados y crear las tareas que falten")
+    parser.add_argument('--channels', nargs='*', help="canales a procesar (por defecto, todos los de channel_map.json)")
+    parser.add_argument('--days', type=float, default=30, help="antigüedad máxima de los mensajes (0 = todo el historial)")
+    parser.add_argument('--checkpoint', default=BACKFILL_CHECKPOINT_FILE)
+    parser.add_argument('--reset', action='store_true', help="ignorar el checkpoint existente")
+    parser.add_argument('--dry-run', action='store_true', help="evaluar sin crear tareas")
+    parser.add_argument('--batch-size', type=int, default=10, help="mensajes por llamada al LLM")
+    parser.add_argument('--fetchers', type=int, default=2, help="canales leídos en paralelo")
+    parser.add_argument('--llm-workers', type=int, default=4)
+    parser.add_argument('--asana-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=500, help="mensajes en vuelo como máximo")
+    parser.add_argument('--page-size', type=int, default=200)
+    # Límites por defecto: Tier 3 de Slack para conversations.history (~50/min),
+    # 150/min de Asana
+    parser.add_argument('--history-rate', type=float, default=0.8, help="conversations.history por segundo")
+    parser.add_argument('--slack-rate', type=float, default=0, help="llamadas a Slack por segundo (0 = sin límite)")
+    parser.add_argument('--asana-rate', type=float, default=2.5, help="llamadas a Asana por segundo")
+    parser.add_argument('--openai-rate', type=float, default=5, help="llamadas al LLM por segundo")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    main.init()
+    # Se mantiene tomado hasta que termina el proceso
+    state_lock = None if args.dry_run else exclusive_state_lock()
+    if not args.dry_run and state_lock is None:
+        print("El servicio está corriendo con este mismo estado (STATE_DIR): detenerlo antes del backfill, "
+              "o usar --dry-run", file=sys.stderr)
+        return 2
+    if args.channels:
+        channels = args.channels
+    else:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'channel_map.json')) as f:
+            channels = list(json.load(f))
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    rate_limit.configure('slack:conversations.history', args.history_rate)
+    rate_limit.configure('slack', args.slack_rate)
+    rate_limit.configure('asana', args.asana_rate)
+    rate_limit.configure('openai', args.openai_rate)
+
+    oldest = f"{time.time() - args.days * 86400:.6f}" if args.days else None
+    backfill = Backfill(channels, args.checkpoint, oldest, args.batch_size, args.llm_workers, args.asana_workers,
+                        args.queue_size, args.page_size, args.dry_run)
+    start = time.perf_counter()
+    try:
+        progresses = backfill.run(fetchers=args.fetchers)
+    except KeyboardInterrupt:
+        backfill.save_checkpoint()
+        logging.info("🛑 Backfill interrupted; checkpoint saved in %s", args.checkpoint)
+        return 130
+    # Las reacciones y efímeros de las tareas creadas salen por el outbox
+    if not args.dry_run:
+        pending = main.state.outbox.wait_idle(OUTBOX_DRAIN_TIMEOUT)
+        if pending:
+            logging.warning("⚠️ %s Slack side effects still pending in the outbox", pending)
+    elapsed = time.perf_counter() - start
+
+    stats = backfill.stats
+    logging.info("✅ Backfill finished in %.1f s: %s", elapsed, dict(stats))
+    print(json.dumps({
+        'elapsed_s': round(elapsed, 3),
+        'messages_per_s': round(stats['scanned'] / elapsed, 1) if elapsed else None,
+        'channels': len(progresses),
+        'channels_pending': sum(1 for p in progresses if not p.entry.get('done')),
+        **stats,
+    }, indent=2))
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,134 @@
+"""
+Prueba de backfill.py contra los mocks de Slack, Asana y OpenAI.
+
+Carga en el mock un historial de --messages mensajes por canal (compromisos,
+charla, joins y mensajes de bots), corre backfill.py en un proceso aparte y
+reporta mensajes/seg, llamadas al LLM (en lotes) y tareas creadas. Con
+--interrupt-after corta la primera corrida con Ctrl-C a los N segundos y
+la vuelve a lanzar, para verificar que retoma desde el checkpoint sin
+duplicar tareas.
+
+Ejemplos:
+    python -m benchmarks.bench_backfill --channels 2 --messages 1000
+    python -m benchmarks.bench_backfill --messages 2000 --batch-size 20 --openai-rate 10
+    python -m benchmarks.bench_backfill --messages 1000 --interrupt-after 3
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks import mock_upstreams
+from benchmarks.load_test import REPO_DIR, CONFIG_FILES, app_env
+
+BENCH_USERS = ['UBENCH0001', 'UBENCH0002', 'UBENCH0003']
+
+
+def build_history(channel_index, count, commitment_ratio):
+    """Mensajes del más nuevo al más viejo, como conversations.history"""
+    every = max(1, round(1 / commitment_ratio)) if commitment_ratio > 0 else 0
+    now = time.time()
+    messages = []
+    for i in range(count):
+        ts = f"{now - 60 * (i + 1):.6f}"
+        user = BENCH_USERS[i % len(BENCH_USERS)]
+        if every and i % every == 0:
+            message = {'type': 'message', 'user': user, 'ts': ts,
+                       'text': f"<@UBENCH{i % 40 + 10:04d}> mandá el informe {channel_index}-{i} el viernes"}
+        elif i % 7 == 1:
+            message = {'type': 'message', 'subtype': 'channel_join', 'user': user, 'ts': ts,
+                       'text': f"<@{user}> has joined the channel"}
+        elif i % 7 == 2:
+            message = {'type': 'message', 'bot_id': 'BBENCH0001', 'ts': ts, 'text': f"recordatorio {i}"}
+        else:
+            message = {'type': 'message', 'user': user, 'ts': ts, 'text': f"gracias equipo, mensaje {i} 🙌"}
+        messages.append(message)
+    return messages
+
+
+def run_backfill(args, channels, workdir, env, interrupt_after=None):
+    cmd = [sys.executable, os.path.join(REPO_DIR, 'backfill.py'), '--channels', *channels, '--days', '0',
+           '--batch-size', str(args.batch_size), '--llm-workers', str(args.llm_workers),
+           '--asana-workers', str(args.asana_workers), '--history-rate', str(args.history_rate),
+           '--asana-rate', str(args.asana_rate), '--openai-rate', str(args.openai_rate)]
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, text=True)
+    if interrupt_after:
+        try:
+            process.wait(timeout=interrupt_after)
+        except subprocess.TimeoutExpired:
+            process.send_signal(signal.SIGINT)
+    output, _ = process.communicate(timeout=600)
+    elapsed = time.perf_counter() - start
+    try:
+        summary = json.loads(output[output.index('{'):])
+    except ValueError:
+        summary = {}
+    return process.returncode, elapsed, summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de backfill.py con mocks locales")
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--messages', type=int, default=1000, help="mensajes de historial por canal")
+    parser.add_argument('--commitment-ratio', type=float, default=0.2)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--llm-workers', type=int, default=4)
+    parser.add_argument('--asana-workers', type=int, default=4)
+    parser.add_argument('--history-rate', type=float, default=20)
+    parser.add_argument('--asana-rate', type=float, default=50)
+    parser.add_argument('--openai-rate', type=float, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help="latencia de los mocks (s)")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--interrupt-after', type=float, default=0, help="cortar la primera corrida a los N s y retomar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = mock_upstreams.UpstreamConfig(args.latency, args.jitter)
+    upstream_server, state, upstream_url = mock_upstreams.start(config=config)
+
+    with open(os.path.join(REPO_DIR, 'channel_map.json')) as f:
+        channels = list(json.load(f))[:args.channels]
+    for index, channel in enumerate(channels):
+        state.history[channel] = build_history(index, args.messages, args.commitment_ratio)
+    expected = sum(1 for channel in channels for m in state.history[channel] if '<@UBENCH00' in m['text'] and 'subtype' not in m)
+
+    workdir = tempfile.mkdtemp(prefix='track-backfill-')
+    for name in CONFIG_FILES:
+        shutil.copy(os.path.join(REPO_DIR, name), workdir)
+    env = app_env(workdir, upstream_url)
+    try:
+        runs = []
+        if args.interrupt_after:
+            runs.append(('interrumpida', *run_backfill(args, channels, workdir, env, args.interrupt_after)))
+        runs.append(('completa', *run_backfill(args, channels, workdir, env)))
+
+        calls, _ = state.snapshot()
+        total = args.channels * args.messages
+        print(f"\n=== backfill: {len(channels)} canales x {args.messages} mensajes, lotes de {args.batch_size} ===")
+        for name, code, elapsed, summary in runs:
+            print(f"corrida {name}: exit={code} en {round(elapsed, 2)} s  "
+                  f"escaneados={summary.get('scanned')} filtrados={summary.get('filtered')} "
+                  f"evaluados={summary.get('evaluated')} creadas={summary.get('created')} "
+                  f"fallidos={summary.get('failed', 0)} ({summary.get('messages_per_s')} msg/s)")
+        tasks = calls.get('POST /asana/api/1.0/tasks', 0)
+        print(f"compromisos en el historial: {expected}  tareas creadas en Asana: {tasks}"
+              + ("" if tasks == expected else f"  (diferencia: {tasks - expected})"))
+        print(f"llamadas al LLM: {calls.get('POST /openai/v1/chat/completions', 0)} para {total} mensajes")
+        for endpoint, count in sorted(calls.items()):
+            print(f"  {endpoint}: {count}")
+    finally:
+        upstream_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
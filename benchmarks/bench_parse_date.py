@@ -0,0 +1,156 @@
+"""
+Microbenchmark de asana_client.parse_date.
+
+Compara la implementación anterior (diccionario reconstruido en cada
+llamada + hasta 10 strptime), el parser compilado sin memo y el parser
+con memo por (expresión, día).
+
+Uso:
+    python -m benchmarks.bench_parse_date
+    python -m benchmarks.bench_parse_date --number 20000
+"""
+
+import re
+import sys
+import os
+import timeit
+import argparse
+from datetime import datetime, timedelta, date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asana_client
+
+CASES = [
+    "hoy", "mañana", "pasado mañana", "viernes", "esta semana", "próxima semana",
+    "fin de semana", "en 3 días", "15/08/2025", "2025-08-15", "15 de agosto",
+    "08/15/2025", "next monday", "en 2 semanas", "sin fecha",
+]
+
+
+# Implementación anterior, copiada tal cual como referencia
+def legacy_parse_date(date_str):
+    """
+    Parsea una fecha que puede ser:
+    - Una fecha en formato ISO o común
+    - Una fecha relativa como "hoy", "mañana", etc.
+    """
+    if not date_str:
+        return None
+    
+    # Convertir a minúsculas para comparación
+    date_lower = date_str.lower().strip()
+    
+    # Obtener fecha actual
+    today = datetime.now()
+    
+    # Diccionario de fechas relativas en español
+    relative_dates = {
+        'hoy': today,
+        'today': today,
+        'mañana': today + timedelta(days=1),
+        'manana': today + timedelta(days=1),
+        'tomorrow': today + timedelta(days=1),
+        'pasado mañana': today + timedelta(days=2),
+        'pasado manana': today + timedelta(days=2),
+        'ayer': today - timedelta(days=1),
+        'yesterday': today - timedelta(days=1),
+        'esta semana': today + timedelta(days=(4 - today.weekday()) % 7),  # Viernes de esta semana
+        'próxima semana': today + timedelta(days=7),
+        'proxima semana': today + timedelta(days=7),
+        'next week': today + timedelta(days=7),
+        'fin de semana': today + timedelta(days=(5 - today.weekday()) % 7),  # Sábado más cercano
+        'lunes': today + timedelta(days=(0 - today.weekday()) % 7),
+        'martes': today + timedelta(days=(1 - today.weekday()) % 7),
+        'miércoles': today + timedelta(days=(2 - today.weekday()) % 7),
+        'miercoles': today + timedelta(days=(2 - today.weekday()) % 7),
+        'jueves': today + timedelta(days=(3 - today.weekday()) % 7),
+        'viernes': today + timedelta(days=(4 - today.weekday()) % 7),
+        'sábado': today + timedelta(days=(5 - today.weekday()) % 7),
+        'sabado': today + timedelta(days=(5 - today.weekday()) % 7),
+        'domingo': today + timedelta(days=(6 - today.weekday()) % 7),
+    }
+    
+    # Verificar si es una fecha relativa
+    for key, value in relative_dates.items():
+        if key in date_lower:
+            # Si el día ya pasó esta semana, asumimos la próxima semana
+            result_date = value
+            if key in ['lunes', 'martes', 'miércoles', 'miercoles', 'jueves', 'viernes', 'sábado', 'sabado', 'domingo']:
+                if result_date.date() <= today.date():
+                    result_date = result_date + timedelta(days=7)
+            return result_date.strftime('%Y-%m-%d')
+    
+    # Verificar patrones como "en X días"
+    days_pattern = re.match(r'en (\d+) días?', date_lower)
+    if days_pattern:
+        days = int(days_pattern.group(1))
+        return (today + timedelta(days=days)).strftime('%Y-%m-%d')
+    
+    # Intentar parsear formatos de fecha tradicionales
+    date_formats = [
+        '%Y-%m-%d',
+        '%d/%m/%Y',
+        '%d-%m-%Y',
+        '%m/%d/%Y',
+        '%m-%d-%Y',
+        '%d/%m/%y',
+        '%d-%m-%y',
+        '%Y/%m/%d',
+        '%d de %B',  # "15 de agosto"
+        '%d %B',      # "15 agosto"
+    ]
+    
+    # Mapeo de meses en español
+    spanish_months = {
+        'enero': 'January', 'febrero': 'February', 'marzo': 'March',
+        'abril': 'April', 'mayo': 'May', 'junio': 'June',
+        'julio': 'July', 'agosto': 'August', 'septiembre': 'September',
+        'octubre': 'October', 'noviembre': 'November', 'diciembre': 'December'
+    }
+    
+    # Reemplazar meses en español por inglés para el parsing
+    date_str_en = date_str
+    for spanish, english in spanish_months.items():
+        date_str_en = date_str_en.replace(spanish, english)
+    
+    for fmt in date_formats:
+        try:
+            parsed_date = datetime.strptime(date_str_en, fmt)
+            # Si no tiene año, asumimos el año actual
+            if '%Y' not in fmt and '%y' not in fmt:
+                parsed_date = parsed_date.replace(year=today.year)
+                # Si la fecha ya pasó este año, asumimos el próximo año
+                if parsed_date.date() < today.date():
+                    parsed_date = parsed_date.replace(year=today.year + 1)
+            return parsed_date.strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    
+    return None
+
+
+
+def run(label, func, number):
+    elapsed = timeit.timeit(lambda: [func(c) for c in CASES], number=number)
+    per_call = elapsed / (number * len(CASES)) * 1e6
+    print(f"{label:<28} {per_call:8.2f} µs/llamada")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de parse_date")
+    parser.add_argument('--number', type=int, default=5000, help="repeticiones del set de casos")
+    args = parser.parse_args()
+
+    uncached = asana_client._parse_date_on.__wrapped__
+    today = date.today()
+
+    legacy = run("legacy", legacy_parse_date, args.number)
+    compiled = run("compilado (sin memo)", lambda s: uncached(' '.join(s.lower().split()), today), args.number)
+    memo = run("compilado + memo", asana_client.parse_date, args.number)
+    print(f"\nspeedup sin memo: {legacy / compiled:.1f}x, con memo: {legacy / memo:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Prueba de reconciler.py contra el mock de Asana.
+
+Crea en el mock --tasks tareas repartidas en --projects proyectos, escribe el
+task_mapping.json correspondiente y corre `reconciler.py --once` tres veces
+en un proceso aparte:
+1. sin sync tokens: resincroniza cada proyecto listando sus tareas
+2. después de completar --completed tareas y borrar --deleted en Asana (sin
+   webhook) y de cambiar --noise tareas que no están en el mapeo
+3. sin cambios: solo una llamada a /events por proyecto
+
+Reporta las llamadas a Asana y Slack de cada pasada y verifica que el mapeo
+terminó con los ✅ y los borrados que correspondían.
+
+Ejemplos:
+    python -m benchmarks.bench_reconciler
+    python -m benchmarks.bench_reconciler --tasks 5000 --projects 10 --completed 40 --deleted 10
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks import mock_upstreams
+from benchmarks.load_test import REPO_DIR, CONFIG_FILES, app_env
+
+
+def build_mapping(state, args):
+    """Tareas en el mock + el task_mapping.json que las referencia"""
+    mapping = {}
+    for i in range(args.tasks):
+        project_id = f"12000000000{i % args.projects:05d}"
+        task = state.create_task({'name': f"tarea {i}", 'projects': [project_id]})
+        ts = f"{time.time() - 60 * i:.6f}"
+        mapping[f"CBENCH0001:{ts}"] = {
+            'asana_gid': task['gid'],
+            'project_id': project_id,
+            'channel': 'CBENCH0001',
+            'message_ts': ts,
+            'thread_ts': None,
+            'user_who_posted': 'UBENCH0001',
+            'task_name': task['name'],
+            'created_at': time.time(),
+        }
+    return mapping
+
+
+def run_once(workdir, env):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, 'reconciler.py'), '--once'],
+                            cwd=workdir, env=env, capture_output=True, text=True, timeout=600)
+    elapsed = time.perf_counter() - start
+    try:
+        stats = json.loads(result.stdout[result.stdout.index('{'):])
+    except ValueError:
+        stats = {}
+    return result.returncode, elapsed, stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de reconciler.py con el mock de Asana")
+    parser.add_argument('--tasks', type=int, default=2000, help="tareas en el mapeo")
+    parser.add_argument('--projects', type=int, default=5)
+    parser.add_argument('--completed', type=int, default=20, help="tareas completadas sin webhook")
+    parser.add_argument('--deleted', type=int, default=5, help="tareas borradas en Asana")
+    parser.add_argument('--noise', type=int, default=200, help="cambios en tareas fuera del mapeo")
+    parser.add_argument('--latency', type=float, default=0.01, help="latencia del mock (s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    upstream_server, state, upstream_url = mock_upstreams.start(config=mock_upstreams.UpstreamConfig(args.latency))
+
+    workdir = tempfile.mkdtemp(prefix='track-reconcile-')
+    for name in CONFIG_FILES:
+        shutil.copy(os.path.join(REPO_DIR, name), workdir)
+    env = app_env(workdir, upstream_url)
+    try:
+        mapping = build_mapping(state, args)
+        with open(os.path.join(workdir, 'task_mapping.json'), 'w') as f:
+            json.dump(mapping, f)
+
+        passes = []
+        previous, _ = state.snapshot()
+        for name in ('inicial', 'con cambios', 'sin cambios'):
+            if name == 'con cambios':
+                gids = random.sample([task['asana_gid'] for task in mapping.values()], args.completed + args.deleted)
+                for gid in gids[:args.completed]:
+                    state.complete_task(gid)
+                for gid in gids[args.completed:]:
+                    state.delete_task(gid)
+                for i in range(args.noise):
+                    state.create_task({'name': f"ajena {i}", 'projects': [f"12000000000{i % args.projects:05d}"]})
+            code, elapsed, stats = run_once(workdir, env)
+            calls, _ = state.snapshot()
+            delta = {k: v - previous.get(k, 0) for k, v in calls.items() if v - previous.get(k, 0)}
+            previous = calls
+            passes.append((name, code, elapsed, stats, delta))
+
+        with open(os.path.join(workdir, 'task_mapping.json')) as f:
+            final = json.load(f)
+        completed = sum(1 for task in final.values() if task.get('completed_at'))
+
+        print(f"\n=== reconciler: {args.tasks} tareas en {args.projects} proyectos ===")
+        for name, code, elapsed, stats, delta in passes:
+            print(f"pasada {name}: exit={code} en {round(elapsed, 2)} s  revisadas={stats.get('checked', 0)} "
+                  f"completadas={stats.get('completed', 0)} borradas={stats.get('deleted', 0)} "
+                  f"resyncs={stats.get('full_syncs', 0)} llamadas={sum(delta.values())}")
+            for endpoint, count in sorted(delta.items()):
+                print(f"  {endpoint}: {count}")
+        print(f"mapeo final: {len(final)} tareas (esperadas {args.tasks - args.deleted}), "
+              f"{completed} con completed_at (esperadas {args.completed})")
+    finally:
+        upstream_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
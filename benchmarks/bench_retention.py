@@ -0,0 +1,130 @@
+"""
+Costo del mapeo de tareas con y sin política de retención.
+
+Genera --months meses de historia con --per-month tareas por mes (casi todas
+completadas), corre main.archive_expired_tasks en un directorio temporal y
+compara, antes y después: entradas en memoria, tamaño de task_mapping.json y
+tiempo de save_task_mapping. También mide lookup (por clave, un mes) y
+find_by_gid (recorre el archivo) sobre las tareas archivadas.
+
+Ejemplos:
+    python -m benchmarks.bench_retention
+    python -m benchmarks.bench_retention --months 24 --per-month 5000 --retention-days 30
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.load_test import REPO_DIR
+
+
+def build_history(months, per_month, now):
+    """{task_key: task} con mensajes repartidos en los últimos `months` meses"""
+    mapping = {}
+    for i in range(months * per_month):
+        created_at = now - random.uniform(0, months * 30 * 86400)
+        channel = f"CBENCH{i % 12:04d}"
+        task_key = f"{channel}:{created_at:.6f}"
+        mapping[task_key] = {
+            'asana_gid': str(1_200_000_000_000_000 + i),
+            'channel': channel,
+            'message_ts': f"{created_at:.6f}",
+            'user_who_posted': f"UBENCH{i % 40:04d}",
+            'assigned_to': f"UBENCH{(i + 7) % 40:04d}",
+            'project_id': f"12000000000{i % 5:05d}",
+            'created_at': created_at,
+            'can_be_cancelled': False,
+            'task_name': f"Enviar el informe semanal número {i}",
+            'text_hash': f"{i:016x}",
+            'thread_ts': None,
+        }
+        # El 90% se completa unos días después de crearse
+        if random.random() < 0.9:
+            mapping[task_key]['completed_at'] = min(now, created_at + random.uniform(0, 14 * 86400))
+    return mapping
+
+
+def timed_ms(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mapeo de tareas con y sin retención")
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--per-month', type=int, default=2000)
+    parser.add_argument('--retention-days', type=float, default=30)
+    parser.add_argument('--lookups', type=int, default=200)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='track-retention-')
+    os.environ.update({
+        'TASK_EVENT_LOG_DIR': os.path.join(workdir, 'task_events'),
+        'TASK_ARCHIVE_DIR': os.path.join(workdir, 'task_archive'),
+        'TASK_RETENTION_DAYS': str(args.retention_days),
+        'LOG_FILE': '',
+        'LOG_LEVEL': 'WARNING',
+    })
+    sys.path.insert(0, REPO_DIR)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import main as service
+        from task_record import TaskRecord
+
+        now = time.time()
+        history = build_history(args.months, args.per_month, now)
+        service.state.task_mapping.update((key, TaskRecord.from_dict(task)) for key, task in history.items())
+
+        rows = []
+        def write():
+            service.save_task_mapping()
+            service.state.task_mapping_writer.flush()
+
+        def measure(name):
+            elapsed = timed_ms(write)
+            rows.append((name, len(service.state.task_mapping), os.path.getsize(service.task_mapping_file), elapsed))
+
+        measure('sin retención')
+        start = time.perf_counter()
+        archived = service.archive_expired_tasks(now)
+        archive_ms = (time.perf_counter() - start) * 1000
+        measure(f'retención {args.retention_days:g} días')
+        service.state.task_events.flush()
+
+        archived_keys = [key for key in history if key not in service.state.task_mapping]
+        sample = random.sample(archived_keys, min(args.lookups, len(archived_keys)))
+        archive = service.state.task_archive
+        lookup_ms = timed_ms(lambda: [archive.lookup(key) for key in sample], repeat=1) / max(1, len(sample))
+        found = sum(1 for key in sample if (archive.lookup(key) or {}).get('asana_gid') == history[key]['asana_gid'])
+        gid_ms = timed_ms(lambda: archive.find_by_gid(history[sample[0]]['asana_gid']), repeat=3) if sample else 0
+        stats = archive.stats()
+
+        print(f"\n=== retención: {args.months} meses x {args.per_month} tareas ===")
+        print(f"{'':<22}{'en memoria':>12}{'json (KB)':>12}{'save (ms)':>12}")
+        for name, entries, size, elapsed in rows:
+            print(f"{name:<22}{entries:>12}{size // 1024:>12}{elapsed:>12}")
+        print(f"archivadas: {archived} en {archive_ms:.0f} ms -> {stats['files']} archivos, "
+              f"{stats['bytes'] // 1024} KB comprimidos")
+        print(f"lookup por clave: {lookup_ms:.3f} ms/consulta ({found}/{len(sample)} encontradas)")
+        print(f"find_by_gid (recorre el archivo): {gid_ms} ms")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Prueba de carga de socket_mode.py contra el stand-in local de Socket Mode
+(benchmarks/mock_socket_mode.py) y los mocks de Slack, Asana y OpenAI.
+
+Arranca socket_mode.py en un proceso aparte, le envía los mismos eventos
+que el escenario equivalente de load_test.py y reporta la latencia de los
+acks (envío del envelope -> ack), eventos/seg y las llamadas salientes.
+Con --reconnect-every se fuerza un `disconnect` cada N eventos para
+verificar que el runner reconecta sin perder envelopes.
+
+Ejemplos:
+    python -m benchmarks.bench_socket_mode --events 500 --workers 16
+    python -m benchmarks.bench_socket_mode --scenario reaction_storm --events 2000
+    python -m benchmarks.bench_socket_mode --events 300 --reconnect-every 100
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks import mock_upstreams, mock_socket_mode, generators
+from benchmarks.load_test import REPO_DIR, CONFIG_FILES, app_env, mapped_channel, percentile, wait_drain
+
+
+def build_payloads(args):
+    channel = mapped_channel()
+    if args.scenario == 'reaction_storm':
+        return [generators.reaction_event(i, channel) for i in range(args.events)]
+    every = max(1, round(1 / args.commitment_ratio)) if args.commitment_ratio > 0 else 0
+    return [generators.message_event(i, channel, bool(every) and i % every == 0) for i in range(args.events)]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de Socket Mode con mocks locales")
+    parser.add_argument('--scenario', choices=['message_storm', 'reaction_storm'], default='message_storm')
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8, help="SOCKET_MODE_WORKERS del runner")
+    parser.add_argument('--commitment-ratio', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.02, help="latencia de los mocks (s)")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--reconnect-every', type=int, default=0, help="pedir reconexión cada N eventos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = mock_upstreams.UpstreamConfig(args.latency, args.jitter)
+    upstream_server, state, upstream_url = mock_upstreams.start(config=config)
+    socket_server, socket_state, state.socket_url = mock_socket_mode.start()
+
+    workdir = tempfile.mkdtemp(prefix='track-socket-')
+    for name in CONFIG_FILES:
+        shutil.copy(os.path.join(REPO_DIR, name), workdir)
+    env = app_env(workdir, upstream_url)
+    env.update({'SLACK_APP_TOKEN': 'xapp-bench', 'SOCKET_MODE_RECONNECT_DELAY': '0.1', 'PYTHONPATH': REPO_DIR})
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'socket_mode.py'), '--workers', str(args.workers)],
+                               cwd=workdir, env=env)
+    try:
+        socket_state.wait_connected()
+        payloads = build_payloads(args)
+        start = time.perf_counter()
+        connects = 1
+        for i, payload in enumerate(payloads):
+            if args.reconnect_every and i and i % args.reconnect_every == 0:
+                socket_state.request_reconnect()
+                connects += 1
+                socket_state.wait_connected(connects)
+            socket_state.send_event(payload)
+        acked = socket_state.wait_acks(len(payloads))
+        elapsed = time.perf_counter() - start
+        drain_start = time.perf_counter()
+        wait_drain(state)
+        drain_elapsed = time.perf_counter() - drain_start
+
+        latencies = socket_state.ack_latencies()
+        calls, throttled = state.snapshot()
+        print(f"\n=== {args.scenario} (socket mode, {args.workers} workers) ===")
+        print(f"envelopes: {len(payloads)}  acks: {len(latencies)}{'' if acked else ' (timeout)'}  conexiones: {socket_state.connects}")
+        print(f"throughput: {round(len(payloads) / elapsed, 1)} events/s en {round(elapsed, 3)} s")
+        print(f"ack ms: p50={round(percentile(latencies, 50) * 1000, 2)} "
+              f"p95={round(percentile(latencies, 95) * 1000, 2)} p99={round(percentile(latencies, 99) * 1000, 2)}")
+        print(f"background drenado en {round(drain_elapsed, 3)} s")
+        for endpoint, count in sorted(calls.items()):
+            print(f"  {endpoint}: {count}" + (f" ({throttled[endpoint]} x 429)" if endpoint in throttled else ''))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        socket_server.shutdown()
+        upstream_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark del arranque en frío del servicio.
+
+Cada corrida es un proceso nuevo (como una instancia nueva de Cloud Run) en
+un directorio temporal con los archivos de configuración, y mide:
+    import   `import main`
+    app      `main.create_app()`
+    first    primer request a /health con el test client de Flask
+    state    primer acceso a los datos (task_mapping, user_mapping)
+
+Además corre `python -X importtime -c "import main"` y lista los módulos
+con mayor tiempo acumulado.
+
+Uso:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20 --top 15
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_FILES = ('merged_accounts.json', 'asana_pj.json', 'task_mapping.json')
+
+# Se ejecuta en el proceso hijo; imprime los tiempos como JSON
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+app = main.create_app()
+t2 = time.perf_counter()
+app.test_client().get('/health')
+t3 = time.perf_counter()
+main.state.task_mapping, main.state.user_mapping
+t4 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'app': t2 - t1, 'first': t3 - t2, 'state': t4 - t3}))
+"""
+
+
+def child_env(workdir):
+    env = dict(os.environ)
+    env.update({
+        'PYTHONPATH': REPO_DIR,
+        'LOG_FILE': '',
+        'LOG_LEVEL': 'WARNING',
+        'TASK_EVENT_LOG_DIR': os.path.join(workdir, 'task_events'),
+        'ASANA_WEBHOOK_SECRETS_FILE': os.path.join(workdir, 'asana_webhook_secrets.json'),
+    })
+    return env
+
+
+def run_probe(workdir, env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_times(workdir, env, top):
+    """[(acumulado µs, propio µs, módulo)] de -X importtime, mayores primero"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help="módulos a listar de -X importtime")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='track-startup-')
+    try:
+        for name in CONFIG_FILES:
+            shutil.copy(os.path.join(REPO_DIR, name), workdir)
+        env = child_env(workdir)
+
+        results = [run_probe(workdir, env) for _ in range(args.runs)]
+        print(f"=== arranque en frío ({args.runs} procesos) ===")
+        for phase in ('import', 'app', 'first', 'state'):
+            values = sorted(r[phase] * 1000 for r in results)
+            print(f"{phase:>7}: mediana {statistics.median(values):7.1f} ms  min {values[0]:7.1f} ms")
+        total = sorted(sum(r.values()) * 1000 for r in results)
+        print(f"{'total':>7}: mediana {statistics.median(total):7.1f} ms")
+
+        print(f"\n=== -X importtime: import main (top {args.top} por acumulado) ===")
+        for cumulative, self_us, name in import_times(workdir, env, args.top):
+            print(f"{cumulative / 1000:8.1f} ms  {self_us / 1000:7.1f} ms  {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
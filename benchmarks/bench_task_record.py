@@ -0,0 +1,137 @@
+"""
+Memoria del mapeo de tareas: dicts (como vienen de task_mapping.json) contra
+TaskRecord.
+
+Genera --tasks entradas realistas (pocos canales, usuarios y proyectos que
+se repiten), las serializa a JSON y las vuelve a cargar como haría el
+servicio al arrancar, y mide con tracemalloc cuánta memoria ocupa el mapeo
+en cada representación. También compara el costo de los accesos que hacen
+los handlers (task_info['asana_gid'], task_info.get('completed_at'), y por
+atributo en TaskRecord) y de volver a serializar el mapeo.
+
+Ejemplos:
+    python -m benchmarks.bench_task_record
+    python -m benchmarks.bench_task_record --tasks 200000
+"""
+
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+from benchmarks.load_test import REPO_DIR
+
+sys.path.insert(0, REPO_DIR)
+from task_record import TaskRecord, json_default  # noqa: E402
+
+
+def build_mapping_json(count, channels, users, projects):
+    now = time.time()
+    mapping = {}
+    for i in range(count):
+        channel = f"C{random.randrange(channels):010d}"
+        message_ts = f"{now - i * 37:.6f}"
+        mapping[f"{channel}:{message_ts}"] = {
+            'asana_gid': str(1_210_000_000_000_000 + i),
+            'channel': channel,
+            'message_ts': message_ts,
+            'user_who_posted': f"U{random.randrange(users):010d}",
+            'assigned_to': f"U{random.randrange(users):010d}",
+            'project_id': str(1_210_800_000_000_000 + random.randrange(projects)),
+            'created_at': now - i * 37 + 4.5,
+            'can_be_cancelled': False,
+            'task_name': f"Mandar el resumen de la reunión {i}",
+            'text_hash': f"{random.getrandbits(64):016x}",
+            'thread_ts': f"{now - i * 37 - 600:.6f}" if i % 3 == 0 else None,
+        }
+        if i % 2:
+            mapping[f"{channel}:{message_ts}"]['completed_at'] = now - i * 30
+    return json.dumps(mapping)
+
+
+def measure(load, raw):
+    """(mapeo, bytes que ocupa en memoria)"""
+    gc.collect()
+    tracemalloc.start()
+    mapping = load(raw)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return mapping, size
+
+
+def load_dicts(raw):
+    return json.loads(raw)
+
+
+def load_records(raw):
+    return {task_key: TaskRecord.from_dict(task) for task_key, task in json.loads(raw).items()}
+
+
+def access_ns(mapping, rounds=3):
+    values = list(mapping.values())
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for task_info in values:
+            task_info['asana_gid']
+            task_info.get('completed_at')
+        elapsed = (time.perf_counter_ns() - start) / len(values)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def attribute_access_ns(mapping, rounds=3):
+    """Lo mismo por atributo, como los recorridos por asana_gid de main.py"""
+    values = list(mapping.values())
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        for task_info in values:
+            task_info.asana_gid
+            task_info.completed_at
+        elapsed = (time.perf_counter_ns() - start) / len(values)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def dump_ms(mapping):
+    start = time.perf_counter()
+    json.dumps(mapping, default=json_default)
+    return (time.perf_counter() - start) * 1000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Memoria del mapeo: dict vs TaskRecord")
+    parser.add_argument('--tasks', type=int, default=50000)
+    parser.add_argument('--channels', type=int, default=40)
+    parser.add_argument('--users', type=int, default=60)
+    parser.add_argument('--projects', type=int, default=12)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    raw = build_mapping_json(args.tasks, args.channels, args.users, args.projects)
+
+    rows = []
+    for name, load in (('dict', load_dicts), ('TaskRecord', load_records)):
+        mapping, size = measure(load, raw)
+        rows.append((name, size, access_ns(mapping), dump_ms(mapping)))
+        if name == 'TaskRecord':
+            attribute_ns = attribute_access_ns(mapping)
+        del mapping
+
+    print(f"\n=== mapeo de {args.tasks} tareas ({args.channels} canales, {args.users} usuarios, {args.projects} proyectos) ===")
+    print(f"{'':<12}{'memoria (MB)':>14}{'bytes/tarea':>13}{'acceso (ns)':>13}{'json (ms)':>11}")
+    for name, size, access, dump in rows:
+        print(f"{name:<12}{size / 1e6:>14.1f}{size // args.tasks:>13}{access:>13.0f}{dump:>11.0f}")
+    print(f"acceso por atributo (TaskRecord): {attribute_ns:.0f} ns")
+    print(f"reducción: {100 * (1 - rows[1][1] / rows[0][1]):.0f}%")
+
+
+if __name__ == '__main__':
+    main()
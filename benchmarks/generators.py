@@ -0,0 +1,133 @@
+"""
+Generadores de requests firmados para los escenarios de carga.
+"""
+
+import hmac
+import json
+import time
+import hashlib
+import random
+from urllib.parse import urlencode
+
+
+def signed_slack_request(payload, signing_secret, timestamp=None):
+    """Body + headers con la firma v0 que valida /slack/events"""
+    body = json.dumps(payload, separators=(',', ':'))
+    timestamp = str(int(timestamp or time.time()))
+    base = f"v0:{timestamp}:{body}".encode()
+    signature = 'v0=' + hmac.new(signing_secret.encode(), base, hashlib.sha256).hexdigest()
+    return body.encode(), {
+        'Content-Type': 'application/json',
+        'X-Slack-Request-Timestamp': timestamp,
+        'X-Slack-Signature': signature,
+    }
+
+
+def signed_slack_form(payload, signing_secret, timestamp=None):
+    """Body form-encoded (payload=<json>) + headers firmados, como /slack/interactions"""
+    body = urlencode({'payload': json.dumps(payload, separators=(',', ':'))})
+    timestamp = str(int(timestamp or time.time()))
+    base = f"v0:{timestamp}:{body}".encode()
+    signature = 'v0=' + hmac.new(signing_secret.encode(), base, hashlib.sha256).hexdigest()
+    return body.encode(), {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'X-Slack-Request-Timestamp': timestamp,
+        'X-Slack-Signature': signature,
+    }
+
+
+def signed_asana_request(payload, hook_secret):
+    """Body + headers con la X-Hook-Signature que valida /asana/webhook"""
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    signature = hmac.new(hook_secret.encode(), body, hashlib.sha256).hexdigest()
+    return body, {'Content-Type': 'application/json', 'X-Hook-Signature': signature}
+
+
+def _event_callback(i, event):
+    return {
+        'type': 'event_callback',
+        'team_id': 'TBENCH',
+        'event_id': f"EvBENCH{i:08d}",
+        'event_time': int(time.time()),
+        'event': event,
+    }
+
+
+def message_event(i, channel, commitment=True, user='UBENCH0001', thread_ts=None):
+    """Mensaje de canal; con mención si es compromiso"""
+    ts = f"{1700000000 + i}.{i % 1000000:06d}"
+    if commitment:
+        text = f"<@UBENCH{random.randint(2, 50):04d}> revisá el informe {i} para mañana"
+    else:
+        text = f"buen día equipo, mensaje {i} 🙂"
+    event = {'type': 'message', 'channel': channel, 'user': user, 'text': text, 'ts': ts,
+             'event_ts': ts, 'channel_type': 'channel'}
+    if thread_ts:
+        event['thread_ts'] = thread_ts
+    return _event_callback(i, event)
+
+
+def reaction_event(i, channel, reaction='no_entry_sign', user='UBENCH0001'):
+    """Reacción sobre un mensaje que no generó tarea (camino rápido)"""
+    ts = f"{1600000000 + i}.000000"
+    event = {'type': 'reaction_added', 'user': user, 'reaction': reaction,
+             'item': {'type': 'message', 'channel': channel, 'ts': ts}, 'event_ts': f"{time.time():.6f}"}
+    return _event_callback(i, event)
+
+
+def noise_event(i, channel, user='UBENCH0001'):
+    """Eventos que el servicio ignora: unfurls (ediciones sin cambio de texto), joins y bots"""
+    ts = f"{1500000000 + i}.000000"
+    kind = i % 3
+    if kind == 0:
+        text = f"mirá https://example.com/doc/{i}"
+        event = {'type': 'message', 'subtype': 'message_changed', 'channel': channel, 'ts': ts, 'event_ts': ts, 'hidden': True,
+                 'message': {'type': 'message', 'user': user, 'text': text, 'ts': ts,
+                             'attachments': [{'from_url': f"https://example.com/doc/{i}", 'title': f"Doc {i}"}]},
+                 'previous_message': {'type': 'message', 'user': user, 'text': text, 'ts': ts}}
+    elif kind == 1:
+        event = {'type': 'message', 'subtype': 'channel_join', 'channel': channel, 'user': user,
+                 'text': f"<@{user}> has joined the channel", 'ts': ts, 'event_ts': ts}
+    else:
+        event = {'type': 'message', 'channel': channel, 'bot_id': 'BBENCH0001', 'app_id': 'ABENCH',
+                 'text': f"mensaje automático {i}", 'ts': ts, 'event_ts': ts}
+    return _event_callback(i, event)
+
+
+def view_submission(i, channel, project_id, user='UBENCH0001', subtasks=3, valid=True):
+    """Submit del modal de creación de tareas; con título vacío si no es válido"""
+    ts = f"{1400000000 + i}.000000"
+    values = {
+        'project_block': {'project_select': {'type': 'static_select', 'selected_option': {'value': project_id}}},
+        'title_block': {'title_input': {'type': 'plain_text_input', 'value': f"tarea del modal {i}" if valid else '  '}},
+        'description_block': {'description_input': {'type': 'plain_text_input', 'value': f"descripción {i}"}},
+        'assignee_block': {'assignee_select': {'type': 'users_select', 'selected_user': f"UBENCH{i % 50 + 2:04d}"}},
+        'due_date_block': {'due_date_picker': {'type': 'datepicker', 'selected_date': None}},
+        'subtasks_block': {'subtasks_input': {'type': 'plain_text_input',
+                                              'value': '\n'.join(f"subtarea {n}" for n in range(subtasks))}},
+    }
+    metadata = {'commitment_data': {'descripcion': f"tarea {i}"}, 'original_message': f"mensaje {i}",
+                'channel': channel, 'thread_ts': ts, 'message_ts': ts}
+    return {
+        'type': 'view_submission',
+        'team': {'id': 'TBENCH'},
+        'user': {'id': user},
+        'trigger_id': f"trigger-{i}",
+        'view': {'id': f"VBENCH{i:06d}", 'callback_id': 'create_asana_task_modal',
+                 'private_metadata': json.dumps(metadata), 'state': {'values': values}},
+    }
+
+
+def asana_completion_batch(start, size, task_gids=None):
+    """Lote de eventos de Asana de tareas completadas"""
+    events = []
+    for n in range(start, start + size):
+        gid = task_gids[n % len(task_gids)] if task_gids else str(1_100_000_000_000_000 + n)
+        events.append({
+            'action': 'changed',
+            'resource': {'gid': gid, 'resource_type': 'task'},
+            'change': {'field': 'completed', 'action': 'changed', 'new_value': {'resource_subtype': 'completed'}},
+            'user': {'gid': '1135655662306900', 'resource_type': 'user'},
+            'created_at': f"2025-01-01T00:00:{n % 60:02d}.{n:06d}Z",
+        })
+    return {'events': events}
@@ -0,0 +1,319 @@
+"""
+Prueba de carga reproducible del servicio contra mocks locales de Slack,
+Asana y OpenAI (ver benchmarks/mock_upstreams.py).
+
+Levanta los mocks, arranca la app bajo gunicorn (o en proceso con
+werkzeug si gunicorn no está disponible, o el entry point ASGI bajo
+uvicorn) en un directorio temporal, corre
+el escenario y reporta p50/p95/p99 de los requests, eventos/seg y las
+llamadas salientes que generó el trabajo en background.
+
+Escenarios:
+    message_storm   mensajes de Slack (compromisos según --commitment-ratio)
+    reaction_storm  reacciones que no corresponden a tareas
+    noise_storm     eventos que se descartan (ediciones, joins, bots)
+    asana_batches   lotes de eventos de tareas completadas del webhook de Asana
+    modal_submits   submits del modal de creación (--invalid-ratio con errores
+                    de validación); la tarea y sus subtareas se crean en background
+
+Ejemplos:
+    python -m benchmarks.load_test --scenario message_storm --events 500 --concurrency 32
+    python -m benchmarks.load_test --scenario asana_batches --events 2000 --batch-size 50 --latency 0.1
+    python -m benchmarks.load_test --scenario message_storm --rate-429 0.05 --server inprocess
+    python -m benchmarks.load_test --scenario message_storm --events 2000 --concurrency 256 --server uvicorn
+    python -m benchmarks.load_test --scenario modal_submits --events 300 --latency 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import mock_upstreams, generators
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import webhook_secrets  # noqa: E402
+
+SIGNING_SECRET = 'bench-signing-secret'
+HOOK_SECRET = 'bench-hook-secret'
+HANDSHAKE_KEY = 'bench-handshake-key'
+# Archivos de configuración que main.py lee desde el directorio de trabajo
+CONFIG_FILES = ('merged_accounts.json', 'asana_pj.json')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def mapped_channel():
+    with open(os.path.join(REPO_DIR, 'channel_map.json')) as f:
+        return next(iter(json.load(f)))
+
+
+def app_env(workdir, upstream_url):
+    env = dict(os.environ)
+    env.update(mock_upstreams.upstream_env(upstream_url))
+    env.update({
+        'SLACK_SIGNING_SECRET': SIGNING_SECRET,
+        'SLACK_BOT_TOKEN': 'xoxb-bench',
+        'OPENAI_API_KEY': 'sk-bench',
+        'ASANA_PERSONAL_ACCESS_TOKEN': 'bench',
+        'ASANA_WEBHOOK_HANDSHAKE_TOKEN': HANDSHAKE_KEY,
+        'LOG_FILE': '',
+        'LOG_LEVEL': 'WARNING',
+        'TASK_EVENT_LOG_DIR': os.path.join(workdir, 'task_events'),
+        'ASANA_WEBHOOK_SECRETS_FILE': os.path.join(workdir, 'asana_webhook_secrets.json'),
+        'ASANA_SYNC_TOKENS_FILE': os.path.join(workdir, 'asana_sync_tokens.json'),
+        'SLACK_OUTBOX_FILE': os.path.join(workdir, 'slack_outbox.json'),
+        'PENDING_JOBS_FILE': os.path.join(workdir, 'pending_jobs.json'),
+        # La reconciliación se mide aparte (bench_reconciler)
+        'ASANA_RECONCILE_INTERVAL': '0',
+    })
+    return env
+
+
+class GunicornServer:
+    def __init__(self, workdir, env, workers, threads):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        cmd = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{self.port}",
+               '--workers', str(workers), '--threads', str(threads), '--timeout', '0',
+               '--chdir', workdir, '--pythonpath', REPO_DIR, '--log-level', 'warning', 'main:app']
+        self.process = subprocess.Popen(cmd, env=env)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+class UvicornServer:
+    """asgi:app bajo uvicorn (un proceso, event loop + pool de threads)"""
+
+    def __init__(self, workdir, env):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        cmd = [sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(self.port),
+               '--app-dir', REPO_DIR, '--log-level', 'warning', '--no-access-log', 'asgi:app']
+        self.process = subprocess.Popen(cmd, env=env, cwd=workdir)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+class InProcessServer:
+    """Alternativa sin gunicorn: werkzeug multi-thread en este proceso"""
+
+    def __init__(self, workdir, env):
+        from werkzeug.serving import make_server
+        os.environ.update(env)
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_DIR)
+        import main
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = make_server('127.0.0.1', self.port, main.app, threaded=True)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"El servidor no respondió en {url}")
+
+
+def build_requests(args, url):
+    """Devuelve [(path, body, headers, cantidad de eventos)] del escenario"""
+    channel = mapped_channel()
+    reqs = []
+    if args.scenario == 'message_storm':
+        every = max(1, round(1 / args.commitment_ratio)) if args.commitment_ratio > 0 else 0
+        for i in range(args.events):
+            commitment = bool(every) and i % every == 0
+            body, headers = generators.signed_slack_request(generators.message_event(i, channel, commitment), SIGNING_SECRET)
+            reqs.append(('/slack/events', body, headers, 1))
+    elif args.scenario == 'reaction_storm':
+        for i in range(args.events):
+            body, headers = generators.signed_slack_request(generators.reaction_event(i, channel), SIGNING_SECRET)
+            reqs.append(('/slack/events', body, headers, 1))
+    elif args.scenario == 'noise_storm':
+        for i in range(args.events):
+            body, headers = generators.signed_slack_request(generators.noise_event(i, channel), SIGNING_SECRET)
+            reqs.append(('/slack/events', body, headers, 1))
+    elif args.scenario == 'modal_submits':
+        with open(os.path.join(REPO_DIR, 'channel_map.json')) as f:
+            project_id = json.load(f)[channel]
+        every = max(1, round(1 / args.invalid_ratio)) if args.invalid_ratio > 0 else 0
+        for i in range(args.events):
+            valid = not (every and i % every == 0)
+            body, headers = generators.signed_slack_form(generators.view_submission(i, channel, project_id, valid=valid), SIGNING_SECRET)
+            reqs.append(('/slack/interactions', body, headers, 1))
+    elif args.scenario == 'asana_batches':
+        path = '/asana/webhook?resource=bench'
+        token = webhook_secrets.handshake_token('bench', key=HANDSHAKE_KEY)
+        requests.post(f"{url}{path}&token={token}", headers={'X-Hook-Secret': HOOK_SECRET}).raise_for_status()
+        for start in range(0, args.events, args.batch_size):
+            size = min(args.batch_size, args.events - start)
+            body, headers = generators.signed_asana_request(generators.asana_completion_batch(start, size), HOOK_SECRET)
+            reqs.append((path, body, headers, size))
+    return reqs
+
+
+def fire(url, reqs, concurrency):
+    """Envía los requests con `concurrency` clientes; devuelve latencias y status"""
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(item):
+        path, body, headers, _ = item
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = session.post(f"{url}{path}", data=body, headers=headers, timeout=60).status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, reqs))
+    return time.perf_counter() - start, sorted(latencies), statuses
+
+
+def wait_drain(state, idle=1.0, timeout=120):
+    """Espera a que el trabajo en background deje de generar llamadas salientes"""
+    deadline = time.time() + timeout
+    last, last_change = None, time.time()
+    while time.time() < deadline:
+        current = sum(state.snapshot()[0].values())
+        if current != last:
+            last, last_change = current, time.time()
+        elif time.time() - last_change >= idle:
+            return
+        time.sleep(0.1)
+
+
+def report(args, elapsed, latencies, statuses, state, drain_elapsed):
+    events = args.events
+    calls, throttled = state.snapshot()
+    result = {
+        'scenario': args.scenario,
+        'server': args.server,
+        'requests': len(latencies),
+        'events': events,
+        'concurrency': args.concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'events_per_s': round(events / elapsed, 1) if elapsed else None,
+        'requests_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2) if latencies else 0,
+        },
+        'status': {str(k): v for k, v in statuses.items()},
+        'background_drain_s': round(drain_elapsed, 3),
+        'upstream_calls': calls,
+        'upstream_429': throttled,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"\n=== {args.scenario} ({args.server}) ===")
+    print(f"requests: {result['requests']}  events: {events}  concurrency: {args.concurrency}")
+    print(f"throughput: {result['events_per_s']} events/s ({result['requests_per_s']} req/s) en {result['elapsed_s']} s")
+    lat = result['latency_ms']
+    print(f"latencia ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+    print(f"status: {result['status']}")
+    print(f"background drenado en {result['background_drain_s']} s")
+    for endpoint, count in sorted(calls.items()):
+        print(f"  {endpoint}: {count}" + (f" ({throttled[endpoint]} x 429)" if endpoint in throttled else ''))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga con mocks locales")
+    parser.add_argument('--scenario', choices=['message_storm', 'reaction_storm', 'noise_storm', 'asana_batches', 'modal_submits'], default='message_storm')
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=50, help="eventos por POST en asana_batches")
+    parser.add_argument('--commitment-ratio', type=float, default=1.0, help="fracción de mensajes que son compromisos")
+    parser.add_argument('--invalid-ratio', type=float, default=0.0, help="fracción de submits inválidos en modal_submits")
+    parser.add_argument('--latency', type=float, default=0.02, help="latencia de los mocks (s)")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--server', choices=['gunicorn', 'inprocess', 'uvicorn'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help="imprimir el resultado como JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = mock_upstreams.UpstreamConfig(args.latency, args.jitter, args.rate_429)
+    upstream_server, state, upstream_url = mock_upstreams.start(config=config)
+
+    workdir = tempfile.mkdtemp(prefix='track-bench-')
+    for name in CONFIG_FILES:
+        shutil.copy(os.path.join(REPO_DIR, name), workdir)
+    env = app_env(workdir, upstream_url)
+
+    if args.server == 'gunicorn':
+        server = GunicornServer(workdir, env, args.workers, args.threads)
+    elif args.server == 'uvicorn':
+        server = UvicornServer(workdir, env)
+    else:
+        server = InProcessServer(workdir, env)
+    try:
+        wait_ready(server.url)
+        reqs = build_requests(args, server.url)
+        elapsed, latencies, statuses = fire(server.url, reqs, args.concurrency)
+        drain_start = time.perf_counter()
+        wait_drain(state)
+        drain_elapsed = time.perf_counter() - drain_start
+        report(args, elapsed, latencies, statuses, state, drain_elapsed)
+    finally:
+        server.stop()
+        upstream_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Stand-in local del websocket de Socket Mode de Slack, sin dependencias.
+
+Implementa lo mínimo del protocolo WebSocket (handshake, frames de texto,
+ping/pong y close) para que socket_mode.py se conecte como lo haría contra
+wss://wss-primary.slack.com. mock_upstreams devuelve esta URL en
+apps.connections.open cuando se le pasa `socket_url`.
+
+    server, socket_state, ws_url = mock_socket_mode.start()
+    socket_state.wait_connected()
+    envelope_id = socket_state.send_event(payload)
+    socket_state.wait_acks(1)
+"""
+
+import json
+import time
+import uuid
+import base64
+import hashlib
+import threading
+import socketserver
+
+_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_OP_TEXT, _OP_CLOSE, _OP_PING, _OP_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def _encode_frame(opcode, payload):
+    """Frame del servidor: FIN + opcode, sin máscara"""
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header.append(length)
+    elif length < 65536:
+        header.append(126)
+        header += length.to_bytes(2, 'big')
+    else:
+        header.append(127)
+        header += length.to_bytes(8, 'big')
+    return bytes(header) + payload
+
+
+def _read_exact(rfile, size):
+    data = rfile.read(size)
+    if len(data) < size:
+        raise ConnectionError("socket cerrado")
+    return data
+
+
+def _read_frame(rfile):
+    """Frame del cliente (siempre enmascarado); devuelve (opcode, payload)"""
+    first, second = _read_exact(rfile, 2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = int.from_bytes(_read_exact(rfile, 2), 'big')
+    elif length == 127:
+        length = int.from_bytes(_read_exact(rfile, 8), 'big')
+    mask = _read_exact(rfile, 4) if second & 0x80 else None
+    payload = _read_exact(rfile, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+class SocketModeState:
+    """Conexiones abiertas, envelopes enviados y acks recibidos"""
+
+    def __init__(self):
+        self.connections = []
+        self.connects = 0
+        self.sent = {}
+        self.acks = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _register(self, connection):
+        with self._changed:
+            self.connections.append(connection)
+            self.connects += 1
+            self._changed.notify_all()
+
+    def _unregister(self, connection):
+        with self._changed:
+            if connection in self.connections:
+                self.connections.remove(connection)
+            self._changed.notify_all()
+
+    def _ack(self, envelope_id):
+        with self._changed:
+            self.acks.setdefault(envelope_id, time.perf_counter())
+            self._changed.notify_all()
+
+    def wait_connected(self, connects=1, timeout=30):
+        """Espera a que haya una conexión abierta y `connects` conexiones en total"""
+        with self._changed:
+            if not self._changed.wait_for(lambda: self.connections and self.connects >= connects, timeout):
+                raise TimeoutError("el cliente de Socket Mode no se conectó")
+
+    def wait_acks(self, count, timeout=60):
+        with self._changed:
+            return self._changed.wait_for(lambda: len(self.acks) >= count, timeout)
+
+    def _send_json(self, message):
+        with self._lock:
+            connection = self.connections[-1] if self.connections else None
+        if connection is None:
+            raise ConnectionError("no hay cliente conectado")
+        connection.send_text(json.dumps(message))
+
+    def send_event(self, payload, envelope_type='events_api'):
+        """Envía un envelope como los de Slack; devuelve su envelope_id"""
+        envelope_id = str(uuid.uuid4())
+        with self._lock:
+            self.sent[envelope_id] = time.perf_counter()
+        self._send_json({
+            'envelope_id': envelope_id,
+            'type': envelope_type,
+            'payload': payload,
+            'accepts_response_payload': False,
+            'retry_attempt': 0,
+        })
+        return envelope_id
+
+    def request_reconnect(self, reason='refresh_requested'):
+        """Imita el `disconnect` que Slack manda antes de rotar la conexión"""
+        self._send_json({'type': 'disconnect', 'reason': reason})
+
+    def ack_latencies(self):
+        """Segundos entre el envío de cada envelope y su ack"""
+        with self._lock:
+            return sorted(self.acks[k] - self.sent[k] for k in self.acks if k in self.sent)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    state = None
+
+    def handle(self):
+        if not self._handshake():
+            return
+        self._write_lock = threading.Lock()
+        self.state._register(self)
+        try:
+            self.send_text(json.dumps({'type': 'hello', 'num_connections': 1}))
+            while True:
+                opcode, payload = _read_frame(self.rfile)
+                if opcode == _OP_TEXT:
+                    message = json.loads(payload)
+                    if message.get('envelope_id'):
+                        self.state._ack(message['envelope_id'])
+                elif opcode == _OP_PING:
+                    self._write(_encode_frame(_OP_PONG, payload))
+                elif opcode == _OP_CLOSE:
+                    self._write(_encode_frame(_OP_CLOSE, payload[:2]))
+                    return
+        except (ConnectionError, OSError, ValueError):
+            return
+        finally:
+            self.state._unregister(self)
+
+    def _handshake(self):
+        headers = {}
+        self.rfile.readline()
+        while True:
+            line = self.rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if not key:
+            self.wfile.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + _GUID).encode()).digest()).decode()
+        self.wfile.write((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+        return True
+
+    def _write(self, data):
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def send_text(self, text):
+        self._write(_encode_frame(_OP_TEXT, text.encode()))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start(port=0):
+    """Levanta el stand-in en un thread; devuelve (server, state, ws_url)"""
+    state = SocketModeState()
+    handler = type('Handler', (_Handler,), {'state': state})
+    server = _Server(('127.0.0.1', port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='mock-socket-mode')
+    thread.daemon = True
+    thread.start()
+    return server, state, f"ws://127.0.0.1:{server.server_address[1]}/link"
@@ -0,0 +1,286 @@
+"""
+Servidor HTTP local que imita los endpoints de Slack, Asana y OpenAI que
+usa el servicio, con latencia configurable e inyección de 429.
+
+Todas las APIs se sirven desde el mismo puerto bajo prefijos distintos:
+
+    SLACK_API_URL  = http://127.0.0.1:<port>/slack/api
+    ASANA_API_URL  = http://127.0.0.1:<port>/asana/api/1.0
+    OPENAI_API_URL = http://127.0.0.1:<port>/openai/v1
+
+Uso standalone:
+    python -m benchmarks.mock_upstreams --port 8900 --latency 0.05 --rate-429 0.02
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class UpstreamConfig:
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+
+
+class MockUpstreams:
+    """Estado compartido: configuración, contadores y datos generados"""
+
+    def __init__(self, config=None):
+        self.config = config or UpstreamConfig()
+        self.calls = Counter()
+        self.throttled = Counter()
+        self._gids = itertools.count(1_000_000_000_000_000)
+        self._lock = threading.Lock()
+        # canal -> lista de mensajes (para conversations.history)
+        self.history = {}
+        # URL que devuelve apps.connections.open (ver mock_socket_mode)
+        self.socket_url = None
+        # gid -> tarea de Asana creada (None si se borró) y proyecto -> eventos (/events)
+        self.tasks = {}
+        self.project_events = defaultdict(list)
+
+    def next_gid(self):
+        with self._lock:
+            return str(next(self._gids))
+
+    def create_task(self, data):
+        task = {'gid': self.next_gid(), 'completed': False, **data}
+        with self._lock:
+            self.tasks[task['gid']] = task
+            self._task_event(task, 'added')
+        return task
+
+    def complete_task(self, gid):
+        """Completa la tarea del lado de Asana (sin entregar el webhook)"""
+        with self._lock:
+            self.tasks[gid]['completed'] = True
+            self._task_event(self.tasks[gid], 'changed')
+
+    def delete_task(self, gid):
+        with self._lock:
+            task = self.tasks.get(gid)
+            if task:
+                self.tasks[gid] = None
+                self._task_event(task, 'deleted')
+
+    def _task_event(self, task, action):
+        for project in task.get('projects') or []:
+            self.project_events[project].append(
+                {'action': action, 'resource': {'gid': task['gid'], 'resource_type': 'task'}})
+
+    def count(self, endpoint, throttled=False):
+        with self._lock:
+            self.calls[endpoint] += 1
+            if throttled:
+                self.throttled[endpoint] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.calls), dict(self.throttled)
+
+
+def _evaluation(text):
+    if '<@' in text:
+        return {"es_compromiso": True, "asignado_a": None, "descripcion": "tarea de benchmark", "fecha_limite": "mañana"}
+    return {"es_compromiso": False}
+
+
+_BATCH_LINE_RE = re.compile(r'^\[(\d+)\] (.*)$', re.M)
+
+
+def _openai_reply(body):
+    """
+    Compromiso si el mensaje menciona a alguien; imita el JSON del prompt.
+    Los pedidos en lote (llm_evaluator.build_batch_prompt) reciben un array.
+    """
+    messages = body.get('messages', [])
+    text = messages[-1]['content'] if messages else ''
+    if text.startswith('Mensajes a evaluar'):
+        content = [{"id": int(i), **_evaluation(line)} for i, line in _BATCH_LINE_RE.findall(text)]
+    else:
+        content = _evaluation(text)
+    return {"choices": [{"message": {"role": "assistant", "content": json.dumps(content)}}]}
+
+
+def _slack_reply(state, method, params):
+    if method == 'users.info':
+        user = params.get('user', 'U000')
+        return {"ok": True, "user": {"id": user, "name": user.lower(), "real_name": f"User {user}",
+                                     "profile": {"email": f"{user.lower()}@example.com"}}}
+    if method == 'conversations.info':
+        channel = params.get('channel', 'C000')
+        return {"ok": True, "channel": {"id": channel, "name": f"canal-{channel.lower()}"}}
+    if method == 'conversations.history':
+        # Del más nuevo al más viejo, como Slack; latest/oldest son exclusivos
+        messages = state.history.get(params.get('channel'), [])
+        if params.get('latest'):
+            messages = [m for m in messages if float(m['ts']) < float(params['latest'])]
+        if params.get('oldest'):
+            messages = [m for m in messages if float(m['ts']) > float(params['oldest'])]
+        cursor = int(params.get('cursor') or 0)
+        limit = int(params.get('limit') or 100)
+        page = messages[cursor:cursor + limit]
+        next_cursor = str(cursor + limit) if cursor + limit < len(messages) else ''
+        return {"ok": True, "messages": page, "has_more": bool(next_cursor),
+                "response_metadata": {"next_cursor": next_cursor}}
+    if method == 'apps.connections.open':
+        if not state.socket_url:
+            return {"ok": False, "error": "socket_mode_not_enabled"}
+        return {"ok": True, "url": state.socket_url}
+    if method in ('chat.postMessage', 'chat.postEphemeral'):
+        return {"ok": True, "ts": f"{time.time():.6f}", "message_ts": f"{time.time():.6f}"}
+    return {"ok": True}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if not raw:
+            return {}
+        if 'application/json' in (self.headers.get('Content-Type') or ''):
+            return json.loads(raw)
+        return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+    def _handle(self, verb):
+        config = self.state.config
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self._read_body()
+        endpoint = f"{verb} {re.sub(r'/[0-9]{6,}', '/{gid}', url.path)}"
+
+        delay = config.latency + random.uniform(0, config.jitter)
+        if delay:
+            time.sleep(delay)
+        if config.rate_429 and random.random() < config.rate_429:
+            self.state.count(endpoint, throttled=True)
+            return self._send(429, {"ok": False, "error": "ratelimited"}, {'Retry-After': str(config.retry_after)})
+        self.state.count(endpoint)
+
+        path = url.path
+        if path.startswith('/slack/api/'):
+            params.update(body)
+            return self._send(200, _slack_reply(self.state, path[len('/slack/api/'):], params))
+        if path == '/openai/v1/chat/completions':
+            return self._send(200, _openai_reply(body))
+        if path.startswith('/asana/api/1.0/'):
+            return self._asana(verb, path[len('/asana/api/1.0'):], body, params)
+        self._send(404, {"error": "not found"})
+
+    def _asana(self, verb, path, body, params):
+        if verb == 'POST' and path == '/tasks':
+            return self._send(201, {"data": self.state.create_task(body.get('data', {}))})
+        if verb == 'GET' and path == '/events':
+            # Sync token = cantidad de eventos ya entregados; sin token (o uno desconocido) -> 412
+            events = self.state.project_events[params.get('resource')]
+            sync = params.get('sync', '')
+            if not sync.startswith('sync-') or int(sync[5:]) > len(events):
+                return self._send(412, {"errors": [{"message": "Sync token invalid or too old"}], "sync": f"sync-{len(events)}"})
+            page = events[int(sync[5:]):int(sync[5:]) + 100]
+            next_sync = int(sync[5:]) + len(page)
+            return self._send(200, {"data": page, "sync": f"sync-{next_sync}", "has_more": next_sync < len(events)})
+        if verb == 'GET' and path == '/tasks':
+            tasks = [t for t in list(self.state.tasks.values()) if t and params.get('project') in (t.get('projects') or [])]
+            offset, limit = int(params.get('offset', 0)), int(params.get('limit', 100))
+            next_page = {"offset": str(offset + limit)} if offset + limit < len(tasks) else None
+            return self._send(200, {"data": [{"gid": t['gid'], "completed": t['completed']} for t in tasks[offset:offset + limit]],
+                                    "next_page": next_page})
+        if verb == 'POST' and path == '/webhooks':
+            return self._send(201, {"data": {"gid": self.state.next_gid(), **body.get('data', {})}})
+        if verb == 'GET' and path == '/workspaces':
+            return self._send(200, {"data": [{"gid": "1", "name": "Benchmark"}]})
+        if verb == 'GET' and path.startswith('/workspaces/'):
+            return self._send(200, {"data": []})
+        if verb in ('GET', 'DELETE') and path.startswith('/tasks/'):
+            gid = path.split('/')[2]
+            task = self.state.tasks.get(gid, {'gid': gid, 'completed': False})
+            if task is None:
+                return self._send(404, {"errors": [{"message": "task: Unknown object"}]})
+            if verb == 'DELETE':
+                self.state.delete_task(gid)
+                return self._send(200, {"data": {}})
+            return self._send(200, {"data": {"gid": gid, "completed": task['completed']}})
+        if verb in ('DELETE', 'PUT', 'GET'):
+            return self._send(200, {"data": {}})
+        self._send(404, {"errors": [{"message": "not found"}]})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def start(port=0, config=None):
+    """Levanta el servidor en un thread; devuelve (server, state, base_url)"""
+    state = MockUpstreams(config)
+    handler = type('Handler', (_Handler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='mock-upstreams')
+    thread.daemon = True
+    thread.start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def upstream_env(base_url):
+    """Variables de entorno que apuntan los clientes al servidor mock"""
+    return {
+        'SLACK_API_URL': f"{base_url}/slack/api",
+        'ASANA_API_URL': f"{base_url}/asana/api/1.0",
+        'OPENAI_API_URL': f"{base_url}/openai/v1",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock local de Slack, Asana y OpenAI")
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help="latencia fija por request (s)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="latencia aleatoria adicional (s)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="probabilidad de responder 429")
+    args = parser.parse_args()
+
+    server, state, base_url = start(args.port, UpstreamConfig(args.latency, args.jitter, args.rate_429))
+    for key, value in upstream_env(base_url).items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
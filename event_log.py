@@ -0,0 +1,304 @@
+"""
+Log de eventos append-only del ciclo de vida de las tareas.
+
+Cada evento (tarea creada, actualizada, cancelada, completada, archivada,
+reacción aplicada) se agrega como una línea JSON compacta al segmento activo. Las
+escrituras se acumulan en memoria y un thread las baja a disco en lote con
+un solo fsync. Cuando el segmento supera SEGMENT_MAX_BYTES se rota.
+
+`compact` resume los segmentos cerrados en un snapshot y `replay`
+reconstruye el mapeo de tareas (snapshot + segmentos posteriores), lo que
+permite recuperar el estado después de un crash. Para que el replay del
+arranque no crezca sin límite, la compactación corre sola cuando hay más de
+COMPACT_AFTER_SEGMENTS segmentos: en background al rotar y al arrancar,
+antes del replay (maybe_compact). Un lock de archivo evita que dos procesos
+compacten a la vez, y cada writer tiene tomado su segmento activo (flock
+compartido) para que la compactación de otro proceso no lo borre.
+
+El log va en el volumen de estado durable (STATE_DIR): es lo que permite
+reconstruir el mapeo después de un crash, así que no puede perderse con la
+instancia. Como el volumen puede ser compartido, cada writer crea su propio
+segmento (O_EXCL) y nunca escribe en uno que abrió otro proceso.
+
+Uso:
+    python event_log.py compact
+    python event_log.py replay
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+
+from persistence import atomic_write_json, state_path
+
+EVENT_LOG_DIR = os.getenv('TASK_EVENT_LOG_DIR') or state_path('task_events')
+SEGMENT_MAX_BYTES = int(os.getenv('TASK_EVENT_LOG_SEGMENT_BYTES', str(4 * 1024 * 1024)))
+FLUSH_INTERVAL = float(os.getenv('TASK_EVENT_LOG_FLUSH_INTERVAL', '0.5'))
+# Cantidad de eventos en buffer que dispara un flush sin esperar el intervalo
+FLUSH_BATCH = 256
+
+# Segmentos sin compactar a partir de los cuales se compacta solo
+COMPACT_AFTER_SEGMENTS = int(os.getenv('TASK_EVENT_LOG_COMPACT_SEGMENTS', '4'))
+
+SNAPSHOT_FILE = 'snapshot.json'
+COMPACT_LOCK_FILE = '.compact.lock'
+
+CREATED = 'created'
+CANCELLED = 'cancelled'
+COMPLETED = 'completed'
+REACTION = 'reaction'
+UPDATED = 'updated'
+# La tarea pasó al archivo frío (task_archive.py): sale del mapeo como una cancelada
+ARCHIVED = 'archived'
+
+
+def _segment_name(seq):
+    return f"segment-{seq:06d}.jsonl"
+
+
+def list_segments(directory):
+    """Devuelve [(seq, path)] de los segmentos ordenados"""
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith('segment-') and name.endswith('.jsonl'):
+            segments.append((int(name[8:-6]), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+class TaskEventLog:
+    """Writer del log con buffer en memoria y fsync por lote"""
+
+    def __init__(self, directory=EVENT_LOG_DIR, segment_max_bytes=SEGMENT_MAX_BYTES, flush_interval=FLUSH_INTERVAL):
+        self._directory = directory
+        self._segment_max_bytes = segment_max_bytes
+        self._flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._file = None
+        self._seq = None
+        self._thread = None
+        self._compacting = False
+        atexit.register(self.flush)
+
+    def append(self, event_type, task_key, **data):
+        """Agrega un evento al buffer; no bloquea por I/O"""
+        record = {'t': round(time.time(), 3), 'e': event_type, 'k': task_key}
+        record.update(data)
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='task-event-log')
+                self._thread.daemon = True
+                self._thread.start()
+            if len(self._buffer) >= FLUSH_BATCH:
+                self._lock.notify()
+
+    def pending(self):
+        """Eventos en buffer que todavía no se escribieron"""
+        return len(self._buffer)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._lock.wait(timeout=self._flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("❌ Error escribiendo el log de eventos de tareas")
+
+    def flush(self):
+        """Escribe el buffer en el segmento activo con un único fsync"""
+        with self._io_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            f = self._open_segment()
+            f.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            if f.tell() >= self._segment_max_bytes:
+                self._rotate()
+
+    def _open_segment(self):
+        if self._file is None:
+            os.makedirs(self._directory, exist_ok=True)
+            segments = list_segments(self._directory)
+            # Un proceso nuevo nunca continúa un segmento ajeno: siempre crea uno
+            # propio, y si otro proceso tomó el mismo número prueba el siguiente
+            seq = segments[-1][0] + 1 if segments else 1
+            while True:
+                try:
+                    fd = os.open(os.path.join(self._directory, _segment_name(seq)),
+                                 os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+                    break
+                except FileExistsError:
+                    seq += 1
+            self._seq = seq
+            self._file = os.fdopen(fd, 'ab')
+            fcntl.flock(self._file, fcntl.LOCK_SH)
+        return self._file
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if not self._compacting and len(list_segments(self._directory)) > COMPACT_AFTER_SEGMENTS:
+            self._compacting = True
+            thread = threading.Thread(target=self._compact, name='task-event-log-compact')
+            thread.daemon = True
+            thread.start()
+
+    def _compact(self):
+        try:
+            count = compact(self._directory)
+            if count:
+                logging.info("🗜️ Compacted %s task event log segments", count)
+        except Exception:
+            logging.exception("❌ Error compactando el log de eventos de tareas")
+        finally:
+            self._compacting = False
+
+
+def _apply(mapping, record):
+    """Aplica un evento sobre el mapeo; es idempotente"""
+    key = record['k']
+    event_type = record['e']
+    if event_type == CREATED:
+        mapping.setdefault(key, record['task'])
+    elif event_type in (CANCELLED, ARCHIVED):
+        mapping.pop(key, None)
+    elif event_type == COMPLETED:
+        if key in mapping:
+            mapping[key]['completed_at'] = record['t']
+    elif event_type == UPDATED:
+        if key in mapping:
+            mapping[key].update(record['fields'])
+
+
+def _read_segment(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Última línea truncada por un crash a mitad de escritura
+                logging.warning(f"⚠️ Skipping corrupt event log line in {path}")
+
+
+def _load_snapshot(directory):
+    try:
+        with open(os.path.join(directory, SNAPSHOT_FILE), 'r') as f:
+            snapshot = json.load(f)
+        return snapshot['seq'], snapshot['tasks']
+    except FileNotFoundError:
+        return 0, {}
+
+
+def replay(directory=EVENT_LOG_DIR, into=None):
+    """
+    Reconstruye el mapeo de tareas a partir del snapshot y los segmentos.
+    Si se pasa `into`, los eventos se aplican sobre ese diccionario.
+    """
+    snapshot_seq, tasks = _load_snapshot(directory)
+    mapping = into if into is not None else {}
+    for key, task in tasks.items():
+        mapping.setdefault(key, task)
+    for seq, path in list_segments(directory):
+        if seq <= snapshot_seq:
+            continue
+        for record in _read_segment(path):
+            _apply(mapping, record)
+    return mapping
+
+
+def compact(directory=EVENT_LOG_DIR):
+    """
+    Resume los segmentos cerrados en el snapshot y los elimina.
+    El segmento más nuevo y los que tenga abiertos un writer (de este u otro
+    proceso) no se tocan; se compacta hasta el primero de ellos.
+    Devuelve la cantidad de segmentos compactados (0 si otro proceso ya
+    está compactando).
+    """
+    if not os.path.isdir(directory):
+        return 0
+    with open(os.path.join(directory, COMPACT_LOCK_FILE), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0
+        return _compact_locked(directory)
+
+
+def maybe_compact(directory=EVENT_LOG_DIR, threshold=COMPACT_AFTER_SEGMENTS):
+    """Compacta si hay más de `threshold` segmentos; se llama antes del replay del arranque"""
+    if len(list_segments(directory)) <= threshold:
+        return 0
+    return compact(directory)
+
+
+def _is_closed(path):
+    """True si ningún writer tiene el segmento abierto"""
+    with open(path, 'rb') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return True
+
+
+def _compact_locked(directory):
+    snapshot_seq, tasks = _load_snapshot(directory)
+    segments = []
+    for seq, path in list_segments(directory)[:-1]:
+        if seq <= snapshot_seq:
+            # Ya está en el snapshot: quedó de una compactación interrumpida
+            os.remove(path)
+        elif _is_closed(path):
+            segments.append((seq, path))
+        else:
+            break
+    if not segments:
+        return 0
+
+    for seq, path in segments:
+        for record in _read_segment(path):
+            _apply(tasks, record)
+
+    atomic_write_json(os.path.join(directory, SNAPSHOT_FILE), {'seq': segments[-1][0], 'tasks': tasks},
+                      separators=(',', ':'), ensure_ascii=False)
+
+    for seq, path in segments:
+        os.remove(path)
+    return len(segments)
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'replay'
+    directory = argv[2] if len(argv) > 2 else EVENT_LOG_DIR
+    if command == 'compact':
+        count = compact(directory)
+        print(f"✅ {count} segmentos compactados en {os.path.join(directory, SNAPSHOT_FILE)}")
+    elif command == 'replay':
+        start = time.perf_counter()
+        mapping = replay(directory)
+        elapsed = (time.perf_counter() - start) * 1000
+        completed = sum(1 for task in mapping.values() if task.get('completed_at'))
+        print(f"📊 {len(mapping)} tareas ({completed} completadas) reconstruidas en {elapsed:.1f} ms")
+    else:
+        print(f"❌ Comando desconocido: {command}. Usar: compact | replay")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
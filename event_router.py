@@ -0,0 +1,122 @@
+"""
+Router de eventos de Slack: tabla de handlers por (type, subtype).
+
+    router = EventRouter()
+
+    @router.on('message', subtypes=(None, 'thread_broadcast'), max_concurrency=16)
+    def handle_message(event, data, **context):
+        ...
+
+- `dispatch(data, **context)` busca el handler del evento; lo que no está
+  registrado (message_changed, channel_join, app_mention, ...) se descarta
+  sin más trabajo
+- `should_drop(raw_body)` mira el body crudo con regex, antes del
+  json.loads, y descarta lo que ningún handler atendería: subtypes no
+  registrados, tipos de evento sin handler y mensajes de bots. Un `bot_id`
+  solo descarta si el body no trae mensajes anidados (attachments,
+  message_changed, thread_broadcast): ahí puede ser de otro mensaje, como el
+  de un bot compartido por una persona, y decide el chequeo ya parseado
+- `max_concurrency` limita las ejecuciones simultáneas de cada handler; el
+  que llega al límite espera su turno
+"""
+
+import re
+import logging
+import threading
+
+import metrics
+
+# Valores de "type"/"subtype" en el JSON crudo. Las comillas escapadas del
+# texto de un mensaje (\"type\") no matchean.
+_TYPE_RE = re.compile(r'"type":\s*"([a-z_]+)"')
+_SUBTYPE_RE = re.compile(r'"subtype":\s*"([a-z_]+)"')
+_BOT_RE = re.compile(r'"bot_id":\s*"')
+# Campos que anidan otros mensajes, con su propio bot_id
+_NESTED_MESSAGE_RE = re.compile(r'"(?:attachments|message|previous_message|root)":')
+
+ROUTED_EVENTS = metrics.counter('slack_events_routed_total', 'Slack events by type, subtype and routing result')
+HANDLER_IN_FLIGHT = metrics.gauge('event_handler_in_flight', 'Slack event handlers currently running')
+
+
+class Route:
+    """Un handler registrado y su límite de concurrencia"""
+
+    __slots__ = ('handler', 'name', 'max_concurrency', 'in_flight', '_semaphore', '_lock')
+
+    def __init__(self, handler, max_concurrency=None):
+        self.handler = handler
+        self.name = handler.__name__
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+
+    def __call__(self, event, data, **context):
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self.handler(event, data, **context)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+
+class EventRouter:
+    def __init__(self):
+        self._routes = {}
+        self._types = set()
+        self._subtypes = set()
+
+    def on(self, event_type, subtypes=(None,), max_concurrency=None):
+        """Decorador: registra el handler para event_type y esos subtypes (None = sin subtype)"""
+        def decorator(handler):
+            route = Route(handler, max_concurrency)
+            for subtype in subtypes:
+                self._routes[(event_type, subtype)] = route
+                if subtype is not None:
+                    self._subtypes.add(subtype)
+            self._types.add(event_type)
+            HANDLER_IN_FLIGHT.set_function(lambda: route.in_flight, handler=route.name)
+            return handler
+        return decorator
+
+    def should_drop(self, raw_body):
+        """
+        Motivo para descartar el body sin parsearlo, o None si hay que
+        parsearlo. Solo descarta lo que seguro no tiene handler; ante la
+        duda devuelve None y decide dispatch().
+        """
+        types = set(_TYPE_RE.findall(raw_body))
+        if 'event_callback' not in types:
+            return None  # url_verification y otros payloads que no son eventos
+        if _BOT_RE.search(raw_body) and not _NESTED_MESSAGE_RE.search(raw_body):
+            reason = 'bot'
+        elif not types & self._types:
+            reason = 'type'
+        else:
+            subtypes = set(_SUBTYPE_RE.findall(raw_body))
+            # El subtype del evento está entre los encontrados: si ninguno
+            # está registrado, el evento tampoco
+            if not subtypes or subtypes & self._subtypes:
+                return None
+            reason = 'subtype'
+        ROUTED_EVENTS.inc(type='unparsed', subtype='unparsed', result=f'dropped_{reason}')
+        return reason
+
+    def dispatch(self, data, **context):
+        """Ejecuta el handler del evento; devuelve False si no hay ninguno"""
+        event = data.get('event') or {}
+        event_type = event.get('type')
+        subtype = event.get('subtype')
+        route = self._routes.get((event_type, subtype))
+        if route is None:
+            ROUTED_EVENTS.inc(type=event_type, subtype=subtype or 'none', result='ignored')
+            logging.debug("⏭️ Unhandled event type: %s/%s", event_type, subtype)
+            return False
+        ROUTED_EVENTS.inc(type=event_type, subtype=subtype or 'none', result='handled')
+        route(event, data, **context)
+        return True
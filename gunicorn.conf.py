@@ -0,0 +1,18 @@
+"""
+Configuración de gunicorn (la toma sola desde el directorio de trabajo).
+
+Cloud Run manda SIGTERM y a los 10 s SIGKILL. gunicorn deja de aceptar
+requests, espera las que están en curso y al salir el worker corre
+main.shutdown: drena los jobs de fondo (creación y borrado de tareas) y
+guarda lo que no terminó para la próxima instancia. graceful_timeout tiene
+que cubrir las dos cosas y quedar debajo de los 10 s.
+"""
+
+import os
+
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '9'))
+
+
+def worker_exit(server, worker):
+    import main
+    main.shutdown()
@@ -0,0 +1,238 @@
+"""
+Interactividad de Slack: botón "Crear tarea en Asana" y modal de creación.
+
+/slack/interactions tiene que responder en menos de 3 s, así que del
+request solo sale lo que Slack necesita en la respuesta:
+- click en el botón -> se abre el modal (views.open) en un thread aparte,
+  porque el trigger_id también vence a los 3 s
+- submit del modal -> se valida acá mismo; si hay errores vuelven en la
+  respuesta (`response_action: errors`) y el modal queda abierto; si no, el
+  modal se cierra y la creación de la tarea y sus subtareas se encola en
+  InteractionWorker, que avisa el resultado con un mensaje efímero
+
+Un submit puede llegar a procesarse dos veces: el job se retoma en otra
+instancia tras un apagado (lifecycle.resume) o Slack reintenta el request.
+SubmissionLog recuerda qué vistas ya se convirtieron en tarea (view id ->
+gid de Asana) en el volumen de estado durable, y process_task_submission lo
+consulta antes de crear nada.
+"""
+
+import os
+import json
+import queue
+import logging
+import threading
+import contextvars
+from datetime import date
+from collections import OrderedDict
+
+import metrics
+from persistence import atomic_write_json, state_path
+from state_store import interaction_state
+
+INTERACTION_WORKERS = int(os.getenv('INTERACTION_WORKERS', '4'))
+MAX_SUBTASKS = int(os.getenv('MAX_SUBTASKS', '25'))
+MAX_TITLE_CHARS = 255
+SUBMISSIONS_FILE = os.getenv('TASK_SUBMISSIONS_FILE') or state_path('task_submissions.json')
+# Submits recordados; alcanza con cubrir los que pueden volver a llegar
+SUBMISSIONS_LIMIT = int(os.getenv('TASK_SUBMISSIONS_LIMIT', '5000'))
+
+TASK_BUTTON_ACTION = 'create_asana_task'
+TASK_MODAL_CALLBACK = 'create_asana_task_modal'
+
+INTERACTIONS = metrics.counter('slack_interactions_total', 'Slack interaction payloads by type and result')
+
+
+def _resolve_state(compact):
+    """
+    Completa un valor compacto ({"s": token, ...}) con el estado guardado.
+    Los botones y modales anteriores al token traen todo inline y pasan tal
+    cual. Si el token venció quedan los ts, sin compromiso ni mensaje.
+    """
+    if 's' not in compact:
+        return compact
+    data = interaction_state.get(compact['s']) or {}
+    return {
+        'state_token': compact['s'] if data else None,
+        'commitment_data': data.get('commitment_data'),
+        'original_message': data.get('original_message', ''),
+        'channel': compact.get('c'),
+        'thread_ts': compact.get('t'),
+        'message_ts': compact.get('m'),
+    }
+
+
+def read_interaction_state(raw):
+    """
+    Datos del `value` del botón "Crear tarea en Asana" o del private_metadata
+    del modal: channel/thread_ts/message_ts y, si sigue guardado, el compromiso
+    """
+    try:
+        return _resolve_state(json.loads(raw or '{}'))
+    except ValueError:
+        return {}
+
+
+def _value(values, block_id, action_id):
+    """Estado de un input del modal (view.state.values[block][action])"""
+    return (values.get(block_id) or {}).get(action_id) or {}
+
+
+def parse_task_submission(view, today=None):
+    """
+    Campos del modal de creación de tareas + errores de validación.
+    Devuelve (fields, errors); errors es {block_id: mensaje}, el formato que
+    espera Slack en `response_action: errors`.
+    """
+    values = (view.get('state') or {}).get('values') or {}
+    errors = {}
+
+    title = (_value(values, 'title_block', 'title_input').get('value') or '').strip()
+    if not title:
+        errors['title_block'] = "El título no puede estar vacío"
+    elif len(title) > MAX_TITLE_CHARS:
+        errors['title_block'] = f"El título no puede superar los {MAX_TITLE_CHARS} caracteres"
+
+    project_id = (_value(values, 'project_block', 'project_select').get('selected_option') or {}).get('value')
+    if not project_id:
+        errors['project_block'] = "Elegí un proyecto de Asana"
+
+    assignee = _value(values, 'assignee_block', 'assignee_select').get('selected_user')
+    if not assignee:
+        errors['assignee_block'] = "Elegí a quién asignar la tarea"
+
+    due_on = _value(values, 'due_date_block', 'due_date_picker').get('selected_date')
+    if due_on and due_on < (today or date.today()).isoformat():
+        errors['due_date_block'] = "La fecha límite no puede ser anterior a hoy"
+
+    subtasks = [line.strip() for line in (_value(values, 'subtasks_block', 'subtasks_input').get('value') or '').split('\n')]
+    subtasks = [line for line in subtasks if line]
+    if len(subtasks) > MAX_SUBTASKS:
+        errors['subtasks_block'] = f"Máximo {MAX_SUBTASKS} subtareas (hay {len(subtasks)})"
+
+    fields = {
+        'title': title,
+        'project_id': project_id,
+        'assignee': assignee,
+        'due_on': due_on,
+        'description': (_value(values, 'description_block', 'description_input').get('value') or '').strip(),
+        'subtasks': subtasks,
+        'metadata': read_interaction_state(view.get('private_metadata')),
+        'view_id': view.get('id'),
+    }
+    return fields, errors
+
+
+def submission_key(fields):
+    """Identidad de un submit: el id de la vista o, si no vino, el token de estado"""
+    return fields.get('view_id') or (fields.get('metadata') or {}).get('state_token')
+
+
+class SubmissionLog:
+    """Submits ya convertidos en tarea (clave -> gid), persistidos en un archivo JSON"""
+
+    def __init__(self, path=SUBMISSIONS_FILE, limit=SUBMISSIONS_LIMIT):
+        self._path = path
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._done = OrderedDict()
+        # Claves en proceso en esta instancia
+        self._running = set()
+        self._mtime = None
+        self._load()
+
+    def _load(self):
+        """Suma lo que otras instancias escribieron desde la última lectura"""
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self._path, 'r') as f:
+                saved = json.load(f)
+        except json.JSONDecodeError:
+            logging.error(f"❌ {self._path} contains invalid JSON, keeping the task submissions in memory")
+            return
+        self._mtime = mtime
+        for key, task_gid in saved.items():
+            self._done.setdefault(key, task_gid)
+
+    def claim(self, key):
+        """True si el submit hay que procesarlo: no se creó ni se está creando"""
+        if not key:
+            return True
+        with self._lock:
+            self._load()
+            if key in self._done or key in self._running:
+                return False
+            self._running.add(key)
+            return True
+
+    def release(self, key):
+        """El submit falló antes de crear la tarea: se puede volver a intentar"""
+        with self._lock:
+            self._running.discard(key)
+
+    def done(self, key, task_gid):
+        """Registra la tarea creada; se escribe ya, antes de seguir con Slack"""
+        if not key:
+            return
+        with self._lock:
+            self._load()
+            self._running.discard(key)
+            self._done[key] = task_gid
+            while len(self._done) > self._limit:
+                self._done.popitem(last=False)
+            atomic_write_json(self._path, dict(self._done))
+            self._mtime = os.stat(self._path).st_mtime_ns
+
+
+class InteractionWorker:
+    """Cola + threads que hacen el trabajo de Asana de los modales enviados"""
+
+    def __init__(self, handler, workers=INTERACTION_WORKERS):
+        self._handler = handler
+        self._workers = workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self._workers):
+                thread = threading.Thread(target=self._run, name=f'interactions-worker-{i}')
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, job):
+        """Encola un submit ya validado; no bloquea"""
+        self.start()
+        # El contexto viaja con el job para que el trace siga en el worker
+        self._queue.put((contextvars.copy_context(), job))
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def drain(self):
+        """Saca de la cola y devuelve los jobs que todavía no empezaron (apagado)"""
+        jobs = []
+        while True:
+            try:
+                _, job = self._queue.get_nowait()
+            except queue.Empty:
+                return jobs
+            jobs.append(job)
+
+    def _run(self):
+        while True:
+            ctx, job = self._queue.get()
+            try:
+                ctx.run(self._handler, job)
+            except Exception:
+                logging.exception("❌ Error procesando interacción de Slack")
+
@@ -0,0 +1,237 @@
+"""
+Trabajo en curso del proceso y apagado ordenado.
+
+La creación y el borrado de tareas corren en threads daemon fuera del
+request. Cuando Cloud Run baja una instancia manda SIGTERM y a los ~10 s
+SIGKILL: sin esto esos threads mueren a mitad de camino. Todo trabajo de
+fondo que importa pasa por acá con un `kind` y un payload JSON:
+
+    lifecycle.register('create_task', create_task_job)
+    lifecycle.spawn('create_task', event=event, commitment_data=commitment_data)
+    lifecycle.call_later(300, 'disable_cancellation', task_key=task_key)
+    with lifecycle.track('task_submission', fields=fields):   # en un worker propio
+        ...
+
+shutdown(grace):
+1. deja de aceptar trabajo: spawn/call_later guardan el job para la próxima
+   instancia en lugar de arrancarlo
+2. cancela los timers (se guardan con su hora de vencimiento)
+3. espera hasta `grace` segundos a que terminen los jobs en curso
+4. guarda lo que no terminó, más lo que devuelvan los drainers (colas de
+   workers con jobs sin empezar), en un archivo propio de la instancia junto
+   a PENDING_JOBS_FILE (pending_jobs.<id>.json)
+5. baja a disco el estado pendiente (persistence.flush_all)
+
+PENDING_JOBS_FILE va en el volumen de estado durable (STATE_DIR): el disco
+local de Cloud Run se pierde con la instancia, y con él los jobs guardados.
+Como el volumen es compartido, cada instancia escribe su propio archivo y
+dos apagados a la vez no se pisan.
+
+resume() toma esos archivos al arrancar (cada uno con un rename, así con
+varias instancias o workers lo retoma uno solo) y vuelve a lanzar cada job. Un job que quedó a medias se
+corre de nuevo: los handlers tienen que tolerar que parte ya se haya hecho.
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import logging
+import threading
+import contextlib
+
+import metrics
+import tracing
+import persistence
+
+PENDING_JOBS_FILE = os.getenv('PENDING_JOBS_FILE') or persistence.state_path('pending_jobs.json')
+# Segundos que el apagado espera a los jobs en curso antes de guardarlos
+SHUTDOWN_GRACE = float(os.getenv('SHUTDOWN_GRACE', '6'))
+
+JOBS = metrics.counter('lifecycle_jobs_total', 'Background jobs by kind and outcome')
+
+
+def _json_default(value):
+    # TaskRecord y similares
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Lifecycle:
+    """Registro de jobs en curso, timers y colas a drenar al apagar"""
+
+    def __init__(self, pending_path=PENDING_JOBS_FILE):
+        self._pending_path = pending_path
+        root, ext = os.path.splitext(pending_path)
+        # Archivo propio de esta instancia; resume() no lo toma
+        self._own_path = f"{root}.{uuid.uuid4().hex}{ext}"
+        self._pending_glob = f"{glob.escape(root)}.*{ext}"
+        self._handlers = {}
+        self._drainers = []
+        # id -> (kind, payload); jobs corriendo
+        self._running = {}
+        # id -> (kind, payload, due, timer); jobs programados
+        self._timers = {}
+        self._accepting = True
+        self._cond = threading.Condition()
+
+    @property
+    def accepting(self):
+        return self._accepting
+
+    def register(self, kind, handler):
+        """Función que corre los jobs de `kind` (handler(**payload))"""
+        self._handlers[kind] = handler
+
+    def add_drainer(self, drainer):
+        """drainer() -> [(kind, payload)] de una cola con jobs todavía sin empezar"""
+        self._drainers.append(drainer)
+
+    def in_flight(self):
+        return len(self._running) + len(self._timers)
+
+    @contextlib.contextmanager
+    def track(self, kind, **payload):
+        """Marca un job como en curso mientras dura el bloque"""
+        job_id = uuid.uuid4().hex
+        with self._cond:
+            self._running[job_id] = (kind, payload)
+        try:
+            yield
+            JOBS.inc(kind=kind, result='done')
+        except Exception:
+            JOBS.inc(kind=kind, result='error')
+            raise
+        finally:
+            with self._cond:
+                self._running.pop(job_id, None)
+                self._cond.notify_all()
+
+    def spawn(self, kind, **payload):
+        """Corre el job en un thread daemon; durante el apagado lo guarda para después"""
+        if not self._accepting:
+            self._save_for_later([(kind, payload)])
+            return
+        thread = threading.Thread(target=tracing.wrap(self._run), args=(kind, payload), name=f'job-{kind}')
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, kind, payload):
+        try:
+            with self.track(kind, **payload):
+                self._handlers[kind](**payload)
+        except Exception:
+            logging.exception(f"❌ Error en el job {kind}")
+
+    def call_later(self, delay, kind, **payload):
+        """Corre el job dentro de `delay` segundos (timer que sobrevive al reinicio)"""
+        due = time.time() + delay
+        if not self._accepting:
+            self._save_for_later([(kind, dict(payload, _due=due))])
+            return
+        job_id = uuid.uuid4().hex
+
+        def fire():
+            with self._cond:
+                if self._timers.pop(job_id, None) is None:
+                    return
+            self._run(kind, payload)
+
+        timer = threading.Timer(max(0.0, delay), tracing.wrap(fire))
+        timer.daemon = True
+        with self._cond:
+            self._timers[job_id] = (kind, payload, due, timer)
+        timer.start()
+
+    def shutdown(self, grace=SHUTDOWN_GRACE):
+        """Drena y guarda el trabajo pendiente; devuelve la cantidad de jobs guardados"""
+        deadline = time.monotonic() + grace
+        with self._cond:
+            if not self._accepting:
+                return 0
+            self._accepting = False
+            timers, self._timers = self._timers, {}
+        logging.info("🛑 Shutting down: %s jobs running, %s scheduled", len(self._running), len(timers))
+
+        undone = []
+        for kind, payload, due, timer in timers.values():
+            timer.cancel()
+            undone.append((kind, dict(payload, _due=due)))
+
+        with self._cond:
+            while self._running and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            undone.extend(self._running.values())
+
+        for drainer in self._drainers:
+            try:
+                undone.extend(drainer())
+            except Exception:
+                logging.exception("❌ Error drenando una cola al apagar")
+
+        self._save_for_later(undone)
+        persistence.flush_all()
+        logging.info("🛑 Shutdown complete: %s jobs saved for the next instance", len(undone))
+        return len(undone)
+
+    def _save_for_later(self, jobs):
+        if not jobs:
+            return
+        with self._cond:
+            try:
+                with open(self._own_path, 'r') as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = []
+            saved.extend({'kind': kind, 'payload': payload} for kind, payload in jobs)
+            persistence.atomic_write_json(self._own_path, saved, default=_json_default)
+        for kind, _ in jobs:
+            JOBS.inc(kind=kind, result='saved')
+
+    def _claim_pending(self):
+        """Toma los archivos de jobs pendientes de otras instancias; devuelve los jobs"""
+        # El archivo sin id es el formato anterior (una sola instancia)
+        paths = [self._pending_path] + sorted(glob.glob(self._pending_glob))
+        jobs = []
+        for path in paths:
+            if path == self._own_path:
+                continue
+            claimed = f"{path}.{uuid.uuid4().hex}.claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Lo tomó otra instancia
+                continue
+            try:
+                with open(claimed, 'r') as f:
+                    jobs.extend(json.load(f))
+            except ValueError:
+                logging.error(f"❌ {claimed} contains invalid JSON, pending jobs were not resumed")
+                continue
+            os.remove(claimed)
+        return jobs
+
+    def resume(self):
+        """Relanza los jobs que dejaron las instancias anteriores; devuelve cuántos"""
+        jobs = self._claim_pending()
+        if not jobs:
+            return 0
+
+        for job in jobs:
+            kind, payload = job['kind'], job['payload']
+            if kind not in self._handlers:
+                logging.warning("⚠️ No handler for pending job %s, skipping", kind)
+                continue
+            JOBS.inc(kind=kind, result='resumed')
+            due = payload.pop('_due', None)
+            if due is not None:
+                self.call_later(due - time.time(), kind, **payload)
+            else:
+                self.spawn(kind, **payload)
+        logging.info("♻️ Resumed %s jobs from the previous instance", len(jobs))
+        return len(jobs)
+
+lifecycle = Lifecycle()
+metrics.gauge('lifecycle_jobs_in_flight', 'Background jobs running or scheduled').set_function(lifecycle.in_flight)
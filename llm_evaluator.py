@@ -1,15 +1,23 @@
 import os
 import json
+import asyncio
 import requests
+import rate_limit
 import logging
 from datetime import datetime, timedelta
 from utils import send_slack
+from metrics import track_upstream, timed
 from dotenv import load_dotenv
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
+OPENAI_API_URL = os.getenv('OPENAI_API_URL', 'https://api.openai.com/v1')
+# Conexiones simultáneas del cliente async (solo lo usa asgi.py)
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+
+_async_client = None
 
 # --------------------------------------------------------------------
 # Prompt base con reglas, ejemplos y contra-ejemplos
@@ -63,6 +71,9 @@ Reglas:
   - Para fechas específicas (15/08, 2025-08-15), convierte a ISO YYYY-MM-DD
   - Si no hay fecha clara → null
 • No incluyas campos adicionales ni repitas el mensaje original.
+• Si se incluye contexto del hilo, evaluá solo el mensaje final y usá el
+  contexto para entender a qué tarea se refiere una respuesta corta
+  ("dale, lo hago mañana") y describirla en "descripcion".
 
 En contexto de retencion de cuentas, escala de vínculos con cliente y fidelización, pueden existir mensajes sociales
 que es importante que marques como compromiso, ya que son parte de la estrategia de engagement y retención.
@@ -121,28 +132,52 @@ Respuesta:
 ---
 """
 
-def build_prompt(message_text: str) -> list[dict]:
-    """Crea la lista de mensajes para la llamada a la API."""
+def build_prompt(message_text: str, context=None) -> list[dict]:
+    """
+    Crea la lista de mensajes para la llamada a la API. `context` son los
+    mensajes anteriores del hilo como [(ts, user, text)] (ver thread_context).
+    """
+    content = f"Mensaje a evaluar:\n```{message_text}```"
+    if context:
+        lines = "\n".join(f"<@{user}>: {text}" for _, user, text in context)
+        content = f"Contexto del hilo (mensajes anteriores, del más antiguo al más reciente):\n```{lines}```\n\n{content}"
     return [
         {"role": "system", "content": get_system_prompt()},
-        {"role": "user",   "content": f"Mensaje a evaluar:\n```{message_text}```"}
+        {"role": "user",   "content": content}
     ]
 
 # --------------------------------------------------------------------
 # Función principal
 # --------------------------------------------------------------------
-def evaluate_commitment(message_text: str):
-    messages = build_prompt(message_text)
+@timed('evaluate_commitment')
+def evaluate_commitment(message_text: str, context=None):
+    messages = build_prompt(message_text, context)
 
     if OPENAI_API_KEY:
         return evaluate_with_openai(messages)
     else:
         raise Exception("No LLM API key configured")
 
+@timed('evaluate_commitment')
+async def evaluate_commitment_async(message_text: str, context=None):
+    """Igual que evaluate_commitment pero sin bloquear el event loop (ASGI)"""
+    messages = build_prompt(message_text, context)
+
+    if not OPENAI_API_KEY:
+        raise Exception("No LLM API key configured")
+    try:
+        # httpx solo hace falta para el entry point ASGI; se importa acá para
+        # no sumarlo al arranque del servicio WSGI
+        import httpx  # noqa: F401
+    except ImportError:
+        # Sin httpx la llamada bloqueante corre en un thread
+        return await asyncio.to_thread(evaluate_with_openai, messages)
+    return await evaluate_with_openai_async(messages)
+
 # --------------------------------------------------------------------
 # OpenAI
 # --------------------------------------------------------------------
-def evaluate_with_openai(messages: list[dict]):
+def _openai_request(messages: list[dict]):
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json"
@@ -153,13 +188,50 @@ def evaluate_with_openai(messages: list[dict]):
         "messages": messages,
         "temperature": 0
     }
+    return headers, data
 
-    response = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers=headers,
-        json=data
-    )
+def evaluate_with_openai(messages: list[dict]):
+    headers, data = _openai_request(messages)
+
+    rate_limit.acquire('openai', 'chat.completions')
+    with track_upstream('openai', 'chat.completions') as call:
+        response = requests.post(
+            f"{OPENAI_API_URL}/chat/completions",
+            headers=headers,
+            json=data
+        )
+        call.status = response.status_code
+    rate_limit.after_response('openai', 'chat.completions', response)
+
+    return _handle_openai_response(response)
+
+async def evaluate_with_openai_async(messages: list[dict]):
+    import httpx
+
+    global _async_client
+    if _async_client is None:
+        # Un cliente por proceso: reutiliza conexiones keep-alive entre eventos
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0),
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS),
+        )
+    headers, data = _openai_request(messages)
+
+    # En el event loop la espera del límite de tasa no puede bloquear
+    await rate_limit.acquire_async('openai', 'chat.completions')
+    async with track_upstream('openai', 'chat.completions') as call:
+        response = await _async_client.post(
+            f"{OPENAI_API_URL}/chat/completions",
+            headers=headers,
+            json=data
+        )
+        call.status = response.status_code
+    rate_limit.after_response('openai', 'chat.completions', response)
+
+    return _handle_openai_response(response)
 
+def _handle_openai_response(response):
+    """Respuesta de requests o httpx (comparten status_code, json() y text)"""
     if response.status_code == 200:
         result = response.json()
         content = result["choices"][0]["message"]["content"]
@@ -170,16 +242,78 @@ def evaluate_with_openai(messages: list[dict]):
         return None
 
 
+# --------------------------------------------------------------------
+# Evaluación en lote (backfill.py)
+# --------------------------------------------------------------------
+# Caracteres por mensaje en un lote: mantiene acotado el tamaño del prompt
+BATCH_MAX_TEXT_CHARS = 2000
+
+def build_batch_prompt(message_texts: list[str]) -> list[dict]:
+    """Un solo pedido para varios mensajes, numerados, uno por línea"""
+    lines = "\n".join(
+        f"[{i}] {' '.join(text.split())[:BATCH_MAX_TEXT_CHARS]}" for i, text in enumerate(message_texts)
+    )
+    content = (
+        "Mensajes a evaluar (uno por línea, cada uno precedido por su número):\n"
+        f"```\n{lines}\n```\n\n"
+        "Evaluá cada mensaje por separado y respondé SOLO con un array JSON con un "
+        "objeto por mensaje, en el mismo orden, cada uno con el esquema de salida "
+        "más el campo \"id\" con el número del mensaje."
+    )
+    return [
+        {"role": "system", "content": get_system_prompt()},
+        {"role": "user",   "content": content}
+    ]
+
+@timed('evaluate_commitments_batch')
+def evaluate_commitments_batch(message_texts: list[str]):
+    """
+    Evalúa varios mensajes con una sola llamada. Devuelve una lista del mismo
+    largo con el resultado de cada mensaje (None si el modelo lo omitió o la
+    llamada falló; quien llama puede reintentarlos de a uno).
+    """
+    if not OPENAI_API_KEY:
+        raise Exception("No LLM API key configured")
+    results = [None] * len(message_texts)
+    if not message_texts:
+        return results
+    headers, data = _openai_request(build_batch_prompt(message_texts))
+
+    rate_limit.acquire('openai', 'chat.completions.batch')
+    with track_upstream('openai', 'chat.completions.batch') as call:
+        response = requests.post(
+            f"{OPENAI_API_URL}/chat/completions",
+            headers=headers,
+            json=data
+        )
+        call.status = response.status_code
+    rate_limit.after_response('openai', 'chat.completions.batch', response)
+
+    if response.status_code != 200:
+        logging.error("Error calling OpenAI API (batch): %s - %s", response.status_code, response.text)
+        return results
+    content = response.json()["choices"][0]["message"]["content"]
+    items = _extract_json(content, "[]")
+    if not isinstance(items, list):
+        logging.warning("⚠️ Batch evaluation returned no JSON array")
+        return results
+    for item in items:
+        index = item.get('id') if isinstance(item, dict) else None
+        if isinstance(index, int) and 0 <= index < len(results):
+            results[index] = item
+    return results
+
+
 # --------------------------------------------------------------------
 # Utilidad para extraer JSON
 # --------------------------------------------------------------------
-def _extract_json(text: str):
-    """Devuelve un dict si encuentra JSON válido en el texto; de lo contrario None."""
+def _extract_json(text: str, brackets: str = "{}"):
+    """Devuelve un dict (o una lista, con brackets="[]") si encuentra JSON válido en el texto; de lo contrario None."""
     try:
         return json.loads(text)
     except json.JSONDecodeError:
-        json_start = text.find("{")
-        json_end = text.rfind("}") + 1
+        json_start = text.find(brackets[0])
+        json_end = text.rfind(brackets[1]) + 1
         if json_start != -1 and json_end != 0:
             try:
                 return json.loads(text[json_start:json_end])
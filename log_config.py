@@ -0,0 +1,108 @@
+"""
+Configuración de logging asíncrono y estructurado.
+
+Los handlers de la aplicación solo encolan el LogRecord (QueueHandler);
+un QueueListener en otro thread serializa a JSON y escribe a stderr y al
+archivo. Los mensajes de DEBUG se muestrean para no inundar la salida, y
+los volcados de payloads solo se emiten si el request lo pide con el
+header X-Debug-Payload.
+"""
+
+import os
+import sys
+import hmac
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.getenv('LOG_FILE', 'slack_bot.log')
+# Fracción de los mensajes DEBUG que se emiten (1.0 = todos)
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '0.1'))
+# Token que habilita los volcados de payload por request; sin token quedan deshabilitados
+DEBUG_PAYLOAD_TOKEN = os.getenv('DEBUG_PAYLOAD_TOKEN')
+
+# Atributos estándar de LogRecord; el resto viene de `extra=` y se agrega al JSON
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos de `extra=` al nivel raíz"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar todos los registros >= INFO y una muestra de los DEBUG"""
+
+    def __init__(self, rate=LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el thread que loguea: solo resuelve
+    los args del mensaje y deja el formato JSON para el listener.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging():
+    """Instala el pipeline QueueHandler -> QueueListener en el root logger"""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if LOG_FILE:
+        handlers.append(logging.FileHandler(LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.handlers[:] = [queue_handler]
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def debug_payloads_enabled(headers):
+    """True si el request pidió volcar payloads con un token válido"""
+    if not DEBUG_PAYLOAD_TOKEN:
+        return False
+    return hmac.compare_digest(headers.get('X-Debug-Payload', ''), DEBUG_PAYLOAD_TOKEN)
@@ -1,106 +1,302 @@
+"""
+Servicio de integración Slack-Asana.
+
+`create_app()` arma la app Flask; gunicorn la toma como `main:app`, que se
+crea en el primer acceso (ver __getattr__ al final). Importar este módulo es
+barato a propósito: Flask, los clientes HTTP (slack_helpers, asana_client,
+llm_evaluator) y los datos (task_mapping.json, merged_accounts.json, log de
+eventos) se cargan recién cuando se usan, porque en Cloud Run el arranque en
+frío es latencia del primer request. asgi.py reutiliza los handlers sin
+importar Flask.
+"""
+
 import os
+import re
 import json
 import hashlib
 import hmac
 import time
 import threading
 import logging
-import requests
-import traceback
-from flask import Flask, request, jsonify
 from dotenv import load_dotenv
-from llm_evaluator import evaluate_commitment
-from slack_helpers import post_thread_message, get_user_info, add_reaction, remove_reaction, post_ephemeral_message, get_channel_info
-from asana_client import create_asana_task, delete_asana_task
 from channel_map import get_asana_project_id
+from asana_events import AsanaEventWorker
+from reconciler import Reconciler
+from task_archive import TaskArchive, RetentionJob, expired_task_keys
+from task_record import TaskRecord, json_default
+from persistence import DebouncedWriter, check_durable_state, hold_service_lock, state_path
+from lifecycle import lifecycle, SHUTDOWN_GRACE
+from outbox import SlackOutbox
+from event_log import TaskEventLog, maybe_compact, replay as replay_task_events, CREATED, CANCELLED, COMPLETED, REACTION, UPDATED, ARCHIVED
+from webhook_secrets import WebhookSecretStore, DEFAULT_WEBHOOK_ID
+from event_router import EventRouter
+from thread_context import ThreadContextCache
+from interactions import InteractionWorker, SubmissionLog, parse_task_submission, submission_key, read_interaction_state, TASK_BUTTON_ACTION, TASK_MODAL_CALLBACK, INTERACTIONS
 # import google.cloud.logging
 from utils import send_slack
+from log_config import setup_logging, debug_payloads_enabled
+import metrics
+import tracing
 
 # Inicializa el cliente de Cloud Logging - Temporalmente deshabilitado
 # logging_client = google.cloud.logging.Client(project='gothic-calling-325317')
 # logging_client.setup_logging()
 
-# Configurar logging detallado
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('slack_bot.log')
-    ]
-)
-
-
 load_dotenv()
 
-app = Flask(__name__)
-
 SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
 SLACK_SIGNING_SECRET = os.getenv('SLACK_SIGNING_SECRET')
 
-logging.info(f"=== STARTING SLACK-ASANA INTEGRATION ===")
-logging.info(f"SLACK_BOT_TOKEN configured: {'Yes' if SLACK_BOT_TOKEN else 'No'}")
-logging.info(f"SLACK_SIGNING_SECRET configured: {'Yes' if SLACK_SIGNING_SECRET else 'No'}")
-logging.info(f"Bot token starts with: {SLACK_BOT_TOKEN[:10]}..." if SLACK_BOT_TOKEN else "No bot token")
-logging.info(f"="*40)
+# Ejecuciones simultáneas por handler de eventos de Slack
+MESSAGE_HANDLER_CONCURRENCY = int(os.getenv('MESSAGE_HANDLER_CONCURRENCY', '16'))
+REACTION_HANDLER_CONCURRENCY = int(os.getenv('REACTION_HANDLER_CONCURRENCY', '8'))
+
+# Mensajes de personas: sin subtype, o respuestas enviadas también al canal y
+# mensajes con archivos. Ediciones, joins y mensajes de bots no se evalúan.
+HUMAN_MESSAGE_SUBTYPES = (None, 'thread_broadcast', 'file_share')
 
 # Cache para evitar procesar eventos duplicados
 processed_events = set()
 
-# Mapeo de tareas creadas (message_ts -> asana_task_gid)
-task_mapping = {}
-task_mapping_file = 'task_mapping.json'
+# Handlers de eventos de Slack por (type, subtype); ver dispatch_slack_event
+router = EventRouter()
+
+# Últimos mensajes de cada hilo, para evaluar respuestas con su contexto
+thread_context = ThreadContextCache()
+metrics.gauge('thread_context_bytes', 'Estimated memory used by the thread context cache').set_function(thread_context.size_bytes)
+
+# Con STATE_DIR va al volumen, junto al log de eventos que se reaplica sobre él
+task_mapping_file = os.getenv('TASK_MAPPING_FILE') or state_path('task_mapping.json')
+# Ubicación anterior (directorio de trabajo): se lee si el del volumen todavía no existe
+LEGACY_TASK_MAPPING_FILE = 'task_mapping.json'
+user_mapping_file = 'merged_accounts.json'
+
+_initialized = False
+_init_lock = threading.RLock()
+
+
+def init():
+    """Configura logging y deja registro del arranque; idempotente"""
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        # Configurar logging asíncrono (JSON a stderr y slack_bot.log)
+        setup_logging()
+        check_durable_state()
+        _initialized = True
+        logging.info("=== STARTING SLACK-ASANA INTEGRATION ===")
+        logging.info("SLACK_BOT_TOKEN configured: %s", 'Yes' if SLACK_BOT_TOKEN else 'No')
+        logging.info("SLACK_SIGNING_SECRET configured: %s", 'Yes' if SLACK_SIGNING_SECRET else 'No')
+        logging.info("="*40)
+
+
+def start_background_jobs():
+    """
+    Arranca los jobs periódicos del servicio (reconciliación con Asana y
+    retención) y retoma los jobs que dejó sin terminar la instancia anterior
+    """
+    hold_service_lock()
+    state.reconciler.start()
+    state.retention_job.start()
+    state.outbox.start()
+    lifecycle.resume()
+
+
+def shutdown(grace=SHUTDOWN_GRACE):
+    """
+    Apagado ordenado (SIGTERM de Cloud Run): frena los jobs periódicos, espera
+    hasta `grace` segundos al trabajo en curso, guarda lo que no terminó para
+    la próxima instancia y baja el estado a disco
+    """
+    for name in ('reconciler', 'retention_job', 'outbox'):
+        job = state.__dict__.get(name)
+        if job is not None:
+            job.stop()
+    lifecycle.shutdown(grace)
+    task_events = state.__dict__.get('task_events')
+    if task_events is not None:
+        task_events.flush()
+
+
+class lazy:
+    """
+    Atributo de AppState que se carga en el primer acceso. El valor queda en
+    el __dict__ de la instancia, así que los accesos siguientes no pasan por
+    acá ni toman el lock.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.name = loader.__name__
+        self.__doc__ = loader.__doc__
+
+    def __get__(self, state, owner=None):
+        if state is None:
+            return self
+        with state._lock:
+            if self.name not in state.__dict__:
+                state.__dict__[self.name] = self.loader(state)
+        return state.__dict__[self.name]
+
+
+class AppState:
+    """Datos y workers del servicio, cargados a demanda"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    @lazy
+    def task_mapping(self):
+        """Mapeo de tareas creadas (channel_message_ts -> datos de la tarea)"""
+        path = task_mapping_file
+        if not os.path.exists(path) and os.path.exists(LEGACY_TASK_MAPPING_FILE):
+            path = LEGACY_TASK_MAPPING_FILE
+        try:
+            with open(path, 'r') as f:
+                mapping = json.load(f)
+        except:
+            mapping = {}
+        # Log append-only del ciclo de vida de las tareas; al arrancar se reaplica
+        # sobre el mapeo para recuperar lo que no llegó a task_mapping.json.
+        # Si se acumularon segmentos se compactan antes, así el replay no crece sin límite
+        maybe_compact()
+        replay_task_events(into=mapping)
+        mapping = {task_key: TaskRecord.from_dict(task) for task_key, task in mapping.items()}
+        metrics.gauge('task_mapping_entries', 'Tasks held in the in-memory mapping').set_function(lambda: len(mapping))
+        return mapping
+
+    @lazy
+    def task_mapping_writer(self):
+        """Único writer de task_mapping.json; junta las ráfagas de cambios en una escritura"""
+        return DebouncedWriter(task_mapping_file, lambda: dict(self.task_mapping), indent=2, default=json_default)
+
+    @lazy
+    def task_events(self):
+        self.task_mapping  # el replay tiene que ocurrir antes del primer append
+        task_events = TaskEventLog()
+        metrics.register_gauge(task_events.pending, queue='task_event_log')
+        return task_events
+
+    @lazy
+    def user_mapping(self):
+        """Mapeo de usuarios (email -> slack_ids / asana_ids)"""
+        with open(user_mapping_file, 'r') as f:
+            return json.load(f)
+
+    @lazy
+    def webhook_secrets(self):
+        """Secretos de los webhooks de Asana (handshake -> verificación de firmas)"""
+        return WebhookSecretStore()
+
+    @lazy
+    def asana_event_worker(self):
+        """Worker que procesa los eventos de Asana fuera del request"""
+        worker = AsanaEventWorker(task_completed_job)
+        metrics.register_gauge(worker.qsize, queue='asana_events')
+        return worker
+
+    @lazy
+    def interaction_worker(self):
+        """Worker que crea las tareas de los modales enviados, fuera del request"""
+        worker = InteractionWorker(task_submission_job)
+        metrics.register_gauge(worker.qsize, queue='slack_interactions')
+        return worker
+
+    @lazy
+    def task_submissions(self):
+        """Submits del modal que ya crearon su tarea (evita duplicados al reintentar)"""
+        return SubmissionLog()
 
-# Cargar mapeo de tareas existente
-try:
-    with open(task_mapping_file, 'r') as f:
-        task_mapping = json.load(f)
-except:
-    task_mapping = {}
+    @lazy
+    def outbox(self):
+        """Reacciones y efímeros pendientes en Slack, con reintentos fuera del camino crítico"""
+        outbox = SlackOutbox(on_delivered=on_outbox_delivered)
+        metrics.register_gauge(outbox.pending, queue='slack_outbox')
+        return outbox
 
-# Cargar mapeo de usuarios
-with open('merged_accounts.json', 'r') as f:
-    user_mapping = json.load(f)
+    @lazy
+    def task_archive(self):
+        """Tareas que ya salieron del mapeo por la política de retención"""
+        return TaskArchive()
+
+    @lazy
+    def retention_job(self):
+        """Job periódico que mueve las tareas vencidas del mapeo al archivo"""
+        return RetentionJob(archive_expired_tasks)
+
+    @lazy
+    def reconciler(self):
+        """Reconciliación periódica del mapeo con el estado de las tareas en Asana"""
+        return Reconciler(lambda: list(self.task_mapping.values()), notify_task_completed, forget_deleted_task,
+                          on_task_marked_completed=mark_task_completed)
+
+
+state = AppState()
 
 def save_task_mapping():
-    with open(task_mapping_file, 'w') as f:
-        json.dump(task_mapping, f, indent=2)
+    """
+    Programa la escritura de task_mapping.json; no bloquea. Lo que pase entre
+    el cambio y la escritura ya está en el log de eventos, que se reaplica al
+    arrancar.
+    """
+    state.task_mapping_writer.schedule()
+
+def on_outbox_delivered(entry):
+    """La 💡 queda en el log de eventos recién cuando Slack la confirma"""
+    if entry['method'] == 'reactions.add' and entry.get('task_key'):
+        state.task_events.append(REACTION, entry['task_key'], reaction=entry['params']['reaction'])
+
+def has_task(task_key):
+    """True si el mensaje tiene tarea, en el mapeo o ya archivada"""
+    return task_key in state.task_mapping or state.task_archive.lookup(task_key) is not None
+
+@metrics.timed('archive_expired_tasks')
+def archive_expired_tasks(now=None):
+    """Mueve al archivo frío las tareas del mapeo que vencieron su retención"""
+    expired = expired_task_keys(state.task_mapping, now)
+    if not expired:
+        return 0
+    tasks = {task_key: state.task_mapping[task_key].to_dict() for task_key in expired}
+    # Primero el archivo: si el proceso muere antes de sacarlas del mapeo, la
+    # próxima pasada las vuelve a archivar (lookup se queda con la última)
+    state.task_archive.archive(tasks)
+    for task_key in expired:
+        state.task_mapping.pop(task_key, None)
+        state.task_events.append(ARCHIVED, task_key)
+    save_task_mapping()
+    logging.info("🗄️ Archived %s expired tasks, %s remain in the mapping", len(expired), len(state.task_mapping))
+    return len(expired)
+
+# Formato de Slack que no cambia el sentido de un mensaje editado
+_FORMATTING_RE = re.compile(r'[*_~`]')
+
+def text_hash(text):
+    """Hash del texto normalizado (sin mayúsculas, formato ni espacios extra)"""
+    normalized = ' '.join(_FORMATTING_RE.sub('', text or '').casefold().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
 
 def get_slack_user_from_asana_gid(asana_gid):
-    for email, data in user_mapping.items():
+    for email, data in state.user_mapping.items():
         if asana_gid in data.get('asana_ids', []):
             slack_ids = data.get('slack_ids', [])
             return slack_ids[0] if slack_ids else None
     return None
 
 def get_asana_gid_from_slack_user(slack_user_id):
-    for email, data in user_mapping.items():
+    for email, data in state.user_mapping.items():
         if slack_user_id in data.get('slack_ids', []):
             asana_ids = data.get('asana_ids', [])
             return asana_ids[0] if asana_ids else None
     return None
 
-@app.route('/')
-def home():
-    logging.info("🏠 Home endpoint accessed")
-    return 'Slack-Asana Integration Service is running!'
-
-@app.route('/health')
-def health():
-    return jsonify({
+def health_payload():
+    return {
         'status': 'healthy', 
         'service': 'slack-asana-integration',
         'bot_token_configured': bool(SLACK_BOT_TOKEN),
         'signing_secret_configured': bool(SLACK_SIGNING_SECRET)
-    })
-
-@app.route('/test', methods=['GET', 'POST'])
-def test():
-    print(f"TEST endpoint hit - Method: {request.method}")
-    print(f"Headers: {dict(request.headers)}")
-    if request.method == 'POST':
-        print(f"Body: {request.get_data(as_text=True)}")
-    return jsonify({'message': 'Test successful', 'method': request.method})
+    }
 
 def verify_slack_signature(request_body, timestamp, signature):
     req = str.encode(f"v0:{timestamp}:{request_body}")
@@ -111,18 +307,41 @@ def verify_slack_signature(request_body, timestamp, signature):
     ).hexdigest()
     return hmac.compare_digest(request_hash, signature)
 
+def check_slack_request(headers, request_body):
+    """Timestamp y firma de un request de Slack; devuelve (payload, status) si hay que rechazarlo"""
+    timestamp = headers.get('X-Slack-Request-Timestamp', '')
+    signature = headers.get('X-Slack-Signature', '')
+    
+    try:
+        too_old = abs(time.time() - float(timestamp)) > 60 * 5
+    except ValueError:
+        too_old = True
+    if too_old:
+        logging.error("❌ ERROR: Request timestamp too old")
+        send_slack("ERROR: Request timestamp too old")
+        return {'error': 'Request timestamp too old'}, 400
+    
+    if not verify_slack_signature(request_body, timestamp, signature):
+        logging.error("❌ ERROR: Invalid signature")
+        send_slack("ERROR: Invalid signature")
+        return {'error': 'Invalid signature'}, 403
+    return None
+
+@metrics.timed('process_asana_task_creation')
 def process_asana_task_creation(event, commitment_data):
     """Procesa la creación automática de tarea en Asana"""
+    from slack_helpers import get_user_info, get_channel_info
+    from asana_client import create_asana_task
     try:
         logging.info("🏗️ === STARTING ASANA TASK CREATION ===")
         channel = event['channel']
         message_ts = event['ts']
         user_who_posted = event['user']
         
-        logging.info(f"📍 Channel: {channel}")
-        logging.info(f"⏰ Message timestamp: {message_ts}")
-        logging.info(f"👤 User who posted: {user_who_posted}")
-        logging.info(f"📊 Commitment data: {commitment_data}")
+        logging.info("📍 Channel: %s", channel)
+        logging.info("⏰ Message timestamp: %s", message_ts)
+        logging.info("👤 User who posted: %s", user_who_posted)
+        logging.info("📊 Commitment data: %s", commitment_data)
         
         # Obtener información del usuario que creó la tarea
         creator_info = get_user_info(user_who_posted)
@@ -134,19 +353,18 @@ def process_asana_task_creation(event, commitment_data):
         
         # Obtener proyecto de Asana del canal
         asana_project_id = get_asana_project_id(channel)
-        logging.info(f"🎯 Asana project ID for channel: {asana_project_id}")
+        logging.info("🎯 Asana project ID for channel: %s", asana_project_id)
         if not asana_project_id:
-            logging.info(f"❌ No hay proyecto de Asana configurado para el canal {channel}")
+            logging.info("❌ No hay proyecto de Asana configurado para el canal %s", channel)
             return
         
         # Extraer usuario mencionado del texto
         mentioned_user_id = None
         text = event['text']
-        logging.info(f"📝 Message text: {text}")
+        logging.info("📝 Message text: %s", text)
         # Buscar menciones en formato <@USERID>
-        import re
         mentions = re.findall(r'<@(U[A-Z0-9]+)>', text)
-        logging.info(f"👥 Found mentions: {mentions}")
+        logging.info("👥 Found mentions: %s", mentions)
         if mentions:
             mentioned_user_id = mentions[0]
         
@@ -159,7 +377,7 @@ def process_asana_task_creation(event, commitment_data):
             # Obtener Asana GID del usuario mencionado
             asana_gid = get_asana_gid_from_slack_user(mentioned_user_id)
             if not asana_gid:
-                logging.info(f"No se encontró mapeo de Asana para el usuario de Slack {mentioned_user_id}")
+                logging.info("No se encontró mapeo de Asana para el usuario de Slack %s", mentioned_user_id)
             
             # Obtener info del usuario para el email
             user_info = get_user_info(mentioned_user_id)
@@ -189,7 +407,7 @@ def process_asana_task_creation(event, commitment_data):
         # Guardar mapeo de tarea con timestamp de creación
         task_key = f"{channel}:{message_ts}"
         creation_time = time.time()
-        task_mapping[task_key] = {
+        task_entry = {
             'asana_gid': task_result['gid'],
             'channel': channel,
             'message_ts': message_ts,
@@ -199,88 +417,66 @@ def process_asana_task_creation(event, commitment_data):
             'created_at': creation_time,
             'can_be_cancelled': True,
             'task_name': commitment_data['descripcion'],  # Guardar nombre de la tarea
+            'text_hash': text_hash(text),  # Para detectar ediciones que cambian el mensaje
             'thread_ts': event.get('thread_ts')  # Guardar thread_ts para mensajes ephemeral
         }
+        state.task_mapping[task_key] = TaskRecord.from_dict(task_entry)
+        state.task_events.append(CREATED, task_key, task=task_entry)
         save_task_mapping()
         
-        logging.info(f"💾 Task saved with cancellation window until: {time.ctime(creation_time + 300)}")
+        logging.info("💾 Task saved with cancellation window until: %s", time.ctime(creation_time + 300))
         
         # Programar desactivación de cancelación después de 5 minutos
-        def disable_cancellation():
-            time.sleep(300)  # 5 minutos
-            if task_key in task_mapping:
-                task_mapping[task_key]['can_be_cancelled'] = False
-                save_task_mapping()
-                logging.info(f"⏰ Cancellation window expired for task: {task_key}")
-        
-        cancellation_thread = threading.Thread(target=disable_cancellation)
-        cancellation_thread.daemon = True
-        cancellation_thread.start()
-        
-        # Agregar reacción 💡
-        add_reaction(channel, message_ts, 'bulb')
-        
-        # Enviar mensaje efímero solo al usuario que creó la tarea
-        project_name = None
-        # Buscar nombre del proyecto en asana_pj.json
-        try:
-            with open('asana_pj.json', 'r', encoding='utf-8') as f:
-                asana_projects = json.load(f)
-                for name, pid in asana_projects.items():
-                    if pid == asana_project_id:
-                        project_name = name
-                        break
-        except:
-            pass
+        lifecycle.call_later(300, 'disable_cancellation', task_key=task_key)
         
-        # Mensaje ephemeral simplificado: solo emoji + link
+        # La tarea ya está escrita: la 💡 y el efímero solo para el creador
+        # salen por el outbox, con reintentos
         task_url = task_result.get('url', f"https://app.asana.com/0/{asana_project_id}/{task_result['gid']}")
-        message = f"✅ <{task_url}|Ver tarea en Asana>"
-        
-        logging.info(f"📨 Sending ephemeral message to user {user_who_posted} in channel {channel}")
-        logging.info(f"📝 Message content: {message}")
-        ephemeral_result = post_ephemeral_message(
-            channel=channel,
-            user=user_who_posted,
-            text=message,
-            thread_ts=event.get('thread_ts')
-        )
-        logging.info(f"📨 Ephemeral message result: {ephemeral_result}")
+        state.outbox.add(f"{task_result['gid']}:bulb", 'reactions.add',
+                         {'channel': channel, 'timestamp': message_ts, 'reaction': 'bulb'}, task_key=task_key)
+        state.outbox.add(f"{task_result['gid']}:ephemeral", 'chat.postEphemeral',
+                         {'channel': channel, 'user': user_who_posted, 'text': f"✅ <{task_url}|Ver tarea en Asana>",
+                          'thread_ts': event.get('thread_ts')}, task_key=task_key)
         
     except Exception as e:
-        logging.error(f"Error creando tarea automática: {str(e)}")
+        logging.error("Error creando tarea automática: %s", str(e))
         logging.exception("Exception details:")
         send_slack(f"Error creando tarea automática: {str(e)}")
 
+@metrics.timed('handle_task_deletion')
 def handle_task_deletion(task_info, channel, message_ts):
     """Maneja la eliminación de una tarea cuando el creador reacciona con 🚫"""
+    from slack_helpers import remove_reaction, post_ephemeral_message
+    from asana_client import delete_asana_task
     try:
-        logging.info(f"🗑️ === STARTING TASK DELETION ===")
-        logging.info(f"📍 Channel: {channel}")
-        logging.info(f"⏰ Message timestamp: {message_ts}")
-        logging.info(f"🎯 Asana task GID: {task_info['asana_gid']}")
-        logging.info(f"👤 User who posted: {task_info['user_who_posted']}")
+        logging.info("🗑️ === STARTING TASK DELETION ===")
+        logging.info("📍 Channel: %s", channel)
+        logging.info("⏰ Message timestamp: %s", message_ts)
+        logging.info("🎯 Asana task GID: %s", task_info['asana_gid'])
+        logging.info("👤 User who posted: %s", task_info['user_who_posted'])
         
         # Eliminar tarea de Asana
-        logging.info(f"🔥 Deleting task from Asana...")
+        logging.info("🔥 Deleting task from Asana...")
         delete_asana_task(task_info['asana_gid'])
-        logging.info(f"✅ Task deleted from Asana successfully")
+        logging.info("✅ Task deleted from Asana successfully")
         
-        # Quitar reacción 💡
-        logging.info(f"💡 Removing bulb reaction...")
+        # Quitar reacción 💡, después de descartar lo que el outbox tenía pendiente
+        logging.info("💡 Removing bulb reaction...")
+        state.outbox.drop_task(f"{channel}:{message_ts}")
         remove_reaction(channel, message_ts, 'bulb')
         
         # Quitar reacción 🚫 también
-        logging.info(f"🚫 Removing no_entry_sign reaction...")
+        logging.info("🚫 Removing no_entry_sign reaction...")
         remove_reaction(channel, message_ts, 'no_entry_sign')
         
         # Eliminar del mapeo
         task_key = f"{channel}:{message_ts}"
-        if task_key in task_mapping:
-            logging.info(f"🗂️ Removing task from mapping...")
-            del task_mapping[task_key]
+        if task_key in state.task_mapping:
+            logging.info("🗂️ Removing task from mapping...")
+            del state.task_mapping[task_key]
+            state.task_events.append(CANCELLED, task_key, asana_gid=task_info['asana_gid'])
             save_task_mapping()
-            logging.info(f"✅ Task removed from mapping")
+            logging.info("✅ Task removed from mapping")
         
         # Calcular tiempo de cancelación
         current_time = time.time()
@@ -295,243 +491,736 @@ def handle_task_deletion(task_info, channel, message_ts):
             thread_ts=task_info.get('thread_ts')
         )
         
-        logging.info(f"✅ Task deletion completed successfully in {time_elapsed:.1f} seconds")
+        logging.info("✅ Task deletion completed successfully in %.1f seconds", time_elapsed)
         
     except Exception as e:
-        logging.error(f"❌ Error eliminando tarea: {str(e)}")
+        logging.error("❌ Error eliminando tarea: %s", str(e))
         logging.exception("Exception details:")
         send_slack(f"Error eliminando tarea: {str(e)}")
 
-@app.route('/slack/events', methods=['POST'])
-def slack_events():
-    logging.info("🔥 === SLACK EVENTS ENDPOINT HIT ===")
-    logging.info(f"📋 Method: {request.method}")
-    logging.info(f"📍 Remote Address: {request.remote_addr}")
-    logging.info(f"📑 Headers: {dict(request.headers)}")
-    logging.info(f"📄 Content-Type: {request.content_type}")
-    
-    if request.content_type != 'application/json':
-        logging.error(f"❌ ERROR: Invalid content type: {request.content_type}")
-        send_slack(f"ERROR: Invalid content type: {request.content_type}")
-        return jsonify({'error': 'Content-Type must be application/json'}), 400
-    
-    timestamp = request.headers.get('X-Slack-Request-Timestamp', '')
-    signature = request.headers.get('X-Slack-Signature', '')
-    logging.info(f"⏰ Timestamp: {timestamp}")
-    logging.info(f"🔐 Signature: {signature[:20]}..." if signature else "No signature")
-    
-    if abs(time.time() - float(timestamp)) > 60 * 5:
-        logging.error("❌ ERROR: Request timestamp too old")
-        send_slack("ERROR: Request timestamp too old")
-        return jsonify({'error': 'Request timestamp too old'}), 400
+def prepare_commitment(event, commitment_data):
+    """
+    True si el resultado del LLM es un compromiso; en ese caso marca
+    `sin_asignacion` cuando el mensaje no menciona a nadie
+    """
+    if not (commitment_data and commitment_data.get('es_compromiso')):
+        return False
+    logging.info("✅ Message identified as commitment")
+    
+    # Verificar si hay menciones en el texto para determinar si hay asignación
+    has_mention = '@' in event['text']
+    if not has_mention:
+        logging.info("⚠️ Commitment detected but no user mentioned")
+        # Marcar que no hay asignación clara
+        commitment_data['sin_asignacion'] = True
+    return True
+
+def on_commitment_evaluated(event, commitment_data):
+    """Recibe el resultado del LLM para un mensaje y crea la tarea si es un compromiso"""
+    logging.info("🤖 LLM evaluation result: %s", commitment_data)
     
-    # Obtener el body raw para verificación
-    request_body = request.get_data(as_text=True)
-    logging.info(f"📦 Raw Body: {request_body[:500]}{'...' if len(request_body) > 500 else ''}")
+    if prepare_commitment(event, commitment_data):
+        # Crear tarea automáticamente
+        lifecycle.spawn('create_task', event=event, commitment_data=commitment_data)
+    else:
+        logging.info("❌ Message not identified as commitment")
+
+def dispatch_slack_event(data, defer_evaluation=None, dump_payloads=False):
+    """
+    Procesa un payload de la Events API ya verificado. Lo comparten
+    /slack/events (HTTP, Flask y ASGI) y socket_mode.py (Socket Mode).
+    `defer_evaluation` tiene el mismo sentido que en handle_slack_events.
+    """
+    if 'event' not in data:
+        logging.debug("📭 No event data in request")
+        return
     
-    if not verify_slack_signature(request_body, timestamp, signature):
-        logging.error("❌ ERROR: Invalid signature")
-        send_slack("ERROR: Invalid signature")
-        return jsonify({'error': 'Invalid signature'}), 403
+    event = data['event']
+    event_id = data.get('event_id')
+    logging.debug("🎯 Processing event", extra={'event_id': event_id, 'event_type': event.get('type')})
+    trace_span = tracing.current_span()
+    if trace_span is not None:
+        trace_span.set('event_id', event_id)
+        trace_span.set('event_type', event.get('type'))
+    if dump_payloads:
+        logging.info("📝 Event data: %s", json.dumps(event, indent=2))
+    
+    # Evitar procesar eventos duplicados
+    if event_id in processed_events:
+        metrics.record_cache('processed_events', hit=True)
+        logging.info("⏭️ Event %s already processed, skipping", event_id)
+        return
+    metrics.record_cache('processed_events', hit=False)
+    
+    processed_events.add(event_id)
+    
+    # Limpiar cache después de 1000 eventos
+    if len(processed_events) > 1000:
+        processed_events.clear()
+        logging.debug("🧹 Cleaned processed events cache")
+    
+    router.dispatch(data, defer_evaluation=defer_evaluation)
+
+@router.on('message', subtypes=HUMAN_MESSAGE_SUBTYPES, max_concurrency=MESSAGE_HANDLER_CONCURRENCY)
+def handle_message_event(event, data, defer_evaluation=None):
+    """Evalúa si el mensaje es un compromiso"""
+    from llm_evaluator import evaluate_commitment
+    if event.get('bot_id') or not event.get('text'):
+        return
+    
+    text = event['text']
+    logging.info("💬 Processing message", extra={'event_id': data.get('event_id'), 'channel': event.get('channel'), 'user': event.get('user')})
+    
+    # Mensajes anteriores del hilo (si es una respuesta) antes de sumar este
+    context = thread_context.context_for(event)
+    thread_context.record(event)
+    
+    # Siempre evaluar el mensaje, tenga o no menciones
+    if defer_evaluation is not None:
+        defer_evaluation(event, context, on_commitment_evaluated)
+    else:
+        logging.debug("🔍 Evaluating message for commitment...")
+        on_commitment_evaluated(event, evaluate_commitment(text, context))
+
+@router.on('reaction_added', max_concurrency=REACTION_HANDLER_CONCURRENCY)
+def handle_reaction_added(event, data, defer_evaluation=None):
+    """Cancela la tarea si su creador reacciona con 🚫 dentro de los 5 minutos"""
+    from slack_helpers import remove_reaction, post_ephemeral_message
+    logging.info("😀 Reaction added: %s", event['reaction'])
+    # Manejar reacción de prohibido (🚫)
+    if event['reaction'] != 'no_entry_sign':
+        return
+    logging.info("🚫 Delete reaction detected, processing...")
+    item = event['item']
+    if item['type'] != 'message':
+        return
+    task_key = f"{item['channel']}:{item['ts']}"
+    task_info = state.task_mapping.get(task_key)
+    logging.info("🔍 Looking for task: %s, found: %s", task_key, bool(task_info))
+    
+    if task_info and event['user'] == task_info['user_who_posted']:
+        # Verificar si la tarea aún puede ser cancelada
+        current_time = time.time()
+        creation_time = task_info.get('created_at', 0)
+        can_be_cancelled = task_info.get('can_be_cancelled', False)
+        time_elapsed = current_time - creation_time
+        
+        logging.info("⏰ Time elapsed since creation: %.1f seconds", time_elapsed)
+        logging.info("🔒 Can be cancelled: %s", can_be_cancelled)
+        
+        if can_be_cancelled and time_elapsed <= 300:  # 5 minutos = 300 segundos
+            logging.info("✅ Within 5-minute cancellation window, deleting task...")
+            # Eliminar tarea de Asana
+            lifecycle.spawn('delete_task', channel=item['channel'], message_ts=item['ts'])
+        else:
+            logging.info("❌ Cancellation window expired (5 minutes passed)")
+            # Enviar mensaje efímero informando que ya no se puede cancelar
+            post_ephemeral_message(
+                channel=item['channel'],
+                user=event['user'],
+                text="⏰ Ya no puedes cancelar esta tarea. Han pasado más de 5 minutos desde su creación.",
+                thread_ts=task_info.get('thread_ts')
+            )
+            # Remover la reacción ya que no es válida
+            remove_reaction(item['channel'], item['ts'], 'no_entry_sign')
+    else:
+        logging.info("⛔ Unauthorized user or task not found")
+        if task_info and event['user'] != task_info['user_who_posted']:
+            # Informar al usuario que no puede cancelar tareas de otros
+            post_ephemeral_message(
+                channel=item['channel'],
+                user=event['user'],
+                text="❌ Solo el creador de la tarea puede cancelarla.",
+                thread_ts=task_info.get('thread_ts')
+            )
+            # Remover la reacción ya que no es válida
+            remove_reaction(item['channel'], item['ts'], 'no_entry_sign')
+
+MESSAGE_EDITS = metrics.counter('message_edits_total', 'Edited and deleted Slack messages by outcome')
+
+@router.on('message', subtypes=('message_changed',), max_concurrency=MESSAGE_HANDLER_CONCURRENCY)
+def handle_message_changed(event, data, defer_evaluation=None):
+    """Re-evalúa un mensaje editado, solo si el texto cambió de verdad"""
+    from llm_evaluator import evaluate_commitment
+    message = event.get('message') or {}
+    if message.get('bot_id') or not message.get('user') or not message.get('text'):
+        return
+    edited = {
+        'type': 'message',
+        'channel': event['channel'],
+        'user': message['user'],
+        'text': message['text'],
+        'ts': message['ts'],
+        'thread_ts': message.get('thread_ts'),
+    }
+    task_key = f"{edited['channel']}:{edited['ts']}"
+    task_info = state.task_mapping.get(task_key)
+    
+    # Los unfurls y cambios de formato también llegan como message_changed
+    if task_info and task_info.get('text_hash'):
+        previous_hash = task_info['text_hash']
+    else:
+        previous_hash = text_hash((event.get('previous_message') or {}).get('text'))
+    if text_hash(edited['text']) == previous_hash:
+        MESSAGE_EDITS.inc(result='unchanged')
+        return
+    if task_info and task_info.get('completed_at'):
+        MESSAGE_EDITS.inc(result='completed')
+        return
+    # Sin tarea en el mapeo puede tenerla archivada: no se crea otra
+    if task_info is None and state.task_archive.lookup(task_key) is not None:
+        MESSAGE_EDITS.inc(result='archived')
+        return
+    # Las tareas creadas a mano desde el modal no dependen del texto del mensaje
+    if task_info and task_info.get('source') == 'modal':
+        MESSAGE_EDITS.inc(result='manual')
+        return
+    
+    logging.info("✏️ Message edited, re-evaluating", extra={'channel': edited['channel'], 'ts': edited['ts'], 'has_task': bool(task_info)})
+    context = thread_context.context_for(edited)
+    if defer_evaluation is not None:
+        defer_evaluation(edited, context, on_message_edited)
+    else:
+        on_message_edited(edited, evaluate_commitment(edited['text'], context))
+
+def on_message_edited(event, commitment_data):
+    """Crea, actualiza o elimina la tarea según la nueva evaluación del mensaje"""
+    task_key = f"{event['channel']}:{event['ts']}"
+    task_info = state.task_mapping.get(task_key)
+    is_commitment = bool(commitment_data and commitment_data.get('es_compromiso'))
+    
+    if task_info is None:
+        MESSAGE_EDITS.inc(result='created' if is_commitment else 'not_commitment')
+        on_commitment_evaluated(event, commitment_data)
+        return
+    
+    if is_commitment:
+        MESSAGE_EDITS.inc(result='updated')
+        lifecycle.spawn('update_task', task_key=task_key, event=event, commitment_data=commitment_data)
+    else:
+        MESSAGE_EDITS.inc(result='deleted')
+        lifecycle.spawn('remove_task', task_key=task_key, message_deleted=False)
+
+@router.on('message', subtypes=('message_deleted',), max_concurrency=REACTION_HANDLER_CONCURRENCY)
+def handle_message_deleted(event, data, defer_evaluation=None):
+    """Elimina la tarea de Asana si se borra el mensaje que la originó"""
+    task_key = f"{event['channel']}:{event.get('deleted_ts')}"
+    task_info = state.task_mapping.get(task_key)
+    if task_info is None:
+        return
+    logging.info("🗑️ Message with task deleted: %s", task_key)
+    MESSAGE_EDITS.inc(result='message_deleted')
+    lifecycle.spawn('remove_task', task_key=task_key, message_deleted=True)
+
+@metrics.timed('process_task_update')
+def process_task_update(task_key, task_info, event, commitment_data):
+    """Actualiza la tarea de Asana con la evaluación del mensaje editado"""
+    from slack_helpers import post_ephemeral_message
+    from asana_client import update_asana_task
+    try:
+        update_asana_task(
+            task_info['asana_gid'],
+            name=commitment_data.get('descripcion'),
+            due_on=commitment_data.get('fecha_limite')
+        )
+        fields = {'text_hash': text_hash(event['text'])}
+        if commitment_data.get('descripcion'):
+            fields['task_name'] = commitment_data['descripcion']
+        task_info.update(fields)
+        state.task_events.append(UPDATED, task_key, fields=fields)
+        save_task_mapping()
+        
+        task_url = f"https://app.asana.com/0/{task_info['project_id']}/{task_info['asana_gid']}"
+        post_ephemeral_message(
+            channel=task_info['channel'],
+            user=task_info['user_who_posted'],
+            text=f"✏️ <{task_url}|Tarea actualizada en Asana>",
+            thread_ts=task_info.get('thread_ts')
+        )
+    except Exception as e:
+        logging.error("❌ Error actualizando tarea: %s", str(e))
+        logging.exception("Exception details:")
+        send_slack(f"Error actualizando tarea: {str(e)}")
+
+@metrics.timed('remove_task_for_message')
+def remove_task_for_message(task_key, task_info, message_deleted):
+    """
+    Elimina la tarea de un mensaje borrado, o de uno editado que dejó de ser
+    un compromiso. Las tareas ya completadas se conservan en Asana.
+    """
+    from slack_helpers import remove_reaction, post_ephemeral_message
+    from asana_client import delete_asana_task
+    try:
+        if not task_info.get('completed_at'):
+            delete_asana_task(task_info['asana_gid'])
+        if state.task_mapping.pop(task_key, None) is not None:
+            state.task_events.append(CANCELLED, task_key, asana_gid=task_info['asana_gid'])
+            save_task_mapping()
+        state.outbox.drop_task(task_key)
+        if message_deleted:
+            return
+        remove_reaction(task_info['channel'], task_info['message_ts'], 'bulb')
+        post_ephemeral_message(
+            channel=task_info['channel'],
+            user=task_info['user_who_posted'],
+            text="🗑️ El mensaje editado ya no es un compromiso: se eliminó la tarea de Asana",
+            thread_ts=task_info.get('thread_ts')
+        )
+    except Exception as e:
+        logging.error("❌ Error eliminando tarea: %s", str(e))
+        logging.exception("Exception details:")
+        send_slack(f"Error eliminando tarea: {str(e)}")
+
+@metrics.timed('slack_events')
+def handle_slack_events(headers, request_body, content_type, defer_evaluation=None):
+    """
+    Lógica de /slack/events, independiente del framework (la usan la app
+    Flask y asgi.py). Devuelve (payload, status).
+    Si se pasa `defer_evaluation`, los mensajes no se evalúan en línea: se
+    llama defer_evaluation(event, context, on_result) y quien llama evalúa y
+    luego invoca on_result(event, commitment_data).
+    """
+    # Volcado de payloads solo si el request lo pide con X-Debug-Payload
+    dump_payloads = debug_payloads_enabled(headers)
+    if dump_payloads:
+        logging.info("📑 Headers: %s", dict(headers))
+    
+    if content_type != 'application/json':
+        logging.error("❌ ERROR: Invalid content type: %s", content_type)
+        send_slack(f"ERROR: Invalid content type: {content_type}")
+        return {'error': 'Content-Type must be application/json'}, 400
     
-    logging.info("✅ Signature verification passed!")
+    if dump_payloads:
+        logging.info("📦 Raw Body: %s", request_body)
+    
+    rejection = check_slack_request(headers, request_body)
+    if rejection:
+        return rejection
+    
+    # Descartar sin parsear lo que ningún handler atiende (ediciones, joins, bots)
+    drop_reason = router.should_drop(request_body)
+    if drop_reason:
+        logging.debug("⏭️ Event dropped before parsing: %s", drop_reason)
+        return {'status': 'ok'}, 200
     
     # Parsear el JSON después de verificar la firma
     try:
         data = json.loads(request_body)
-        logging.info(f"📊 Parsed JSON data: {json.dumps(data, indent=2)}")
     except json.JSONDecodeError as e:
-        logging.error(f"❌ ERROR: Invalid JSON - {str(e)}")
+        logging.error("❌ ERROR: Invalid JSON - %s", str(e))
         send_slack("ERROR: Invalid JSON")
-        return jsonify({'error': 'Invalid JSON'}), 400
+        return {'error': 'Invalid JSON'}, 400
     
     # URL verification challenge de Slack
     if data.get('type') == 'url_verification':
         challenge = data['challenge']
-        logging.info(f"🔐 URL Verification challenge: {challenge}")
-        return jsonify({'challenge': challenge})
-    
-    if 'event' in data:
-        event = data['event']
-        event_id = data.get('event_id')
-        logging.info(f"🎯 Processing event ID: {event_id}")
-        logging.info(f"📋 Event type: {event.get('type')}")
-        logging.info(f"📝 Event data: {json.dumps(event, indent=2)}")
-        
-        # Evitar procesar eventos duplicados
-        if event_id in processed_events:
-            logging.info(f"⏭️ Event {event_id} already processed, skipping")
-            return jsonify({'status': 'ok'})
-        
-        processed_events.add(event_id)
+        logging.info("🔐 URL Verification challenge: %s", challenge)
+        return {'challenge': challenge}, 200
+    
+    dispatch_slack_event(data, defer_evaluation, dump_payloads)
+    
+    logging.debug("✅ Request processed successfully")
+    return {'status': 'ok'}, 200
+
+@metrics.timed('slack_interactions')
+def handle_slack_interactions(headers, request_body, content_type):
+    """
+    Lógica de /slack/interactions (botón y modal de creación de tareas),
+    independiente del framework. Devuelve (payload, status); payload None
+    es una respuesta vacía, que para un view_submission cierra el modal.
+    Todo lo que llama a Slack o Asana corre fuera del request.
+    """
+    from urllib.parse import parse_qs
+    
+    if content_type != 'application/x-www-form-urlencoded':
+        logging.error("❌ ERROR: Invalid content type: %s", content_type)
+        return {'error': 'Content-Type must be application/x-www-form-urlencoded'}, 400
+    
+    rejection = check_slack_request(headers, request_body)
+    if rejection:
+        return rejection
+    
+    try:
+        payload = json.loads(parse_qs(request_body).get('payload', [''])[0])
+    except ValueError as e:
+        logging.error("❌ ERROR: Invalid interaction payload - %s", str(e))
+        return {'error': 'Invalid payload'}, 400
+    
+    payload_type = payload.get('type')
+    if payload_type in ('interactive_message', 'block_actions'):
+        action = next((a for a in payload.get('actions') or []
+                       if TASK_BUTTON_ACTION in (a.get('name'), a.get('action_id'))), None)
+        if action is None:
+            INTERACTIONS.inc(type=payload_type, result='ignored')
+            return None, 200
+        INTERACTIONS.inc(type=payload_type, result='open_dialog')
+        thread = threading.Thread(target=tracing.wrap(open_dialog_for_button), args=(payload, action))
+        thread.daemon = True
+        thread.start()
+        return None, 200
+    
+    view = payload.get('view') or {}
+    if payload_type == 'view_submission' and view.get('callback_id') == TASK_MODAL_CALLBACK:
+        fields, errors = parse_task_submission(view)
+        if errors:
+            INTERACTIONS.inc(type=payload_type, result='invalid')
+            logging.info("📝 Task modal rejected: %s", errors)
+            return {'response_action': 'errors', 'errors': errors}, 200
+        fields['user'] = (payload.get('user') or {}).get('id')
+        INTERACTIONS.inc(type=payload_type, result='enqueued')
+        state.interaction_worker.enqueue(fields)
+        return None, 200
+    
+    INTERACTIONS.inc(type=payload_type or 'unknown', result='ignored')
+    logging.debug("⏭️ Unhandled interaction: %s", payload_type)
+    return None, 200
+
+def open_dialog_for_button(payload, action):
+    """Abre el modal de creación con los datos que viajan en el valor del botón"""
+    from slack_helpers import open_task_dialog
+    try:
+        value = read_interaction_state(action.get('value'))
+        if not value.get('commitment_data'):
+            logging.info("⌛ Button state expired, opening modal without commitment data")
+        channel = (payload.get('channel') or {}).get('id')
+        open_task_dialog(
+            payload['trigger_id'],
+            value.get('commitment_data') or {'descripcion': ''},
+            value.get('original_message', ''),
+            channel,
+            value.get('thread_ts') or value.get('message_ts'),
+            value.get('message_ts'),
+            value.get('state_token')
+        )
+    except Exception as e:
+        logging.error("❌ Error abriendo el modal: %s", str(e))
+        logging.exception("Exception details:")
+        send_slack(f"Error abriendo el modal: {str(e)}")
+
+@metrics.timed('process_task_submission')
+def process_task_submission(fields):
+    """Crea en Asana la tarea (y subtareas) de un modal enviado y avisa con un efímero"""
+    from slack_helpers import get_user_info, post_ephemeral_message
+    from asana_client import create_asana_task
+    metadata = fields['metadata']
+    channel = metadata.get('channel')
+    message_ts = metadata.get('message_ts')
+    user = fields['user']
+    key = submission_key(fields)
+    if not state.task_submissions.claim(key):
+        logging.info("⏭️ Task modal %s already processed, skipping", key)
+        INTERACTIONS.inc(type='view_submission', result='duplicate')
+        return
+    try:
+        logging.info("🏗️ Creating task from modal for %s in %s", user, channel)
+        assignee = fields['assignee']
+        asana_gid = get_asana_gid_from_slack_user(assignee)
+        user_email = None
+        if not asana_gid:
+            user_email = get_user_info(assignee).get('profile', {}).get('email')
         
-        # Limpiar cache después de 1000 eventos
-        if len(processed_events) > 1000:
-            processed_events.clear()
-            logging.info("🧹 Cleaned processed events cache")
+        task_result = create_asana_task(
+            name=fields['title'],
+            assignee_email=user_email,
+            assignee_gid=asana_gid,
+            project_id=fields['project_id'],
+            due_on=fields['due_on'],
+            description=fields['description'] or None,
+            subtasks='\n'.join(fields['subtasks']) or None
+        )
+        state.task_submissions.done(key, task_result['gid'])
         
-        if (event.get('type') == 'message' and 
-            not event.get('bot_id') and 
-            event.get('text')):
-            
-            text = event['text']
-            logging.info(f"💬 Processing message: {text}")
-            logging.info(f"📍 Channel: {event.get('channel')}")
-            logging.info(f"👤 User: {event.get('user')}")
-            
-            # Siempre evaluar el mensaje, tenga o no menciones
-            logging.info("🔍 Evaluating message for commitment...")
-            commitment_data = evaluate_commitment(text)
-            logging.info(f"🤖 LLM evaluation result: {commitment_data}")
-            logging.info(f"🤖 Type of result: {type(commitment_data)}")
-            
-            if commitment_data and commitment_data.get('es_compromiso'):
-                logging.info("✅ Message identified as commitment")
-                
-                # Verificar si hay menciones en el texto para determinar si hay asignación
-                has_mention = '@' in text
-                if not has_mention:
-                    logging.info("⚠️ Commitment detected but no user mentioned")
-                    # Marcar que no hay asignación clara
-                    commitment_data['sin_asignacion'] = True
-                
-                # Crear tarea automáticamente
-                thread = threading.Thread(target=process_asana_task_creation, args=(event, commitment_data))
-                thread.daemon = True
-                thread.start()
-            else:
-                logging.info("❌ Message not identified as commitment")
+        # Con el ts del mensaje la tarea queda mapeada como las automáticas
+        # (reacciones, ediciones y completado en Asana)
+        task_key = f"{channel}:{message_ts}" if channel and message_ts else None
+        if task_key:
+            task_entry = {
+                'asana_gid': task_result['gid'],
+                'channel': channel,
+                'message_ts': message_ts,
+                'user_who_posted': user,
+                'assigned_to': assignee,
+                'project_id': fields['project_id'],
+                'created_at': time.time(),
+                'can_be_cancelled': False,
+                'task_name': fields['title'],
+                'thread_ts': metadata.get('thread_ts'),
+                'source': 'modal'
+            }
+            state.task_mapping[task_key] = TaskRecord.from_dict(task_entry)
+            state.task_events.append(CREATED, task_key, task=task_entry)
+            save_task_mapping()
+            state.outbox.add(f"{task_result['gid']}:bulb", 'reactions.add',
+                             {'channel': channel, 'timestamp': message_ts, 'reaction': 'bulb'}, task_key=task_key)
         
-        elif event.get('type') == 'reaction_added':
-            logging.info(f"😀 Reaction added: {event['reaction']}")
-            # Manejar reacción de prohibido (🚫)
-            if event['reaction'] == 'no_entry_sign':
-                logging.info("🚫 Delete reaction detected, processing...")
-                item = event['item']
-                if item['type'] == 'message':
-                    task_key = f"{item['channel']}:{item['ts']}"
-                    task_info = task_mapping.get(task_key)
-                    logging.info(f"🔍 Looking for task: {task_key}, found: {bool(task_info)}")
-                    
-                    if task_info and event['user'] == task_info['user_who_posted']:
-                        # Verificar si la tarea aún puede ser cancelada
-                        current_time = time.time()
-                        creation_time = task_info.get('created_at', 0)
-                        can_be_cancelled = task_info.get('can_be_cancelled', False)
-                        time_elapsed = current_time - creation_time
-                        
-                        logging.info(f"⏰ Time elapsed since creation: {time_elapsed:.1f} seconds")
-                        logging.info(f"🔒 Can be cancelled: {can_be_cancelled}")
-                        
-                        if can_be_cancelled and time_elapsed <= 300:  # 5 minutos = 300 segundos
-                            logging.info("✅ Within 5-minute cancellation window, deleting task...")
-                            # Eliminar tarea de Asana
-                            thread = threading.Thread(target=handle_task_deletion, args=(task_info, item['channel'], item['ts']))
-                            thread.daemon = True
-                            thread.start()
-                        else:
-                            logging.info("❌ Cancellation window expired (5 minutes passed)")
-                            # Enviar mensaje efímero informando que ya no se puede cancelar
-                            post_ephemeral_message(
-                                channel=item['channel'],
-                                user=event['user'],
-                                text="⏰ Ya no puedes cancelar esta tarea. Han pasado más de 5 minutos desde su creación.",
-                                thread_ts=task_info.get('thread_ts')
-                            )
-                            # Remover la reacción ya que no es válida
-                            remove_reaction(item['channel'], item['ts'], 'no_entry_sign')
-                    else:
-                        logging.info("⛔ Unauthorized user or task not found")
-                        if task_info and event['user'] != task_info['user_who_posted']:
-                            # Informar al usuario que no puede cancelar tareas de otros
-                            post_ephemeral_message(
-                                channel=item['channel'],
-                                user=event['user'],
-                                text="❌ Solo el creador de la tarea puede cancelarla.",
-                                thread_ts=task_info.get('thread_ts')
-                            )
-                            # Remover la reacción ya que no es válida
-                            remove_reaction(item['channel'], item['ts'], 'no_entry_sign')
-        else:
-            logging.info(f"⏭️ Unhandled event type: {event.get('type')}")
-    else:
-        logging.info("📭 No event data in request")
+        subtasks = len(fields['subtasks'])
+        message = f"✅ <{task_result['url']}|Ver tarea en Asana>" + (f" ({subtasks} subtareas)" if subtasks else "")
+        if not task_result.get('assignee_found'):
+            message += f"\n⚠️ <@{assignee}> no tiene usuario en Asana: la tarea quedó sin asignar"
+        if channel and user:
+            state.outbox.add(f"{task_result['gid']}:ephemeral", 'chat.postEphemeral',
+                             {'channel': channel, 'user': user, 'text': message, 'thread_ts': metadata.get('thread_ts')},
+                             task_key=task_key)
+        return
+    except Exception as e:
+        logging.error("❌ Error creando tarea desde el modal: %s", str(e))
+        logging.exception("Exception details:")
+        state.task_submissions.release(key)
+        send_slack(f"Error creando tarea desde el modal: {str(e)}")
+        message = f"❌ No se pudo crear la tarea '{fields['title']}' en Asana: {str(e)}"
     
-    logging.info("✅ Request processed successfully")
-    return jsonify({'status': 'ok'})
+    if channel and user:
+        post_ephemeral_message(channel=channel, user=user, text=message, thread_ts=metadata.get('thread_ts'))
+
+def mark_task_completed(task_gid):
+    """Registra una tarea como completada sin tocar Slack (primera reconciliación)"""
+    for task_key, task_info in list(state.task_mapping.items()):
+        if task_info.asana_gid == task_gid:
+            task_info['completed_at'] = time.time()
+            state.task_events.append(COMPLETED, task_key, asana_gid=task_gid)
+            save_task_mapping()
+            return
+
+@metrics.timed('notify_task_completed')
+def notify_task_completed(task_gid, event):
+    """Reacciona con ✅ y avisa al creador cuando una tarea se completa en Asana"""
+    from slack_helpers import add_reaction, post_ephemeral_message
+    logging.info("✓ Task %s was marked as completed", task_gid)
+
+    # Buscar la tarea en nuestro mapeo
+    for task_key, task_info in list(state.task_mapping.items()):
+        if task_info.asana_gid == task_gid:
+            logging.info("📍 Found task in mapping: %s", task_key)
+            logging.info("📺 Channel: %s, Message TS: %s", task_info['channel'], task_info['message_ts'])
+            task_info['completed_at'] = time.time()
+            state.task_events.append(COMPLETED, task_key, asana_gid=task_gid)
+            save_task_mapping()
+
+            # Agregar reacción ✅ al mensaje original
+            # No importa quién completó la tarea
+            reaction_result = add_reaction(task_info['channel'], task_info['message_ts'], 'white_check_mark')
+            logging.info("🎯 Reaction result: %s", reaction_result)
+            state.task_events.append(REACTION, task_key, reaction='white_check_mark')
+
+            # Opcional: Enviar notificación al creador de la tarea
+            user_who_completed = (event.get('user') or {}).get('gid')
+            if user_who_completed:
+                slack_user_completed = get_slack_user_from_asana_gid(user_who_completed)
+                if slack_user_completed:
+                    post_ephemeral_message(
+                        channel=task_info['channel'],
+                        user=task_info['user_who_posted'],
+                        text=f"✅ La tarea '{task_info.get('task_name') or 'Sin nombre'}' fue completada por <@{slack_user_completed}> en Asana",
+                        thread_ts=task_info.get('thread_ts')
+                    )
+            return
+
+    logging.warning("⚠️ Task %s not found in mapping", task_gid)
+
+@metrics.timed('forget_deleted_task')
+def forget_deleted_task(task_gid):
+    """Quita del mapeo una tarea que se borró en Asana y saca el 💡 del mensaje"""
+    from slack_helpers import remove_reaction
+    for task_key, task_info in list(state.task_mapping.items()):
+        if task_info.asana_gid == task_gid:
+            state.task_mapping.pop(task_key, None)
+            state.task_events.append(CANCELLED, task_key, asana_gid=task_gid)
+            save_task_mapping()
+            state.outbox.drop_task(task_key)
+            if not task_info.get('completed_at'):
+                remove_reaction(task_info['channel'], task_info['message_ts'], 'bulb')
+            return
 
-@app.route('/asana/webhook', methods=['POST'])
-def asana_webhook():
-    """Webhook para recibir eventos de Asana"""
-    logging.info("🎯 === ASANA WEBHOOK ENDPOINT HIT ===")
-    logging.info(f"📑 Headers: {dict(request.headers)}")
+@metrics.timed('asana_webhook')
+def handle_asana_webhook(headers, body, args):
+    """Lógica de /asana/webhook independiente del framework. Devuelve (payload, status, headers)"""
+    logging.debug("🎯 Asana webhook hit")
+    
+    webhook_id = args.get('resource', DEFAULT_WEBHOOK_ID)
     
     # Verificación del webhook (handshake)
-    if 'X-Hook-Secret' in request.headers:
-        secret = request.headers['X-Hook-Secret']
-        logging.info(f"🤝 Handshake request with secret: {secret}")
-        response = jsonify({'X-Hook-Secret': secret})
-        response.headers['X-Hook-Secret'] = secret
-        return response
+    if 'X-Hook-Secret' in headers:
+        secret = headers['X-Hook-Secret']
+        if not state.webhook_secrets.handshake(webhook_id, secret, args.get('token')):
+            logging.error("❌ ERROR: Handshake rejected for webhook %s: invalid, expired or reused token", webhook_id)
+            return {'error': 'Invalid handshake token'}, 403, {}
+        logging.info("🤝 Handshake completed, secret stored for webhook %s", webhook_id)
+        return {'X-Hook-Secret': secret}, 200, {'X-Hook-Secret': secret}
     
-    # Procesar eventos
-    data = request.json
-    logging.info(f"📦 Asana webhook data: {json.dumps(data, indent=2)}")
+    # Verificar la firma antes de hacer cualquier trabajo
+    signature = headers.get('X-Hook-Signature', '')
+    if not state.webhook_secrets.verify(webhook_id, body, signature):
+        logging.error("❌ ERROR: Invalid Asana signature for webhook %s", webhook_id)
+        return {'error': 'Invalid signature'}, 401, {}
+    
+    # Encolar eventos y responder de inmediato para no exceder el timeout de Asana
+    try:
+        data = json.loads(body) or {}
+    except ValueError:
+        data = {}
     events = data.get('events', [])
-    logging.info(f"📊 Processing {len(events)} events")
+    logging.info("📊 Enqueuing %s events", len(events))
+    state.asana_event_worker.enqueue(events)
     
-    for event in events:
-        logging.info(f"🔍 Processing event: action={event.get('action')}, resource_type={event.get('resource', {}).get('resource_type')}")
-        
-        if event.get('action') == 'changed' and event.get('resource', {}).get('resource_type') == 'task':
-            # Verificar cambios en el campo
-            change_field = event.get('change', {}).get('field', '')
-            logging.info(f"📝 Changed field: {change_field}")
-            
-            # Verificar si la tarea fue completada
-            if 'completed' in change_field:
-                task_gid = event['resource']['gid']
-                new_value = event.get('change', {}).get('new_value', {})
-                
-                logging.info(f"✅ Task completion status changed for GID: {task_gid}")
-                logging.info(f"📊 New value: {new_value}")
-                
-                # Si la tarea fue marcada como completada (no des-completada)
-                if new_value.get('resource_subtype') == 'completed':
-                    logging.info(f"✓ Task {task_gid} was marked as completed")
-                    
-                    # Buscar la tarea en nuestro mapeo
-                    task_found = False
-                    for task_key, task_info in task_mapping.items():
-                        if task_info['asana_gid'] == task_gid:
-                            task_found = True
-                            logging.info(f"📍 Found task in mapping: {task_key}")
-                            logging.info(f"📺 Channel: {task_info['channel']}, Message TS: {task_info['message_ts']}")
-                            
-                            # Agregar reacción ✅ al mensaje original
-                            # No importa quién completó la tarea
-                            reaction_result = add_reaction(task_info['channel'], task_info['message_ts'], 'white_check_mark')
-                            logging.info(f"🎯 Reaction result: {reaction_result}")
-                            
-                            # Opcional: Enviar notificación al creador de la tarea
-                            user_who_completed = event.get('user', {}).get('gid')
-                            if user_who_completed:
-                                slack_user_completed = get_slack_user_from_asana_gid(user_who_completed)
-                                if slack_user_completed:
-                                    post_ephemeral_message(
-                                        channel=task_info['channel'],
-                                        user=task_info['user_who_posted'],
-                                        text=f"✅ La tarea '{task_info.get('task_name', 'Sin nombre')}' fue completada por <@{slack_user_completed}> en Asana",
-                                        thread_ts=task_info.get('thread_ts')
-                                    )
-                            break
-                    
-                    if not task_found:
-                        logging.warning(f"⚠️ Task {task_gid} not found in mapping")
-                else:
-                    logging.info(f"↩️ Task {task_gid} was uncompleted or status changed to: {new_value.get('resource_subtype')}")
-    
-    return jsonify({'status': 'ok'})
+    return {'status': 'ok'}, 200, {}
+
+# Jobs de fondo con nombre (lifecycle.py): si la instancia se apaga con el
+# job a medias, la próxima lo vuelve a correr solo con el payload JSON, así
+# que cada uno parte de la clave del mensaje y chequea el mapeo actual.
+
+def create_task_job(event, commitment_data):
+    """Crea la tarea de un compromiso, salvo que el mensaje ya tenga una"""
+    task_key = f"{event['channel']}:{event['ts']}"
+    if has_task(task_key):
+        logging.info("⏭️ Message already has a task, skipping creation: %s", task_key)
+        return
+    process_asana_task_creation(event, commitment_data)
+
+def disable_cancellation(task_key):
+    """Cierra la ventana de 5 minutos para cancelar la tarea con 🚫"""
+    task_info = state.task_mapping.get(task_key)
+    if task_info is not None and task_info.get('can_be_cancelled'):
+        task_info['can_be_cancelled'] = False
+        save_task_mapping()
+        logging.info("⏰ Cancellation window expired for task: %s", task_key)
+
+def delete_task_job(channel, message_ts):
+    task_info = state.task_mapping.get(f"{channel}:{message_ts}")
+    if task_info is not None:
+        handle_task_deletion(task_info, channel, message_ts)
+
+def update_task_job(task_key, event, commitment_data):
+    task_info = state.task_mapping.get(task_key)
+    if task_info is not None:
+        process_task_update(task_key, task_info, event, commitment_data)
+
+def remove_task_job(task_key, message_deleted):
+    task_info = state.task_mapping.get(task_key)
+    if task_info is not None:
+        remove_task_for_message(task_key, task_info, message_deleted)
+
+def task_completed_job(task_gid, event):
+    """Handler del worker de eventos de Asana: la notificación cuenta como trabajo en curso"""
+    with lifecycle.track('task_completed', task_gid=task_gid, event=event):
+        notify_task_completed(task_gid, event)
+
+def asana_events_job(events):
+    state.asana_event_worker.enqueue(events)
+
+def drain_asana_events():
+    """Lotes del webhook de Asana y notificaciones que el worker todavía no empezó"""
+    worker = state.__dict__.get('asana_event_worker')
+    if worker is None:
+        return []
+    batches, notifications = worker.drain()
+    return ([('asana_events', {'events': events}) for events in batches] +
+            [('task_completed', {'task_gid': task_gid, 'event': event}) for task_gid, event in notifications])
+
+def task_submission_job(fields):
+    """Handler del worker de interacciones: el submit cuenta como trabajo en curso"""
+    with lifecycle.track('task_submission', fields=fields):
+        process_task_submission(fields)
+
+def drain_interactions():
+    """Submits encolados que el worker todavía no tomó"""
+    worker = state.__dict__.get('interaction_worker')
+    return [('task_submission', {'fields': fields}) for fields in worker.drain()] if worker else []
+
+def restore_outbox_entry(entry):
+    state.outbox.restore(entry)
+
+def drain_outbox():
+    """Efectos en Slack sin entregar: siguen en la próxima instancia"""
+    outbox = state.__dict__.get('outbox')
+    return [('slack_outbox', {'entry': entry}) for entry in outbox.drain()] if outbox else []
+
+lifecycle.register('create_task', create_task_job)
+lifecycle.register('disable_cancellation', disable_cancellation)
+lifecycle.register('delete_task', delete_task_job)
+lifecycle.register('update_task', update_task_job)
+lifecycle.register('remove_task', remove_task_job)
+lifecycle.register('task_submission', process_task_submission)
+lifecycle.register('task_completed', notify_task_completed)
+lifecycle.register('asana_events', asana_events_job)
+lifecycle.register('slack_outbox', restore_outbox_entry)
+lifecycle.add_drainer(drain_interactions)
+lifecycle.add_drainer(drain_asana_events)
+lifecycle.add_drainer(drain_outbox)
+
+def create_app():
+    """Arma la app Flask con las rutas del servicio"""
+    from flask import Flask, request, jsonify, Response
+
+    init()
+    start_background_jobs()
+    app = Flask(__name__)
+
+    @app.route('/')
+    def home():
+        logging.info("🏠 Home endpoint accessed")
+        return 'Slack-Asana Integration Service is running!'
+
+    @app.route('/health')
+    def health():
+        return jsonify(health_payload())
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/debug/traces')
+    def debug_traces():
+        """Traces recientes del ring buffer; requiere el header X-Debug-Payload"""
+        if not debug_payloads_enabled(request.headers):
+            return jsonify({'error': 'Forbidden'}), 403
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({'traces': tracing.recent_traces(limit=limit, trace_id=request.args.get('trace_id'))})
+
+    @app.after_request
+    def count_response(response):
+        metrics.HTTP_RESPONSES.inc(route=request.url_rule.rule if request.url_rule else 'unmatched', status=response.status_code)
+        return response
+
+    @app.route('/test', methods=['GET', 'POST'])
+    def test():
+        print(f"TEST endpoint hit - Method: {request.method}")
+        print(f"Headers: {dict(request.headers)}")
+        if request.method == 'POST':
+            print(f"Body: {request.get_data(as_text=True)}")
+        return jsonify({'message': 'Test successful', 'method': request.method})
+
+    @app.route('/slack/events', methods=['POST'])
+    def slack_events():
+        logging.debug("🔥 Slack event from %s", request.remote_addr)
+        payload, status = handle_slack_events(request.headers, request.get_data(as_text=True), request.content_type)
+        return jsonify(payload), status
+
+    @app.route('/slack/interactions', methods=['POST'])
+    def slack_interactions():
+        payload, status = handle_slack_interactions(request.headers, request.get_data(as_text=True), request.mimetype)
+        return (jsonify(payload) if payload is not None else ''), status
+
+    @app.route('/asana/webhook', methods=['POST'])
+    def asana_webhook():
+        """Webhook para recibir eventos de Asana"""
+        payload, status, headers = handle_asana_webhook(request.headers, request.get_data(), request.args)
+        response = jsonify(payload)
+        response.headers.update(headers)
+        return response, status
+
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `main:app` (gunicorn, Dockerfile) crea la app en el primer acceso
+    global _app
+    if name == 'app':
+        with _init_lock:
+            if _app is None:
+                _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
\ No newline at end of file
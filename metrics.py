@@ -0,0 +1,264 @@
+"""
+Métricas en memoria expuestas en formato de texto de Prometheus (/metrics).
+
+Instrumentación liviana, sin dependencias:
+- `timed(name)`: decorador que mide latencia y errores de una función
+  (sincrónica o corrutina)
+- `track_upstream(service, method)`: context manager para llamadas a Slack,
+  Asana y OpenAI (cantidad, latencia y errores por método de la API). Solo
+  mide: el límite de tasa (rate_limit.py) lo aplican los helpers de cada
+  cliente antes de entrar
+- `record_cache(name, hit)`: aciertos/fallos de caches
+- `register_gauge(fn, **labels)`: valores leídos al exportar (p. ej. colas)
+
+`timed` y `track_upstream` además abren un span de tracing.
+"""
+
+import time
+import inspect
+import threading
+import functools
+
+import tracing
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.kind = 'counter'
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + _format_labels(key), value) for key, value in items]
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.kind = 'histogram'
+        self._buckets = buckets
+        # labels -> [conteos por bucket..., +Inf, suma]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self._buckets) + 2)
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            else:
+                data[len(self._buckets)] += 1
+            data[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        samples = []
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self._buckets + ('+Inf',), data[:-1]):
+                cumulative += count
+                samples.append((self.name + '_bucket' + _format_labels(key, [('le', bound)]), cumulative))
+            samples.append((self.name + '_sum' + _format_labels(key), round(data[-1], 6)))
+            samples.append((self.name + '_count' + _format_labels(key), cumulative))
+        return samples
+
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.kind = 'gauge'
+        self._callbacks = {}
+
+    def set_function(self, fn, **labels):
+        self._callbacks[_label_key(labels)] = fn
+
+    def samples(self):
+        samples = []
+        for key, fn in list(self._callbacks.items()):
+            try:
+                samples.append((self.name + _format_labels(key), fn()))
+            except Exception:
+                continue
+        return samples
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name, help_text):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text)
+        return metric
+
+
+def counter(name, help_text=''):
+    return _get_or_create(Counter, name, help_text)
+
+
+def histogram(name, help_text=''):
+    return _get_or_create(Histogram, name, help_text)
+
+
+def gauge(name, help_text=''):
+    return _get_or_create(Gauge, name, help_text)
+
+
+HANDLER_DURATION = histogram('handler_duration_seconds', 'Latency of instrumented handlers')
+HANDLER_ERRORS = counter('handler_errors_total', 'Exceptions raised by instrumented handlers')
+UPSTREAM_REQUESTS = counter('upstream_requests_total', 'Outbound API calls by service, method and outcome')
+UPSTREAM_DURATION = histogram('upstream_request_duration_seconds', 'Latency of outbound API calls')
+CACHE_REQUESTS = counter('cache_requests_total', 'Cache lookups by cache and result')
+HTTP_RESPONSES = counter('http_responses_total', 'HTTP responses by route and status')
+QUEUE_DEPTH = gauge('queue_depth', 'Items waiting in background queues')
+
+
+def timed(name):
+    """Decorador: mide la latencia de la función y cuenta sus excepciones"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    with tracing.span(name):
+                        return await func(*args, **kwargs)
+                except Exception:
+                    HANDLER_ERRORS.inc(handler=name)
+                    raise
+                finally:
+                    HANDLER_DURATION.observe(time.perf_counter() - start, handler=name)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracing.span(name):
+                    return func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                HANDLER_DURATION.observe(time.perf_counter() - start, handler=name)
+        return wrapper
+    return decorator
+
+
+class _UpstreamCall:
+    def __init__(self, service, method):
+        self.service = service
+        self.method = method
+        self.status = None
+        # Resultado según el body: Slack devuelve sus errores con 200 y ok:false
+        self.ok = None
+        self.error = None
+
+    def __enter__(self):
+        self._span = tracing.span(f"{self.service} {self.method}", service=self.service)
+        self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._span.set('status', self.status)
+        if self.error:
+            self._span.set('error', self.error)
+        self._span.__exit__(exc_type, exc, tb)
+        if exc_type is not None:
+            outcome = 'exception'
+        elif self.status is not None and self.status >= 400:
+            outcome = str(self.status)
+        elif self.ok is False or self.error:
+            outcome = self.error or 'error'
+        else:
+            outcome = 'ok'
+        UPSTREAM_REQUESTS.inc(service=self.service, method=self.method, outcome=outcome)
+        UPSTREAM_DURATION.observe(elapsed, service=self.service, method=self.method)
+        return False
+
+
+def track_upstream(service, method):
+    """
+    Context manager para una llamada saliente. Asignar `call.status` con el
+    status HTTP para que los 4xx/5xx cuenten como error, y `call.ok` /
+    `call.error` cuando el error viene en el body (Slack responde 200 con
+    ok:false); el outcome es entonces el código de error:
+
+        with track_upstream('slack', 'reactions.add') as call:
+            response = requests.post(...)
+            call.status = response.status_code
+            call.ok, call.error = body.get('ok'), body.get('error')
+
+    También sirve con `async with`. No toca el límite de tasa: eso es
+    rate_limit.acquire / acquire_async antes y rate_limit.after_response
+    después.
+    """
+    return _UpstreamCall(service, method)
+
+
+def record_cache(name, hit):
+    CACHE_REQUESTS.inc(cache=name, result='hit' if hit else 'miss')
+
+
+def register_gauge(fn, **labels):
+    """Registra una función que devuelve la profundidad de una cola"""
+    QUEUE_DEPTH.set_function(fn, **labels)
+
+
+def render():
+    """Todas las métricas en formato de exposición de texto de Prometheus"""
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, value in samples:
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
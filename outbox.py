@@ -0,0 +1,337 @@
+"""
+Outbox de efectos secundarios en Slack.
+
+Después de crear una tarea en Asana quedan llamadas a Slack que no hacen a
+la tarea en sí: la reacción 💡 y el efímero con el link. Antes se hacían en
+línea: sumaban latencia a cada tarea y si fallaban no se reintentaban. Ahora
+quien crea la tarea las deja en el outbox y sigue:
+
+    outbox.add(f"{task_gid}:bulb", 'reactions.add',
+               {'channel': channel, 'timestamp': message_ts, 'reaction': 'bulb'}, task_key=task_key)
+
+- cada entrada tiene una clave de idempotencia: una clave pendiente o ya
+  entregada hace poco (DELIVERED_LIMIT) no se vuelve a agregar, así que
+  reintentar la creación (lifecycle.py) no duplica mensajes. La clave va por
+  el gid de la tarea en Asana y no por el mensaje: si la tarea se borra y el
+  mensaje vuelve a generar una, la nueva no choca con la anterior
+- al borrar una tarea, drop_task(task_key) descarta sus entradas pendientes
+  para que no lleguen a Slack después (una 💡 en un mensaje sin tarea)
+- el outbox se guarda con un DebouncedWriter en el volumen de estado
+  durable, en un archivo propio de la instancia junto a OUTBOX_FILE
+  (slack_outbox.<id>.json: varias escribiendo el mismo se pisarían). Una
+  entrada sale del archivo recién cuando Slack la confirma
+- el despachador toca su archivo cada OUTBOX_HEARTBEAT segundos; el archivo
+  que pasa OUTBOX_STALE_AFTER sin tocarse es de una instancia muerta (crash,
+  OOM) y lo toma, con un rename, la primera instancia viva que lo ve. Las
+  entradas que esa instancia estaba mandando se mandan de nuevo
+- en el apagado ordenado drain() espera a los envíos en curso y entrega lo
+  pendiente a los jobs de lifecycle.py; la próxima instancia lo vuelve a
+  encolar con restore() sin esperar a que el archivo quede viejo
+- un thread despachador manda las entradas vencidas en un pool de
+  OUTBOX_WORKERS threads. Los errores transitorios (excepción de red,
+  ratelimited, internal_error...) se reintentan con backoff exponencial hasta
+  OUTBOX_MAX_ATTEMPTS; los demás (channel_not_found, message_not_found...)
+  descartan la entrada
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from persistence import DebouncedWriter, state_path
+
+OUTBOX_FILE = os.getenv('SLACK_OUTBOX_FILE') or state_path('slack_outbox.json')
+OUTBOX_WORKERS = int(os.getenv('SLACK_OUTBOX_WORKERS', '4'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('SLACK_OUTBOX_MAX_ATTEMPTS', '8'))
+# Backoff entre intentos: 2, 4, 8... segundos, hasta OUTBOX_RETRY_MAX
+OUTBOX_RETRY_BASE = float(os.getenv('SLACK_OUTBOX_RETRY_BASE', '2'))
+OUTBOX_RETRY_MAX = float(os.getenv('SLACK_OUTBOX_RETRY_MAX', '300'))
+# Cada cuánto el despachador marca su archivo como vivo y busca archivos abandonados
+OUTBOX_HEARTBEAT = float(os.getenv('SLACK_OUTBOX_HEARTBEAT', '30'))
+# Sin tocarse por este tiempo, el archivo es de una instancia muerta
+OUTBOX_STALE_AFTER = float(os.getenv('SLACK_OUTBOX_STALE_AFTER', '120'))
+# Segundos que drain() espera a los envíos en curso
+DRAIN_WAIT = float(os.getenv('SLACK_OUTBOX_DRAIN_WAIT', '2'))
+# Claves entregadas que se recuerdan para descartar duplicados
+DELIVERED_LIMIT = 5000
+# Segundos que drop_task espera a los envíos en curso de la tarea
+DROP_WAIT = 5
+
+# Método de la API de Slack -> función de slack_helpers
+METHODS = {
+    'reactions.add': 'add_reaction',
+    'chat.postEphemeral': 'post_ephemeral_message',
+}
+# Errores de Slack que significan que el efecto ya está hecho
+DONE_ERRORS = frozenset(('already_reacted',))
+# Errores de Slack que vale la pena reintentar
+RETRY_ERRORS = frozenset(('ratelimited', 'internal_error', 'fatal_error', 'service_unavailable', 'request_timeout'))
+
+OUTBOX = metrics.counter('slack_outbox_total', 'Slack side effects in the outbox by method and outcome')
+OUTBOX_DELAY = metrics.histogram('slack_outbox_delay_seconds', 'Time from queuing a Slack side effect to its delivery')
+
+
+def backoff(attempts):
+    return min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+
+
+def call_slack(method, params):
+    """Hace la llamada; devuelve 'done', 'retry' o el error permanente de Slack"""
+    import slack_helpers
+    try:
+        result = getattr(slack_helpers, METHODS[method])(**params)
+    except Exception as e:
+        logging.warning("⚠️ Slack %s failed, will retry: %s", method, e)
+        return 'retry'
+    error = (result or {}).get('error')
+    if (result or {}).get('ok') or error in DONE_ERRORS:
+        return 'done'
+    if error in RETRY_ERRORS:
+        return 'retry'
+    return error or 'unknown_error'
+
+
+class SlackOutbox:
+    """Efectos en Slack pendientes, persistidos y despachados con reintentos"""
+
+    def __init__(self, path=OUTBOX_FILE, workers=OUTBOX_WORKERS, on_delivered=None, send=call_slack):
+        self._base_path = path
+        root, ext = os.path.splitext(path)
+        # Archivo propio de esta instancia
+        self._path = f"{root}.{uuid.uuid4().hex}{ext}"
+        self._glob = f"{glob.escape(root)}.*{ext}"
+        self._workers = workers
+        self._on_delivered = on_delivered
+        self._send = send
+        # clave -> entrada, en orden de llegada
+        self._entries = OrderedDict()
+        self._delivered = OrderedDict()
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._writer = DebouncedWriter(self._path, self._snapshot)
+        self.claim_stale()
+
+    def claim_stale(self, now=None):
+        """Toma los archivos de instancias muertas; devuelve cuántas entradas sumó"""
+        now = time.time() if now is None else now
+        added = 0
+        # El archivo sin id es el formato anterior (una sola instancia)
+        for path in [self._base_path] + sorted(glob.glob(self._glob)):
+            if path == self._path:
+                continue
+            try:
+                if path != self._base_path and now - os.stat(path).st_mtime < OUTBOX_STALE_AFTER:
+                    continue
+                claimed = f"{path}.{uuid.uuid4().hex}.claimed"
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # No existe o lo tomó otra instancia
+                continue
+            try:
+                with open(claimed, 'r') as f:
+                    saved = json.load(f)
+            except ValueError:
+                logging.error(f"❌ {claimed} contains invalid JSON, its Slack side effects were not resumed")
+                continue
+            with self._cond:
+                self._delivered.update((key, None) for key in saved.get('delivered', []))
+                for entry in saved.get('pending', []):
+                    if entry['key'] not in self._entries and entry['key'] not in self._delivered:
+                        self._entries[entry['key']] = dict(entry, next_at=0)
+                        added += 1
+                while len(self._delivered) > DELIVERED_LIMIT:
+                    self._delivered.popitem(last=False)
+                self._cond.notify()
+            os.remove(claimed)
+        if added:
+            self._writer.schedule()
+            logging.info("📤 %s Slack side effects pending from a previous instance", added)
+        return added
+
+    def _heartbeat(self):
+        """Marca el archivo propio como vivo y toma los abandonados"""
+        try:
+            os.utime(self._path)
+        except FileNotFoundError:
+            pass
+        self.claim_stale()
+
+    def _snapshot(self):
+        with self._cond:
+            return {
+                'pending': [dict(entry) for entry in self._entries.values()],
+                'delivered': list(self._delivered),
+            }
+
+    def pending(self):
+        return len(self._entries)
+
+    def add(self, key, method, params, task_key=None):
+        """Agrega un efecto con clave de idempotencia; False si ya estaba"""
+        entry = {
+            'key': key,
+            'method': method,
+            'params': params,
+            'task_key': task_key,
+            'attempts': 0,
+            'created_at': time.time(),
+            'next_at': 0,
+        }
+        with self._cond:
+            if key in self._entries or key in self._delivered:
+                OUTBOX.inc(method=method, result='duplicate')
+                return False
+            self._entries[key] = entry
+            self._cond.notify()
+        self._writer.schedule()
+        self.start()
+        return True
+
+    def drain(self, timeout=DRAIN_WAIT):
+        """
+        Saca y devuelve las entradas sin entregar (apagado). Espera hasta
+        `timeout` segundos a los envíos en curso; los que no terminan quedan
+        en el archivo y no se devuelven, así no se mandan dos veces.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._in_flight and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            entries = [entry for key, entry in self._entries.items() if key not in self._in_flight]
+            for entry in entries:
+                del self._entries[entry['key']]
+        self._writer.schedule()
+        return entries
+
+    def restore(self, entry):
+        """Vuelve a encolar una entrada de drain(), con sus intentos; False si ya estaba"""
+        key = entry['key']
+        with self._cond:
+            if key in self._entries or key in self._delivered:
+                return False
+            self._entries[key] = dict(entry, next_at=0)
+            self._cond.notify()
+        self._writer.schedule()
+        self.start()
+        return True
+
+    def drop_task(self, task_key, timeout=DROP_WAIT):
+        """
+        Descarta los efectos pendientes de una tarea que se borró; devuelve
+        cuántos. Los que ya se están mandando no se pueden cortar: se espera
+        hasta `timeout` segundos a que terminen, así quien borra la tarea
+        puede sacar la 💡 después de que llegó y no antes.
+        """
+        deadline = time.monotonic() + timeout
+        dropped = 0
+        with self._cond:
+            while True:
+                for key, entry in list(self._entries.items()):
+                    if entry.get('task_key') == task_key and key not in self._in_flight:
+                        del self._entries[key]
+                        # Como entregada: reintentar la creación no la vuelve a agregar
+                        self._delivered[key] = None
+                        OUTBOX.inc(method=entry['method'], result='dropped')
+                        dropped += 1
+                sending = any(self._entries[key].get('task_key') == task_key for key in self._in_flight
+                              if key in self._entries)
+                if not sending or time.monotonic() >= deadline:
+                    break
+                self._cond.wait(deadline - time.monotonic())
+            self._cond.notify_all()
+        if dropped:
+            self._writer.schedule()
+            logging.info("🗑️ Dropped %s pending Slack side effects for deleted task %s", dropped, task_key)
+        return dropped
+
+    def wait_idle(self, timeout):
+        """Espera hasta `timeout` segundos a que se vacíe; devuelve lo que quedó pendiente"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._entries and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return len(self._entries)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='slack-outbox')
+            self._thread = threading.Thread(target=self._run, name='slack-outbox')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Deja de despachar; lo pendiente queda en el archivo"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _run(self):
+        heartbeat_at = time.monotonic() + OUTBOX_HEARTBEAT
+        while True:
+            if time.monotonic() >= heartbeat_at:
+                heartbeat_at = time.monotonic() + OUTBOX_HEARTBEAT
+                try:
+                    self._heartbeat()
+                except Exception:
+                    logging.exception("❌ Error revisando los archivos del outbox")
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.time()
+                waiting = [entry for key, entry in self._entries.items() if key not in self._in_flight]
+                due = [entry for entry in waiting if entry['next_at'] <= now]
+                if not due:
+                    timeout = heartbeat_at - time.monotonic()
+                    next_at = min((entry['next_at'] for entry in waiting), default=None)
+                    if next_at is not None:
+                        timeout = min(timeout, next_at - now)
+                    self._cond.wait(max(0.0, timeout))
+                    continue
+                self._in_flight.update(entry['key'] for entry in due)
+            for entry in due:
+                self._executor.submit(self._deliver, entry)
+
+    def _deliver(self, entry):
+        key, method = entry['key'], entry['method']
+        outcome = self._send(method, entry['params'])
+        retrying = outcome == 'retry' and entry['attempts'] + 1 < OUTBOX_MAX_ATTEMPTS
+        with self._cond:
+            self._in_flight.discard(key)
+            if retrying:
+                entry['attempts'] += 1
+                entry['next_at'] = time.time() + backoff(entry['attempts'])
+            else:
+                self._entries.pop(key, None)
+                self._delivered[key] = None
+                while len(self._delivered) > DELIVERED_LIMIT:
+                    self._delivered.popitem(last=False)
+            self._cond.notify_all()
+        self._writer.schedule()
+
+        if retrying:
+            OUTBOX.inc(method=method, result='retry')
+        elif outcome == 'done':
+            OUTBOX.inc(method=method, result='delivered')
+            OUTBOX_DELAY.observe(time.time() - entry['created_at'], method=method)
+            if self._on_delivered is not None:
+                try:
+                    self._on_delivered(entry)
+                except Exception:
+                    logging.exception("❌ Error after delivering a Slack side effect")
+        else:
+            OUTBOX.inc(method=method, result='failed')
+            logging.error("❌ Giving up on Slack %s (%s) after %s attempts: %s",
+                          method, key, entry['attempts'] + 1, 'too many retries' if outcome == 'retry' else outcome)
@@ -0,0 +1,219 @@
+"""
+Escritura segura de los archivos JSON de estado.
+
+atomic_write_json escribe a un temporal en el mismo directorio, hace fsync y
+lo renombra sobre el destino (y fsync del directorio): un crash a mitad de
+escritura deja el archivo anterior entero, nunca uno truncado.
+
+DebouncedWriter es para los archivos que se guardan en ráfagas, como
+task_mapping.json: schedule() solo marca el archivo como sucio y un único
+thread lo escribe PERSIST_DEBOUNCE segundos después, con el estado de ese
+momento. N cambios seguidos son una sola escritura, y como nadie más escribe
+el archivo no hay dos threads serializando el mismo dict a la vez.
+
+    writer = DebouncedWriter('task_mapping.json', lambda: dict(mapping))
+    writer.schedule()    # no bloquea
+    writer.flush()       # escribe ya si hay cambios pendientes
+
+flush_all() baja todos los writers pendientes; se registra en atexit y es el
+hook para el apagado ordenado del proceso.
+
+El estado que tiene que sobrevivir a la instancia (mapeo de tareas, log de
+eventos y archivo, secretos de los webhooks, sync tokens, jobs y efectos
+pendientes) va en STATE_DIR vía state_path(). En
+Cloud Run el disco local se pierde con cada deploy o instancia nueva, así
+que ahí STATE_DIR tiene que ser un volumen montado (Cloud Storage o NFS) y
+check_durable_state() no deja arrancar sin él.
+
+Las herramientas que escriben el mismo estado fuera del servicio (backfill)
+no pueden correr a la vez que él: cada proceso del servicio tiene tomado un
+flock compartido sobre STATE_DIR/.service.lock (hold_service_lock) y la
+herramienta pide uno exclusivo (exclusive_state_lock). El flock solo ve a
+los procesos que montan el mismo volumen con soporte de locks; con el
+servicio en Cloud Run, la herramienta se corre con el servicio en 0
+instancias.
+"""
+
+import os
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+
+import metrics
+
+PERSIST_DEBOUNCE = float(os.getenv('PERSIST_DEBOUNCE', '0.5'))
+# Directorio del estado durable; vacío = directorio de trabajo
+STATE_DIR = os.getenv('STATE_DIR', '')
+# Permite arrancar en Cloud Run sin volumen (el estado se pierde con la instancia)
+ALLOW_EPHEMERAL_STATE = os.getenv('ALLOW_EPHEMERAL_STATE', '').lower() in ('1', 'true', 'yes')
+
+SERVICE_LOCK_FILE = '.service.lock'
+
+STATE_WRITES = metrics.counter('state_file_writes_total', 'Atomic writes of JSON state files')
+STATE_WRITE_DURATION = metrics.histogram('state_file_write_seconds', 'Time spent serializing and writing JSON state files')
+
+
+def state_path(name):
+    """Ruta de un archivo de estado durable"""
+    return os.path.join(STATE_DIR, name) if STATE_DIR else name
+
+
+_service_lock = None
+
+
+def _open_service_lock():
+    if STATE_DIR:
+        os.makedirs(STATE_DIR, exist_ok=True)
+    return open(state_path(SERVICE_LOCK_FILE), 'a')
+
+
+def hold_service_lock():
+    """Marca el estado como en uso por el servicio hasta que termine el proceso"""
+    global _service_lock
+    if _service_lock is None:
+        _service_lock = _open_service_lock()
+        fcntl.flock(_service_lock, fcntl.LOCK_SH)
+
+
+def exclusive_state_lock():
+    """Lock exclusivo del estado para una herramienta offline; None si el servicio lo está usando"""
+    lock = _open_service_lock()
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+def check_durable_state():
+    """
+    En Cloud Run (K_SERVICE definido) exige que STATE_DIR sea un volumen
+    montado: sin él el estado durable se pierde en cada deploy (sin los
+    secretos de los webhooks de Asana todas las entregas fallan la
+    verificación; sin los sync tokens cada arranque relista los proyectos)
+    """
+    on_cloud_run = bool(os.getenv('K_SERVICE')) and not ALLOW_EPHEMERAL_STATE
+    if on_cloud_run and (not STATE_DIR or not os.path.ismount(STATE_DIR)):
+        message = (f"STATE_DIR ({STATE_DIR or 'unset'}) is not a mounted volume: on Cloud Run the local disk is "
+                   "lost on every new instance. Mount a volume at STATE_DIR or set ALLOW_EPHEMERAL_STATE=1")
+        logging.critical(f"❌ {message}")
+        raise RuntimeError(message)
+    if STATE_DIR:
+        os.makedirs(STATE_DIR, exist_ok=True)
+
+
+def atomic_write(path, data):
+    """Reemplaza `path` por `data` (bytes) sin dejar nunca un archivo a medias"""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    # El rename es durable recién cuando se sincroniza el directorio
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, obj, **dump_kwargs):
+    """Serializa `obj` y lo escribe con atomic_write"""
+    data = json.dumps(obj, **dump_kwargs).encode('utf-8')
+    atomic_write(path, data)
+    STATE_WRITES.inc(file=os.path.basename(path))
+
+
+_writers = []
+_writers_lock = threading.Lock()
+
+
+class DebouncedWriter:
+    """Un thread que escribe `path` con `snapshot()` a lo sumo una vez cada `delay` segundos"""
+
+    def __init__(self, path, snapshot, delay=PERSIST_DEBOUNCE, **dump_kwargs):
+        self._path = path
+        self._snapshot = snapshot
+        self._delay = delay
+        self._dump_kwargs = dump_kwargs
+        self._dirty = False
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._thread = None
+        with _writers_lock:
+            _writers.append(self)
+
+    def schedule(self):
+        """Marca el archivo como modificado; no bloquea"""
+        with self._cond:
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'writer-{os.path.basename(self._path)}')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def pending(self):
+        return self._dirty
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+            # Ventana para juntar los cambios que sigan llegando
+            if self._delay > 0:
+                time.sleep(self._delay)
+            try:
+                self.flush()
+            except Exception:
+                logging.exception(f"❌ Error guardando {self._path}")
+
+    def flush(self):
+        """Escribe ahora si hay cambios pendientes"""
+        with self._io_lock:
+            with self._cond:
+                if not self._dirty:
+                    return
+                self._dirty = False
+            try:
+                start = time.perf_counter()
+                atomic_write_json(self._path, self._snapshot(), **self._dump_kwargs)
+                STATE_WRITE_DURATION.observe(time.perf_counter() - start, file=os.path.basename(self._path))
+            except BaseException:
+                # Que el próximo intento vuelva a escribir
+                with self._cond:
+                    self._dirty = True
+                raise
+
+
+def flush_all():
+    """Escribe todo lo pendiente de todos los writers (apagado del proceso)"""
+    with _writers_lock:
+        writers = list(_writers)
+    for writer in writers:
+        try:
+            writer.flush()
+        except Exception:
+            logging.exception("❌ Error guardando estado pendiente al apagar")
+
+
+atexit.register(flush_all)
@@ -0,0 +1,162 @@
+"""
+Límites de tasa compartidos para las llamadas a Slack, Asana y OpenAI.
+
+Un token bucket por servicio, compartido por todo el proceso: los helpers
+de cada cliente (slack_helpers._slack_request, asana_client._asana_request,
+llm_evaluator) llaman a acquire antes de cada request, así que el total de
+llamadas respeta el límite sin importar cuántos threads las hagan, y le
+pasan la respuesta a after_response: un 429 pausa el bucket por el
+Retry-After de la respuesta (o RATE_LIMIT_429_PAUSE si no trae).
+
+Los límites se leen de SLACK_RATE_LIMIT, ASANA_RATE_LIMIT y OPENAI_RATE_LIMIT
+(llamadas por segundo; vacío o 0 = sin límite, lo normal para el servicio) o
+se fijan con configure(), como hace backfill.py. Un método puede tener su
+propio bucket además del de su servicio (los límites de Slack son por
+método):
+
+    rate_limit.configure('asana', rate=2.5, burst=5)
+    rate_limit.configure('slack:conversations.history', rate=0.8)
+    waited = rate_limit.acquire('slack', 'conversations.history')
+    response = requests.get(...)
+    rate_limit.after_response('slack', 'conversations.history', response)
+"""
+
+import os
+import time
+import asyncio
+import threading
+
+import metrics
+
+RATE_LIMIT_429_PAUSE = float(os.getenv('RATE_LIMIT_429_PAUSE', '1'))
+
+WAIT = metrics.histogram('upstream_rate_limit_wait_seconds', 'Time outbound API calls waited for the rate limiter')
+
+
+class TokenBucket:
+    """`rate` tokens por segundo con hasta `burst` acumulados"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Descuenta los tokens; devuelve cuánto hay que esperar para usarlos"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self, tokens=1):
+        """Bloquea hasta poder usar `tokens`; devuelve los segundos esperados"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """No entrega tokens durante `seconds` (respuesta 429)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def _env_rate(service):
+    value = os.getenv(f'{service.upper()}_RATE_LIMIT')
+    return float(value) if value else 0.0
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_loaded = set()
+
+
+def governor(service):
+    """Bucket del servicio, o None si no tiene límite"""
+    bucket = _buckets.get(service)
+    if bucket is None and service not in _loaded:
+        with _buckets_lock:
+            if service not in _loaded:
+                rate = _env_rate(service)
+                if rate > 0:
+                    _buckets[service] = TokenBucket(rate)
+                _loaded.add(service)
+            bucket = _buckets.get(service)
+    return bucket
+
+
+def configure(service, rate, burst=None):
+    """Fija (o quita, con rate 0) el límite de un servicio o de un 'servicio:método'"""
+    with _buckets_lock:
+        if rate and rate > 0:
+            _buckets[service] = TokenBucket(rate, burst)
+        else:
+            _buckets.pop(service, None)
+        _loaded.add(service)
+
+
+def _buckets_for(service, method):
+    buckets = [governor(service)]
+    if method is not None:
+        buckets.append(_buckets.get(f'{service}:{method}'))
+    return [bucket for bucket in buckets if bucket is not None]
+
+
+def reserve(service, method=None, tokens=1):
+    """
+    Toma tokens del bucket del servicio (y del método, si tiene uno propio)
+    sin dormir; devuelve cuánto esperar antes de llamar (para código async)
+    """
+    return max((bucket.reserve(tokens) for bucket in _buckets_for(service, method)), default=0.0)
+
+
+def acquire(service, method=None, tokens=1):
+    """Como reserve pero bloquea el tiempo necesario; devuelve los segundos esperados"""
+    wait = reserve(service, method, tokens)
+    if wait > 0:
+        time.sleep(wait)
+        WAIT.observe(wait, service=service)
+    return wait
+
+
+async def acquire_async(service, method=None, tokens=1):
+    """acquire para corrutinas: espera sin bloquear el event loop"""
+    wait = reserve(service, method, tokens)
+    if wait > 0:
+        await asyncio.sleep(wait)
+        WAIT.observe(wait, service=service)
+    return wait
+
+
+def throttled(service, method=None, retry_after=None):
+    """Registra un 429: pausa el bucket del servicio y el del método"""
+    for bucket in _buckets_for(service, method):
+        bucket.pause(retry_after or RATE_LIMIT_429_PAUSE)
+
+
+def retry_after(headers):
+    """Segundos del header Retry-After, o None si no viene o no es un número"""
+    try:
+        seconds = float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+    return seconds if seconds >= 0 else None
+
+
+def after_response(service, method, response):
+    """
+    Mira la respuesta de una llamada: si es un 429 pausa los buckets por su
+    Retry-After y devuelve los segundos a esperar antes de reintentar; si
+    no, None
+    """
+    if response.status_code != 429:
+        return None
+    seconds = retry_after(response.headers) or RATE_LIMIT_429_PAUSE
+    throttled(service, method, seconds)
+    return seconds
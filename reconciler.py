@@ -0,0 +1,242 @@
+"""
+Reconciliación periódica entre task_mapping y el estado de las tareas en Asana.
+
+El webhook de Asana avisa cuando se completa una tarea, pero si una entrega
+se pierde el ✅ no llega nunca, y si una tarea se borra en Asana su entrada
+queda en el mapeo para siempre. Cada ASANA_RECONCILE_INTERVAL segundos el
+Reconciler recorre los proyectos que aparecen en el mapeo y le pide a
+/events solo lo que cambió desde la pasada anterior (un sync token por
+proyecto, guardado en ASANA_SYNC_TOKENS_FILE, por defecto en STATE_DIR para
+que sobreviva a cada instancia nueva). De las tareas mapeadas que
+aparecen en esos eventos se consulta el estado (opt_fields=completed) y se
+aplica solo la diferencia:
+- completada en Asana y sin completed_at en el mapeo -> on_task_completed
+- borrada en Asana (404) -> on_task_deleted
+
+La primera vez, o si el token venció (Asana los guarda unas 24 h), el
+proyecto se resincroniza listando sus tareas de a 100 con
+opt_fields=completed. En la primera (sin token previo) las completadas se
+marcan en silencio (on_task_marked_completed): el mapeo viejo no tiene
+completed_at en ninguna tarea, y avisar llenaría de ✅ mensajes de meses
+atrás. Con un token vencido sí se avisa: son completadas de las últimas
+horas cuyo webhook se perdió. Lo mismo si en una pasada cambiaron más de
+ASANA_RECONCILE_LIST_THRESHOLD tareas mapeadas del proyecto, porque
+listarlo sale más barato que pedirlas de a una.
+
+Una sola pasada, sin levantar el servicio:
+    python reconciler.py --once
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import Counter, defaultdict
+
+import metrics
+from persistence import atomic_write_json, state_path
+
+# Segundos entre pasadas; 0 desactiva la reconciliación en background
+RECONCILE_INTERVAL = float(os.getenv('ASANA_RECONCILE_INTERVAL', '600'))
+# En disco local cada arranque en frío relista todos los proyectos
+SYNC_TOKENS_FILE = os.getenv('ASANA_SYNC_TOKENS_FILE') or state_path('asana_sync_tokens.json')
+# Con más tareas cambiadas que esto en un proyecto se lista el proyecto entero
+LIST_THRESHOLD = int(os.getenv('ASANA_RECONCILE_LIST_THRESHOLD', '50'))
+
+RECONCILED = metrics.counter('asana_reconciled_tasks_total', 'Task state differences applied by the Asana reconciler')
+
+
+class SyncTokenStore:
+    """Diccionario project_id -> sync token de /events, persistido en un archivo JSON"""
+
+    def __init__(self, path=SYNC_TOKENS_FILE):
+        self._path = path
+        self._lock = threading.Lock()
+        self._tokens = {}
+        try:
+            with open(path, 'r') as f:
+                self._tokens = json.load(f)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            logging.error(f"❌ {path} contains invalid JSON, resyncing every project")
+
+    def get(self, project_id):
+        return self._tokens.get(project_id)
+
+    def update(self, tokens, keep):
+        """Guarda los tokens nuevos y descarta los de proyectos que no están en `keep`"""
+        with self._lock:
+            self._tokens.update(tokens)
+            self._tokens = {k: v for k, v in self._tokens.items() if k in keep}
+            atomic_write_json(self._path, self._tokens, indent=2)
+
+
+class Reconciler:
+    """Thread que aplica al mapeo y a Slack los cambios de Asana que no llegaron por webhook"""
+
+    def __init__(self, tasks, on_task_completed, on_task_deleted, interval=RECONCILE_INTERVAL, tokens=None,
+                 on_task_marked_completed=None):
+        # `tasks` devuelve los datos de las tareas mapeadas (valores de task_mapping)
+        self._tasks = tasks
+        self._on_task_completed = on_task_completed
+        self._on_task_deleted = on_task_deleted
+        # on_task_marked_completed(task_gid): completada sin avisar en Slack
+        self._on_task_marked_completed = on_task_marked_completed
+        self._interval = interval
+        self._tokens = tokens if tokens is not None else SyncTokenStore()
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Arranca el thread de background (no hace nada con intervalo 0)"""
+        if self._interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='asana-reconciler')
+                self._thread.daemon = True
+                self._thread.start()
+                logging.info("🔁 Asana reconciler running every %ss", self._interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # La primera pasada es inmediata: recupera lo que pasó con el servicio caído
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("❌ Error reconciliando tareas con Asana")
+            self._stop.wait(self._interval)
+
+    @metrics.timed('asana_reconcile')
+    def run_once(self):
+        """Una pasada por todos los proyectos del mapeo; devuelve contadores"""
+        with self._run_lock:
+            by_project = defaultdict(dict)
+            for task_info in self._tasks():
+                if task_info.get('project_id') and task_info.get('asana_gid'):
+                    by_project[task_info['project_id']][task_info['asana_gid']] = task_info
+
+            stats = Counter()
+            tokens = {}
+            for project_id, tasks in by_project.items():
+                try:
+                    tokens[project_id] = self._reconcile_project(project_id, tasks, stats)
+                except Exception as e:
+                    stats['errors'] += 1
+                    logging.error("❌ Error reconciliando el proyecto %s: %s", project_id, e)
+            stats['projects'] = len(by_project)
+            self._tokens.update({k: v for k, v in tokens.items() if v}, keep=by_project)
+
+            logging.info("🔁 Asana reconcile: %s projects, %s checked, %s completed (%s silently), %s deleted, %s errors",
+                         stats['projects'], stats['checked'], stats['completed'], stats['marked_completed'],
+                         stats['deleted'], stats['errors'])
+            return stats
+
+    def _reconcile_project(self, project_id, tasks, stats):
+        """Aplica los cambios del proyecto; devuelve el sync token para la próxima pasada"""
+        from asana_client import get_project_events
+
+        token = self._tokens.get(project_id)
+        changed = set()
+        full_sync = first_sync = token is None
+        while not full_sync:
+            events, token, has_more = get_project_events(project_id, token)
+            if events is None:
+                logging.warning("⚠️ Sync token for project %s expired, resyncing", project_id)
+                full_sync = True
+                break
+            for event in events:
+                resource = event.get('resource') or {}
+                if resource.get('resource_type') == 'task' and resource.get('gid') in tasks:
+                    changed.add(resource['gid'])
+            if not has_more:
+                break
+
+        if full_sync:
+            if token is None:
+                # Primero el token, así lo que cambie mientras se lista entra en la próxima pasada
+                _, token, _ = get_project_events(project_id)
+            stats['full_syncs'] += 1
+            states = self._list_states(project_id, tasks)
+        elif len(changed) > LIST_THRESHOLD:
+            states = self._list_states(project_id, changed)
+        else:
+            states = self._fetch_states(changed)
+
+        stats['checked'] += len(states)
+        self._apply(tasks, states, stats, notify=not first_sync)
+        return token
+
+    def _fetch_states(self, task_gids):
+        from asana_client import get_task_completion
+        return {task_gid: get_task_completion(task_gid) for task_gid in task_gids}
+
+    def _list_states(self, project_id, task_gids):
+        """Estado de `task_gids` listando el proyecto; las que no aparecen se consultan una por una"""
+        from asana_client import get_project_tasks
+        listed = {task['gid']: task for task in get_project_tasks(project_id)}
+        missing = [task_gid for task_gid in task_gids if task_gid not in listed]
+        # Una tarea que no está en el listado pudo moverse de proyecto o borrarse
+        states = self._fetch_states(missing)
+        states.update((task_gid, listed[task_gid]) for task_gid in task_gids if task_gid in listed)
+        return states
+
+    def _apply(self, tasks, states, stats, notify=True):
+        for task_gid, remote in states.items():
+            task_info = tasks[task_gid]
+            if remote is None:
+                logging.info("🗑️ Task %s no longer exists in Asana, removing it from the mapping", task_gid)
+                self._on_task_deleted(task_gid)
+                result = 'deleted'
+            elif remote.get('completed') and not task_info.get('completed_at'):
+                if notify or self._on_task_marked_completed is None:
+                    logging.info("✓ Task %s was completed in Asana without a webhook delivery", task_gid)
+                    self._on_task_completed(task_gid, {})
+                    result = 'completed'
+                else:
+                    self._on_task_marked_completed(task_gid)
+                    result = 'marked_completed'
+            else:
+                continue
+            stats[result] += 1
+            RECONCILED.inc(result=result)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reconciliar task_mapping con el estado de las tareas en Asana")
+    parser.add_argument('--once', action='store_true', help="hacer una sola pasada y salir")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    import main
+    main.init()
+    if args.once:
+        stats = main.state.reconciler.run_once()
+        print(json.dumps(dict(stats), indent=2))
+        return 1 if stats['errors'] else 0
+    if RECONCILE_INTERVAL <= 0:
+        print("ASANA_RECONCILE_INTERVAL es 0: usar --once o fijar un intervalo", file=sys.stderr)
+        return 2
+    reconciler = main.state.reconciler
+    reconciler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        reconciler.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -3,42 +3,101 @@
 Script para configurar webhooks de Asana para los proyectos mapeados.
 Esto permite que cuando se complete una tarea en Asana, se agregue 
 una reacción ✅ en el mensaje de Slack que la generó.
+
+Sin argumentos muestra un menú interactivo. Con flags corre sin
+intervención, por ejemplo:
+
+    python setup_asana_webhooks.py --sync --prune --workers 16
+    python setup_asana_webhooks.py --sync --dry-run
+    python setup_asana_webhooks.py --recreate     # nuevo handshake para todos
+
+Requiere ASANA_WEBHOOK_HANDSHAKE_TOKEN, el mismo que tiene el servidor: cada
+URL de destino lleva un token firmado que solo sirve para el handshake de esa
+creación (ver webhook_secrets.py).
 """
 
 import os
+import sys
 import json
+import argparse
 import requests
+from urllib.parse import urlencode, urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from webhook_secrets import handshake_token  # noqa: E402
+
 ASANA_PAT = os.getenv('ASANA_PERSONAL_ACCESS_TOKEN')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'https://tu-dominio.com/asana/webhook')
 
-def list_existing_webhooks():
-    """Lista todos los webhooks existentes"""
-    headers = {
-        'Authorization': f'Bearer {ASANA_PAT}'
-    }
+def webhook_target(project_id):
+    """
+    URL de destino de un webhook que se crea ahora; `resource` identifica el
+    secreto a usar y `token` habilita el handshake de esta creación
+    """
+    params = {'resource': project_id, 'token': handshake_token(project_id)}
+    return f"{WEBHOOK_URL}?{urlencode(params)}"
+
+def target_resource(target):
+    """`resource` de la URL de destino de un webhook nuestro (sin mirar el token, que vence)"""
+    return dict(parse_qsl(urlsplit(target).query)).get('resource')
+
+def get_workspace_gid():
+    """Workspace de los webhooks: ASANA_WORKSPACE_GID o el primero del usuario"""
+    workspace_gid = os.getenv('ASANA_WORKSPACE_GID')
+    if workspace_gid:
+        return workspace_gid
     
     response = requests.get(
-        'https://app.asana.com/api/1.0/webhooks',
-        headers=headers
+        'https://app.asana.com/api/1.0/workspaces',
+        headers={'Authorization': f'Bearer {ASANA_PAT}'}
     )
+    if response.status_code == 200 and response.json()['data']:
+        return response.json()['data'][0]['gid']
+    raise Exception(f"No workspace found: {response.status_code}")
+
+def fetch_all_webhooks(workspace_gid):
+    """Devuelve todos los webhooks del workspace recorriendo todas las páginas"""
+    headers = {
+        'Authorization': f'Bearer {ASANA_PAT}'
+    }
+    params = {'workspace': workspace_gid, 'limit': 100}
+    webhooks = []
     
-    if response.status_code == 200:
-        webhooks = response.json()['data']
-        print(f"\n📋 Webhooks existentes: {len(webhooks)}")
-        for webhook in webhooks:
-            print(f"  - ID: {webhook['gid']}")
-            print(f"    Recurso: {webhook.get('resource', {}).get('gid', 'N/A')}")
-            print(f"    Target: {webhook.get('target', 'N/A')}")
-            print(f"    Activo: {webhook.get('active', False)}")
-            print("")
-        return webhooks
-    else:
-        print(f"❌ Error listando webhooks: {response.status_code}")
+    while True:
+        response = requests.get(
+            'https://app.asana.com/api/1.0/webhooks',
+            headers=headers,
+            params=params
+        )
+        if response.status_code != 200:
+            raise Exception(f"Error listando webhooks: {response.status_code} - {response.text}")
+        
+        body = response.json()
+        webhooks.extend(body['data'])
+        next_page = body.get('next_page')
+        if not next_page:
+            return webhooks
+        params['offset'] = next_page['offset']
+
+def list_existing_webhooks(workspace_gid):
+    """Lista todos los webhooks existentes"""
+    try:
+        webhooks = fetch_all_webhooks(workspace_gid)
+    except Exception as e:
+        print(f"❌ {e}")
         return []
+    
+    print(f"\n📋 Webhooks existentes: {len(webhooks)}")
+    for webhook in webhooks:
+        print(f"  - ID: {webhook['gid']}")
+        print(f"    Recurso: {webhook.get('resource', {}).get('gid', 'N/A')}")
+        print(f"    Target: {webhook.get('target', 'N/A')}")
+        print(f"    Activo: {webhook.get('active', False)}")
+        print("")
+    return webhooks
 
 def create_webhook(project_id, project_name):
     """Crea un webhook para un proyecto específico"""
@@ -50,7 +109,7 @@ def create_webhook(project_id, project_name):
     data = {
         'data': {
             'resource': project_id,
-            'target': WEBHOOK_URL,
+            'target': webhook_target(project_id),
             'filters': [
                 {
                     'resource_type': 'task',
@@ -98,7 +157,128 @@ def delete_webhook(webhook_id):
         print(f"❌ Error eliminando webhook: {response.status_code}")
         return False
 
-def main():
+def load_projects():
+    """Devuelve (proyectos únicos de channel_map.json, nombres por ID)"""
+    with open('channel_map.json', 'r') as f:
+        channel_map = json.load(f)
+    
+    # Cargar nombres de proyectos desde asana_pj.json
+    project_names = {}
+    try:
+        with open('asana_pj.json', 'r', encoding='utf-8') as f:
+            asana_projects = json.load(f)
+            # Invertir el mapeo para tener ID -> Nombre
+            project_names = {v: k for k, v in asana_projects.items()}
+    except:
+        print("⚠️  No se pudo cargar asana_pj.json, se usarán IDs en lugar de nombres")
+    
+    return sorted(set(channel_map.values())), project_names
+
+def plan_sync(desired_projects, existing_webhooks, prune=False, recreate=False):
+    """
+    Compara los webhooks deseados con los existentes.
+    Devuelve (proyectos a crear, webhooks a eliminar). Solo se consideran
+    los webhooks que apuntan a WEBHOOK_URL; los de otras integraciones no se tocan.
+    Con `recreate` todos los propios se eliminan y se vuelven a crear, para
+    que el servidor reciba un handshake (y un secreto) nuevo de cada uno.
+    """
+    desired = set(desired_projects)
+    ours = [w for w in existing_webhooks if w.get('target', '').split('?')[0] == WEBHOOK_URL]
+    
+    covered = set()
+    to_delete = []
+    for webhook in ours:
+        resource = webhook.get('resource', {}).get('gid')
+        up_to_date = (
+            resource in desired
+            and resource not in covered
+            and target_resource(webhook.get('target', '')) == resource
+            and webhook.get('active', True)
+            and not recreate
+        )
+        if up_to_date:
+            covered.add(resource)
+        elif prune or recreate:
+            # Proyecto ya no mapeado, duplicado, inactivo o con URL vieja (sin secreto)
+            to_delete.append(webhook)
+    
+    to_create = [p for p in desired_projects if p not in covered]
+    return to_create, to_delete
+
+def run_parallel(func, items, workers):
+    """Aplica func a cada item con paralelismo acotado; devuelve cuántos tuvieron éxito"""
+    if not items:
+        return 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(1 for ok in executor.map(func, items) if ok)
+
+def sync_webhooks(args):
+    """Modo no interactivo: reconcilia los webhooks con channel_map.json"""
+    workspace_gid = args.workspace or get_workspace_gid()
+    desired_projects, project_names = load_projects()
+    existing_webhooks = fetch_all_webhooks(workspace_gid)
+    
+    if args.list:
+        for webhook in existing_webhooks:
+            print(f"{webhook['gid']}\t{webhook.get('resource', {}).get('gid', 'N/A')}\t{webhook.get('active', False)}\t{webhook.get('target', 'N/A')}")
+        if not args.sync:
+            return 0
+    
+    to_create, to_delete = plan_sync(desired_projects, existing_webhooks, prune=args.prune, recreate=args.recreate)
+    print(f"📊 Proyectos: {len(desired_projects)}, webhooks existentes: {len(existing_webhooks)}")
+    print(f"📊 Plan: {len(to_create)} a crear, {len(to_delete)} a eliminar")
+    
+    if args.dry_run:
+        for project_id in to_create:
+            print(f"  + {project_names.get(project_id, project_id)} ({project_id})")
+        for webhook in to_delete:
+            print(f"  - {webhook['gid']} ({webhook.get('resource', {}).get('gid', 'N/A')})")
+        return 0
+    
+    # Eliminar primero para liberar cupo (máx. 100 webhooks por app)
+    deleted = run_parallel(lambda w: delete_webhook(w['gid']), to_delete, args.workers)
+    created = run_parallel(
+        lambda p: create_webhook(p, project_names.get(p, f"Proyecto {p}")) is not None,
+        to_create,
+        args.workers
+    )
+    
+    print(f"\n📊 Resumen: {created}/{len(to_create)} creados, {deleted}/{len(to_delete)} eliminados")
+    return 0 if created == len(to_create) and deleted == len(to_delete) else 1
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Configura los webhooks de Asana de los proyectos mapeados")
+    parser.add_argument('--sync', action='store_true', help="crear los webhooks faltantes para channel_map.json")
+    parser.add_argument('--prune', action='store_true', help="eliminar webhooks propios que sobran, duplicados o desactualizados")
+    parser.add_argument('--recreate', action='store_true', help="eliminar y volver a crear los webhooks propios (nuevo handshake)")
+    parser.add_argument('--list', action='store_true', help="listar los webhooks existentes")
+    parser.add_argument('--dry-run', action='store_true', help="mostrar el plan sin aplicar cambios")
+    parser.add_argument('--workers', type=int, default=8, help="requests concurrentes a Asana (default: 8)")
+    parser.add_argument('--workspace', help="GID del workspace (default: ASANA_WORKSPACE_GID o el primero)")
+    return parser.parse_args(argv)
+
+def has_handshake_token():
+    """Crear un webhook necesita el token de handshake; --list y --dry-run no"""
+    if os.getenv('ASANA_WEBHOOK_HANDSHAKE_TOKEN'):
+        return True
+    print("❌ ERROR: Falta ASANA_WEBHOOK_HANDSHAKE_TOKEN (el mismo que usa el servidor para aceptar handshakes)")
+    return False
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        args = parse_args(argv)
+        if not ASANA_PAT:
+            print("❌ ERROR: No se encontró ASANA_PERSONAL_ACCESS_TOKEN en las variables de entorno")
+            return 1
+        if args.prune or args.recreate:
+            args.sync = True
+        if args.sync and not args.dry_run and not has_handshake_token():
+            return 1
+        return sync_webhooks(args)
+    return interactive_menu()
+
+def interactive_menu():
     print("=== CONFIGURACIÓN DE WEBHOOKS DE ASANA ===")
     print(f"URL del webhook: {WEBHOOK_URL}")
     
@@ -117,28 +297,16 @@ def main():
     
     # Cargar proyectos desde channel_map.json
     try:
-        with open('channel_map.json', 'r') as f:
-            channel_map = json.load(f)
+        unique_projects, project_names = load_projects()
     except FileNotFoundError:
         print("❌ ERROR: No se encontró channel_map.json")
         return
     
-    # Cargar nombres de proyectos desde asana_pj.json
-    project_names = {}
-    try:
-        with open('asana_pj.json', 'r', encoding='utf-8') as f:
-            asana_projects = json.load(f)
-            # Invertir el mapeo para tener ID -> Nombre
-            project_names = {v: k for k, v in asana_projects.items()}
-    except:
-        print("⚠️  No se pudo cargar asana_pj.json, se usarán IDs en lugar de nombres")
-    
-    # Obtener lista única de proyectos
-    unique_projects = list(set(channel_map.values()))
     print(f"\n📊 Proyectos encontrados en channel_map.json: {len(unique_projects)}")
     
     # Listar webhooks existentes
-    existing_webhooks = list_existing_webhooks()
+    workspace_gid = get_workspace_gid()
+    existing_webhooks = list_existing_webhooks(workspace_gid)
     existing_resources = [w.get('resource', {}).get('gid') for w in existing_webhooks]
     
     # Menú de opciones
@@ -152,6 +320,9 @@ def main():
         
         opcion = input("\nSelecciona una opción (1-5): ")
         
+        if opcion in ('1', '2') and not has_handshake_token():
+            continue
+        
         if opcion == '1':
             # Crear webhooks para todos los proyectos
             created = 0
@@ -196,7 +367,7 @@ def main():
                 print("❌ Por favor ingresa un número válido")
             
         elif opcion == '3':
-            list_existing_webhooks()
+            list_existing_webhooks(workspace_gid)
             
         elif opcion == '4':
             confirmar = input("\n⚠️  ¿Estás seguro de que deseas eliminar TODOS los webhooks? (s/n): ")
@@ -217,4 +388,4 @@ def main():
             print("❌ Opción inválida")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -2,12 +2,44 @@ import os
 import json
 import requests
 import logging
+import threading
+import metrics
+import rate_limit
 from utils import send_slack
+from metrics import track_upstream
+from state_store import interaction_state
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SLACK_BOT_TOKEN = os.getenv('SLACK_BOT_TOKEN')
+SLACK_API_URL = os.getenv('SLACK_API_URL', 'https://slack.com/api')
+
+class SlackRateLimited(Exception):
+    """Slack respondió 429; `retry_after` son los segundos a esperar antes de reintentar"""
+
+    def __init__(self, method, retry_after):
+        super().__init__(f"Slack {method} rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+def _slack_request(method, http_method='POST', **kwargs):
+    """
+    Llamada a la API de Slack: espera el límite de tasa del método, la mide
+    con el status HTTP y el ok/error del body (Slack devuelve sus errores con
+    200) y si es un 429 pausa el límite por el Retry-After
+    """
+    rate_limit.acquire('slack', method)
+    with track_upstream('slack', method) as call:
+        response = requests.request(http_method, f'{SLACK_API_URL}/{method}', **kwargs)
+        call.status = response.status_code
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        call.ok = body.get('ok')
+        call.error = body.get('error')
+    rate_limit.after_response('slack', method, response)
+    return response
 
 def add_reaction(channel, timestamp, reaction):
     """Agrega una reacción a un mensaje"""
@@ -22,11 +54,7 @@ def add_reaction(channel, timestamp, reaction):
         'name': reaction
     }
     
-    response = requests.post(
-        'https://slack.com/api/reactions.add',
-        headers=headers,
-        json=data
-    )
+    response = _slack_request('reactions.add', headers=headers, json=data)
     
     if response.status_code != 200 or not response.json().get('ok'):
         logging.error(f"Error adding reaction: {response.json()}")
@@ -46,11 +74,7 @@ def remove_reaction(channel, timestamp, reaction):
         'name': reaction
     }
     
-    response = requests.post(
-        'https://slack.com/api/reactions.remove',
-        headers=headers,
-        json=data
-    )
+    response = _slack_request('reactions.remove', headers=headers, json=data)
     
     if response.status_code != 200 or not response.json().get('ok'):
         logging.error(f"Error removing reaction: {response.json()}")
@@ -79,11 +103,7 @@ def post_ephemeral_message(channel, user, text, thread_ts=None):
     if thread_ts:
         data['thread_ts'] = thread_ts
     
-    response = requests.post(
-        'https://slack.com/api/chat.postEphemeral',
-        headers=headers,
-        json=data
-    )
+    response = _slack_request('chat.postEphemeral', headers=headers, json=data)
     
     result = response.json()
     if response.status_code != 200 or not result.get('ok'):
@@ -114,12 +134,16 @@ def post_message_with_button(channel, thread_ts, original_message, commitment_da
                     "name": "create_asana_task",
                     "text": "✅ Crear tarea en Asana",
                     "type": "button",
+                    # El compromiso y el mensaje quedan en interaction_state:
+                    # el valor tiene tamaño fijo aunque el mensaje sea largo
                     "value": json.dumps({
-                        "commitment_data": commitment_data,
-                        "original_message": original_message,
-                        "thread_ts": thread_ts,
-                        "message_ts": message_ts
-                    })
+                        "s": interaction_state.put({
+                            "commitment_data": commitment_data,
+                            "original_message": original_message
+                        }),
+                        "t": thread_ts,
+                        "m": message_ts
+                    }, separators=(',', ':'))
                 }
             ]
         }
@@ -131,11 +155,7 @@ def post_message_with_button(channel, thread_ts, original_message, commitment_da
         'attachments': attachments
     }
     
-    response = requests.post(
-        'https://slack.com/api/chat.postMessage',
-        headers=headers,
-        json=data
-    )
+    response = _slack_request('chat.postMessage', headers=headers, json=data)
     
     if response.status_code != 200 or not response.json().get('ok'):
         logging.error(f"Error posting message with button: {response.json()}")
@@ -155,11 +175,7 @@ def post_thread_message(channel, thread_ts, text):
         'text': text
     }
     
-    response = requests.post(
-        'https://slack.com/api/chat.postMessage',
-        headers=headers,
-        json=data
-    )
+    response = _slack_request('chat.postMessage', headers=headers, json=data)
     
     if response.status_code != 200 or not response.json().get('ok'):
         logging.error(f"Error posting thread message: {response.json()}")
@@ -177,11 +193,7 @@ def get_user_info(user_id):
         'user': user_id
     }
     
-    response = requests.get(
-        'https://slack.com/api/users.info',
-        headers=headers,
-        params=params
-    )
+    response = _slack_request('users.info', 'GET', headers=headers, params=params)
     
     if response.status_code == 200 and response.json().get('ok'):
         return response.json().get('user', {})
@@ -190,6 +202,35 @@ def get_user_info(user_id):
         send_slack(f"Error getting user info: {response.json()}")
         return {}
 
+def get_channel_history(channel_id, latest=None, oldest=None, cursor=None, limit=200):
+    """
+    Una página de conversations.history (del mensaje más nuevo al más viejo).
+    Devuelve (mensajes, next_cursor); next_cursor es None en la última página.
+    Un 429 levanta SlackRateLimited para que quien pagina reintente la página.
+    """
+    headers = {
+        'Authorization': f'Bearer {SLACK_BOT_TOKEN}',
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+    
+    params = {'channel': channel_id, 'limit': limit}
+    if latest:
+        params['latest'] = latest
+    if oldest:
+        params['oldest'] = oldest
+    if cursor:
+        params['cursor'] = cursor
+    
+    response = _slack_request('conversations.history', 'GET', headers=headers, params=params)
+    if response.status_code == 429:
+        raise SlackRateLimited('conversations.history', rate_limit.retry_after(response.headers) or rate_limit.RATE_LIMIT_429_PAUSE)
+    
+    data = response.json() if response.status_code == 200 else {'ok': False, 'error': response.status_code}
+    if not data.get('ok'):
+        raise Exception(f"Error getting channel history for {channel_id}: {data.get('error')}")
+    next_cursor = (data.get('response_metadata') or {}).get('next_cursor') or None
+    return data.get('messages', []), next_cursor if data.get('has_more') else None
+
 def get_channel_info(channel_id):
     headers = {
         'Authorization': f'Bearer {SLACK_BOT_TOKEN}',
@@ -200,11 +241,7 @@ def get_channel_info(channel_id):
         'channel': channel_id
     }
     
-    response = requests.get(
-        'https://slack.com/api/conversations.info',
-        headers=headers,
-        params=params
-    )
+    response = _slack_request('conversations.info', 'GET', headers=headers, params=params)
     
     if response.status_code == 200 and response.json().get('ok'):
         return response.json().get('channel', {})
@@ -212,177 +249,207 @@ def get_channel_info(channel_id):
         logging.error(f"Error getting channel info: {response.json()}")
         return {}
 
-def open_task_dialog(trigger_id, commitment_data, original_message, channel, thread_ts):
+# Plantilla del modal de creación de tareas. Los bloques y las opciones de
+# proyecto se arman una sola vez por versión de asana_pj.json (se reconstruye
+# si cambia su mtime); en cada click solo se copian y completan los bloques
+# que cambian. El trigger_id vence a los 3 s, así que views.open tiene que
+# salir lo antes posible.
+ASANA_PROJECTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asana_pj.json')
+MAX_PROJECT_OPTIONS = 100  # Slack permite como máximo 100 opciones
+
+_task_view_template = None
+_task_view_lock = threading.Lock()
+
+
+def _load_asana_projects():
+    try:
+        with open(ASANA_PROJECTS_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _projects_version():
+    try:
+        stat = os.stat(ASANA_PROJECTS_PATH)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _plain_text(text):
+    return {"type": "plain_text", "text": text}
+
+
+def _build_task_view_template(asana_projects):
+    """Vista sin los campos de cada pedido + índice project_id -> opción"""
+    project_options = [
+        {"text": _plain_text(project_name[:75]), "value": project_id}
+        for project_name, project_id in sorted(asana_projects.items())
+    ][:MAX_PROJECT_OPTIONS]
+
+    blocks = [
+        {
+            "type": "input",
+            "block_id": "project_block",
+            "label": _plain_text("Proyecto de Asana"),
+            "element": {
+                "type": "static_select",
+                "action_id": "project_select",
+                "placeholder": _plain_text("Seleccionar proyecto"),
+                "options": project_options
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "title_block",
+            "label": _plain_text("Título de la tarea"),
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "title_input",
+                "placeholder": _plain_text("Ingresa el título")
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "description_block",
+            "label": _plain_text("Descripción"),
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "description_input",
+                "multiline": True,
+                "placeholder": _plain_text("Agrega una descripción detallada")
+            },
+            "optional": True
+        },
+        {
+            "type": "input",
+            "block_id": "assignee_block",
+            "label": _plain_text("Asignar a"),
+            "element": {
+                "type": "users_select",
+                "action_id": "assignee_select",
+                "placeholder": _plain_text("Seleccionar usuario")
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "due_date_block",
+            "label": _plain_text("Fecha límite"),
+            "element": {
+                "type": "datepicker",
+                "action_id": "due_date_picker",
+                "placeholder": _plain_text("Seleccionar fecha")
+            },
+            "optional": True
+        },
+        {
+            "type": "input",
+            "block_id": "subtasks_block",
+            "label": _plain_text("Subtareas"),
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "subtasks_input",
+                "multiline": True,
+                "placeholder": _plain_text("Una subtarea por línea")
+            },
+            "optional": True,
+            "hint": _plain_text("Separa cada subtarea con un salto de línea")
+        }
+    ]
+
+    view = {
+        "type": "modal",
+        "callback_id": "create_asana_task_modal",
+        "title": _plain_text("Crear tarea en Asana"),
+        "submit": _plain_text("Crear tarea"),
+        "close": _plain_text("Cancelar"),
+        "blocks": blocks
+    }
+    return {
+        'view': view,
+        'option_index': {option["value"]: option for option in project_options},
+        'block_index': {block["block_id"]: i for i, block in enumerate(blocks)},
+    }
+
+
+def _get_task_view_template():
+    global _task_view_template
+    version = _projects_version()
+    template = _task_view_template
+    if template is not None and template['version'] == version:
+        metrics.record_cache('task_view_template', hit=True)
+        return template
+    metrics.record_cache('task_view_template', hit=False)
+    with _task_view_lock:
+        if _task_view_template is None or _task_view_template['version'] != version:
+            template = _build_task_view_template(_load_asana_projects())
+            template['version'] = version
+            _task_view_template = template
+            logging.info("🧩 Task modal template built with %d projects", len(template['option_index']))
+        return _task_view_template
+
+
+def _patch_element(blocks, block_index, block_id, **fields):
+    """Reemplaza el bloque por una copia con esos campos en su element (la plantilla no se toca)"""
+    i = block_index[block_id]
+    block = dict(blocks[i])
+    block["element"] = {**block["element"], **fields}
+    blocks[i] = block
+
+
+def build_task_view(commitment_data, original_message, channel, thread_ts, default_project_id=None, message_ts=None,
+                    state_token=None):
+    """
+    Vista del modal de creación de tareas a partir de la plantilla cacheada.
+    `state_token` reutiliza el estado guardado por el botón, si sigue vigente.
+    """
+    template = _get_task_view_template()
+    msg_url = f"https://nomadicseo.slack.com/archives/{channel}/p{thread_ts.replace('.','')}"
+
+    view = dict(template['view'])
+    blocks = view["blocks"] = list(view["blocks"])
+    block_index = template['block_index']
+
+    initial_option = template['option_index'].get(default_project_id) if default_project_id else None
+    if initial_option is not None:
+        _patch_element(blocks, block_index, "project_block", initial_option=initial_option)
+    if commitment_data.get('descripcion'):
+        _patch_element(blocks, block_index, "title_block", initial_value=commitment_data['descripcion'])
+    _patch_element(blocks, block_index, "description_block",
+                   initial_value=f"Mensaje original: {original_message} en {msg_url}")
+
+    # Solo un token y los ts: el mensaje original puede no entrar en 3000 caracteres
+    if state_token is None:
+        state_token = interaction_state.put({
+            "commitment_data": commitment_data,
+            "original_message": original_message
+        })
+    view["private_metadata"] = json.dumps({
+        "s": state_token,
+        "c": channel,
+        "t": thread_ts,
+        "m": message_ts
+    }, separators=(',', ':'))
+    return view
+
+
+def open_task_dialog(trigger_id, commitment_data, original_message, channel, thread_ts, message_ts=None, state_token=None):
     headers = {
         'Authorization': f'Bearer {SLACK_BOT_TOKEN}',
         'Content-Type': 'application/json'
     }
-    msg_url = f"https://nomadicseo.slack.com/archives/{channel}/p{thread_ts.replace('.','')}"
-    # Cargar proyectos de Asana
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    asana_projects_path = os.path.join(current_dir, 'asana_pj.json')
-    
-    try:
-        with open(asana_projects_path, 'r', encoding='utf-8') as f:
-            asana_projects = json.load(f)
-    except:
-        asana_projects = {}
-    
-    # Crear opciones para el selector de proyectos
-    full_project_options = [
-    {
-        "text": {
-            "type": "plain_text",
-            "text": project_name[:75]
-        },
-        "value": project_id
-    }
-    for project_name, project_id in sorted(asana_projects.items())
-]
 
-    project_options = full_project_options[:100]  # Slack permite como máximo 100 opciones
-    
     # Obtener el proyecto por defecto basado en el canal
     from channel_map import get_asana_project_id
     try:
         default_project_id = get_asana_project_id(channel)
     except:
         default_project_id = None
-    
-    view = {
-        "type": "modal",
-        "callback_id": "create_asana_task_modal",
-        "title": {
-            "type": "plain_text",
-            "text": "Crear tarea en Asana"
-        },
-        "submit": {
-            "type": "plain_text",
-            "text": "Crear tarea"
-        },
-        "close": {
-            "type": "plain_text",
-            "text": "Cancelar"
-        },
-        "private_metadata": json.dumps({
-            "commitment_data": commitment_data,
-            "original_message": original_message,
-            "channel": channel,
-            "thread_ts": thread_ts
-        }),
-        "blocks": [
-            {
-                "type": "input",
-                "block_id": "project_block",
-                "label": {
-                    "type": "plain_text",
-                    "text": "Proyecto de Asana"
-                },
-                "element": {
-                    "type": "static_select",
-                    "action_id": "project_select",
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Seleccionar proyecto"
-                    },
-                    "options": project_options,
-                    **({"initial_option": next((opt for opt in project_options if opt["value"] == default_project_id), None)} if default_project_id and any(opt["value"] == default_project_id for opt in project_options) else {})
-                }
-            },
-            {
-                "type": "input",
-                "block_id": "title_block",
-                "label": {
-                    "type": "plain_text",
-                    "text": "Título de la tarea"
-                },
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "title_input",
-                    "initial_value": commitment_data['descripcion'],
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Ingresa el título"
-                    }
-                }
-            },
-            {
-                "type": "input",
-                "block_id": "description_block",
-                "label": {
-                    "type": "plain_text",
-                    "text": "Descripción"
-                },
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "description_input",
-                    "multiline": True,
-                    "initial_value": f"Mensaje original: {original_message} en {msg_url}",
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Agrega una descripción detallada"
-                    }
-                },
-                "optional": True
-            },
-            {
-                "type": "input",
-                "block_id": "assignee_block",
-                "label": {
-                    "type": "plain_text",
-                    "text": "Asignar a"
-                },
-                "element": {
-                    "type": "users_select",
-                    "action_id": "assignee_select",
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Seleccionar usuario"
-                    }
-                }
-            },
-            {
-                "type": "input",
-                "block_id": "due_date_block",
-                "label": {
-                    "type": "plain_text",
-                    "text": "Fecha límite"
-                },
-                "element": {
-                    "type": "datepicker",
-                    "action_id": "due_date_picker",
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Seleccionar fecha"
-                    }
-                },
-                "optional": True
-            },
-            {
-                "type": "input",
-                "block_id": "subtasks_block",
-                "label": {
-                    "type": "plain_text",
-                    "text": "Subtareas"
-                },
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "subtasks_input",
-                    "multiline": True,
-                    "placeholder": {
-                        "type": "plain_text",
-                        "text": "Una subtarea por línea"
-                    }
-                },
-                "optional": True,
-                "hint": {
-                    "type": "plain_text",
-                    "text": "Separa cada subtarea con un salto de línea"
-                }
-            }
-        ]
-    }
-    
+
+    view = build_task_view(commitment_data, original_message, channel, thread_ts, default_project_id, message_ts,
+                           state_token)
+
     data = {
         "trigger_id": trigger_id,
         "view": view
@@ -391,11 +458,7 @@ def open_task_dialog(trigger_id, commitment_data, original_message, channel, thr
     logging.info(f"Opening modal with trigger_id: {trigger_id}")
     #logging.info("Modal data being sent: " + json.dumps(data, separators=(',', ':')))
     
-    response = requests.post(
-        'https://slack.com/api/views.open',
-        headers=headers,
-        json=data
-    )
+    response = _slack_request('views.open', headers=headers, json=data)
     
     logging.info(f"Response status code: {response.status_code}")
     logging.info(f"Response body: {response.json()}")
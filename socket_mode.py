@@ -0,0 +1,207 @@
+"""
+Ingesta de eventos de Slack por Socket Mode, alternativa a /slack/events.
+
+    SLACK_APP_TOKEN=xapp-... python socket_mode.py --workers 8
+
+En lugar de un POST firmado por evento, Slack entrega los eventos por un
+websocket persistente que abre el propio servicio (sirve detrás de NAT, sin
+endpoint público):
+- apps.connections.open, con el app-level token, devuelve la URL wss
+- cada envelope se confirma (ack) apenas llega, antes de procesarlo, así el
+  límite de 3 s de Slack no depende del LLM ni de Asana
+- SOCKET_MODE_WORKERS threads procesan los payloads con
+  main.dispatch_slack_event, la misma lógica que /slack/events; lo que
+  ningún handler atiende se confirma y descarta sin parsear (main.router)
+- ante un `disconnect` de Slack o un error del socket se reconecta con
+  backoff
+
+No hay HMAC ni chequeo de timestamp por evento: Slack autentica la conexión
+con el app token. Requiere `websocket-client` (requirements-socket-mode.txt).
+"""
+
+import os
+import re
+import sys
+import json
+import queue
+import signal
+import logging
+import argparse
+import threading
+
+import requests
+import websocket
+from dotenv import load_dotenv
+
+import main
+import metrics
+import rate_limit
+
+load_dotenv()
+
+SLACK_APP_TOKEN = os.getenv('SLACK_APP_TOKEN')
+SLACK_API_URL = os.getenv('SLACK_API_URL', 'https://slack.com/api')
+SOCKET_MODE_WORKERS = int(os.getenv('SOCKET_MODE_WORKERS', '8'))
+# Backoff de reconexión: arranca en RECONNECT_DELAY y se duplica hasta el máximo
+RECONNECT_DELAY = float(os.getenv('SOCKET_MODE_RECONNECT_DELAY', '1'))
+RECONNECT_MAX_DELAY = 30.0
+
+_ENVELOPE_ID_RE = re.compile(r'"envelope_id":\s*"([^"]+)"')
+
+ENVELOPES = metrics.counter('socket_mode_envelopes_total', 'Socket Mode envelopes received by type')
+
+
+class SocketModeRunner:
+    """Conexión de Socket Mode + pool de workers que despachan los eventos"""
+
+    def __init__(self, app_token=SLACK_APP_TOKEN, workers=SOCKET_MODE_WORKERS, dispatch=None, router=None):
+        if not app_token:
+            raise ValueError("SLACK_APP_TOKEN no configurado")
+        self._app_token = app_token
+        self._workers = workers
+        self._dispatch = dispatch or main.dispatch_slack_event
+        self._router = router if router is not None else (main.router if dispatch is None else None)
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._ws = None
+        self._send_lock = threading.Lock()
+        self._threads = []
+
+    def open_connection_url(self):
+        """Pide a Slack una URL de websocket nueva (válida por un solo uso)"""
+        rate_limit.acquire('slack', 'apps.connections.open')
+        with metrics.track_upstream('slack', 'apps.connections.open') as call:
+            response = requests.post(
+                f"{SLACK_API_URL}/apps.connections.open",
+                headers={'Authorization': f'Bearer {self._app_token}'},
+                timeout=10,
+            )
+            call.status = response.status_code
+            data = response.json()
+            call.ok, call.error = data.get('ok'), data.get('error')
+        rate_limit.after_response('slack', 'apps.connections.open', response)
+        if not data.get('ok'):
+            raise RuntimeError(f"apps.connections.open falló: {data.get('error')}")
+        return data['url']
+
+    def start(self):
+        """Arranca los workers; la conexión corre en run_forever()"""
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._worker, name=f'socket-mode-worker-{i}')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        metrics.register_gauge(self._queue.qsize, queue='socket_mode')
+
+    def run_forever(self):
+        delay = RECONNECT_DELAY
+        while not self._stop.is_set():
+            try:
+                self._ws = websocket.create_connection(self.open_connection_url())
+                logging.info("🔌 Socket Mode connected")
+                delay = RECONNECT_DELAY
+                self._receive_loop()
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logging.error("❌ Socket Mode connection error: %s", e)
+                self._stop.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            finally:
+                self._close()
+
+    def stop(self):
+        """Corta la conexión y deja que los workers terminen lo encolado"""
+        self._stop.set()
+        self._close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _close(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _receive_loop(self):
+        """Lee mensajes hasta que Slack pide reconectar o se cierra el socket"""
+        while not self._stop.is_set():
+            raw = self._ws.recv()
+            if not raw:
+                logging.info("🔌 Socket Mode connection closed")
+                return
+            if self._router is not None and self._router.should_drop(raw):
+                envelope = _ENVELOPE_ID_RE.search(raw)
+                if envelope:
+                    self._send({'envelope_id': envelope.group(1)})
+                ENVELOPES.inc(type='dropped')
+                continue
+            message = json.loads(raw)
+            message_type = message.get('type')
+            ENVELOPES.inc(type=message_type)
+
+            if message_type == 'hello':
+                logging.debug("👋 Socket Mode hello")
+                continue
+            if message_type == 'disconnect':
+                logging.info("🔁 Socket Mode disconnect requested: %s", message.get('reason'))
+                return
+
+            envelope_id = message.get('envelope_id')
+            if envelope_id:
+                # Ack inmediato: el procesamiento sigue en los workers
+                self._send({'envelope_id': envelope_id})
+            if message_type == 'events_api':
+                self._queue.put(message.get('payload') or {})
+            else:
+                logging.debug("⏭️ Unhandled Socket Mode envelope: %s", message_type)
+
+    def _send(self, data):
+        with self._send_lock:
+            self._ws.send(json.dumps(data))
+
+    def _worker(self):
+        while True:
+            payload = self._queue.get()
+            if payload is None:
+                return
+            try:
+                self._process(payload)
+            except Exception:
+                logging.exception("❌ Error processing Socket Mode event")
+
+    @metrics.timed('socket_mode_event')
+    def _process(self, payload):
+        self._dispatch(payload)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recibir eventos de Slack por Socket Mode")
+    parser.add_argument('--workers', type=int, default=SOCKET_MODE_WORKERS,
+                        help="threads que procesan eventos (SOCKET_MODE_WORKERS)")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    main.init()
+    main.start_background_jobs()
+    runner = SocketModeRunner(workers=args.workers)
+    runner.start()
+    # SIGTERM (docker stop, Cloud Run) apaga igual que Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        runner.run_forever()
+    except KeyboardInterrupt:
+        logging.info("🛑 Stopping Socket Mode runner")
+        runner.stop()
+        main.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,75 @@
+"""
+Estado de corta vida de las interacciones de Slack, referenciado por token.
+
+El `value` de un botón (2000 caracteres) y el `private_metadata` de un modal
+(3000) viajan ida y vuelta por Slack en cada interacción. En lugar de meter
+ahí el compromiso y el mensaje original (que con mensajes largos no entran),
+se guardan acá y en Slack viaja solo un token corto:
+
+    token = interaction_state.put({'commitment_data': ..., 'original_message': ...})
+    data = interaction_state.get(token)   # None si venció o no existe
+
+Las entradas vencen a los INTERACTION_STATE_TTL segundos y como mucho se
+guardan INTERACTION_STATE_MAX_ENTRIES (se descartan las más viejas). Es
+memoria del proceso: con varios workers de gunicorn un token puede no estar
+en el worker que recibe el click, así que quien lo lee tiene que tolerar un
+None.
+"""
+
+import os
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+import metrics
+
+INTERACTION_STATE_TTL = float(os.getenv('INTERACTION_STATE_TTL', str(24 * 60 * 60)))
+INTERACTION_STATE_MAX_ENTRIES = int(os.getenv('INTERACTION_STATE_MAX_ENTRIES', '10000'))
+
+
+class StateStore:
+    """Dict token -> datos con vencimiento; las entradas se ordenan por vencimiento"""
+
+    def __init__(self, ttl=INTERACTION_STATE_TTL, max_entries=INTERACTION_STATE_MAX_ENTRIES, name='interaction_state'):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._name = name
+        # token -> (vence_en, datos); con un TTL fijo el orden de inserción
+        # es también el de vencimiento
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, data):
+        """Guarda `data` y devuelve su token (16 caracteres url-safe)"""
+        token = secrets.token_urlsafe(12)
+        with self._lock:
+            self._evict(time.monotonic())
+            self._entries[token] = (time.monotonic() + self._ttl, data)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token):
+        """Datos del token, o None si no existe o ya venció"""
+        entry = None
+        if token:
+            with self._lock:
+                self._evict(time.monotonic())
+                entry = self._entries.get(token)
+        metrics.record_cache(self._name, hit=entry is not None)
+        return entry[1] if entry is not None else None
+
+    def _evict(self, now):
+        while self._entries:
+            token, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                return
+            del self._entries[token]
+
+
+interaction_state = StateStore()
+metrics.gauge('interaction_state_entries', 'Interaction state entries held in memory').set_function(lambda: len(interaction_state))
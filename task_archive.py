@@ -0,0 +1,221 @@
+"""
+Archivo frío de las tareas que ya salieron del mapeo en memoria.
+
+task_mapping solo guarda las tareas "calientes": las abiertas y las
+completadas hace menos de TASK_RETENTION_DAYS días. RetentionJob corre cada
+TASK_RETENTION_INTERVAL segundos y mueve las vencidas a un JSONL comprimido
+con gzip, un archivo por mes del mensaje de Slack:
+
+    $STATE_DIR/task_archive/archive-2025-03.jsonl.gz
+
+Cada pasada agrega un miembro gzip nuevo al archivo del mes (gzip lee los
+miembros concatenados como un solo stream), así que archivar no reescribe
+nada. Así el mapeo, task_mapping.json y el costo de cada save quedan
+acotados por la retención y no por la historia completa.
+
+Las consultas son a demanda:
+- lookup(task_key): la clave incluye el ts del mensaje, así que se lee un
+  solo archivo; se cachean los últimos ARCHIVE_CACHE_MONTHS meses leídos
+- find_by_gid(asana_gid): recorre los archivos del más nuevo al más viejo
+
+Uso:
+    python task_archive.py lookup C0123456789:1712345678.000100
+    python task_archive.py gid 1209876543210
+    python task_archive.py stats
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import metrics
+from persistence import state_path
+
+# En el volumen de estado durable: lo archivado ya no está en el mapeo ni en
+# el log de eventos, así que esta es la única copia
+TASK_ARCHIVE_DIR = os.getenv('TASK_ARCHIVE_DIR') or state_path('task_archive')
+# Días que una tarea completada sigue en el mapeo; 0 desactiva el archivo
+RETENTION_DAYS = float(os.getenv('TASK_RETENTION_DAYS', '30'))
+# Días que una tarea abierta sigue en el mapeo; 0 = no se archivan nunca
+OPEN_RETENTION_DAYS = float(os.getenv('TASK_OPEN_RETENTION_DAYS', '0'))
+RETENTION_INTERVAL = float(os.getenv('TASK_RETENTION_INTERVAL', '3600'))
+ARCHIVE_CACHE_MONTHS = int(os.getenv('TASK_ARCHIVE_CACHE_MONTHS', '3'))
+
+UNDATED = 'undated'
+
+ARCHIVED_TASKS = metrics.counter('tasks_archived_total', 'Task mapping entries moved to the cold archive')
+
+
+def month_of(task_key):
+    """Mes (YYYY-MM, UTC) del mensaje de Slack de una clave canal:ts"""
+    try:
+        return time.strftime('%Y-%m', time.gmtime(float(task_key.rsplit(':', 1)[1])))
+    except (IndexError, ValueError):
+        return UNDATED
+
+
+def is_expired(task_info, now):
+    """True si la tarea ya no tiene que estar en el mapeo en memoria"""
+    completed_at = task_info.get('completed_at')
+    if completed_at:
+        return RETENTION_DAYS > 0 and now - completed_at > RETENTION_DAYS * 86400
+    if OPEN_RETENTION_DAYS > 0:
+        return now - task_info.get('created_at', now) > OPEN_RETENTION_DAYS * 86400
+    return False
+
+
+def expired_task_keys(mapping, now=None):
+    now = now or time.time()
+    return [task_key for task_key, task_info in list(mapping.items()) if is_expired(task_info, now)]
+
+
+class TaskArchive:
+    """Tareas archivadas en gzip JSONL por mes, con lectura a demanda"""
+
+    def __init__(self, directory=TASK_ARCHIVE_DIR, cache_months=ARCHIVE_CACHE_MONTHS):
+        self._directory = directory
+        self._cache_months = cache_months
+        # mes -> {task_key: task}, los últimos meses consultados
+        self._months = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, month):
+        return os.path.join(self._directory, f"archive-{month}.jsonl.gz")
+
+    def _files(self):
+        """Archivos del más nuevo al más viejo"""
+        if not os.path.isdir(self._directory):
+            return []
+        names = [name for name in os.listdir(self._directory)
+                 if name.startswith('archive-') and name.endswith('.jsonl.gz')]
+        return [os.path.join(self._directory, name) for name in sorted(names, reverse=True)]
+
+    def archive(self, tasks):
+        """Agrega {task_key: task} al archivo de su mes, con fsync"""
+        by_month = {}
+        archived_at = round(time.time(), 3)
+        for task_key, task in tasks.items():
+            line = json.dumps({'k': task_key, 'a': archived_at, 'task': task}, separators=(',', ':'), ensure_ascii=False)
+            by_month.setdefault(month_of(task_key), []).append(line)
+
+        os.makedirs(self._directory, exist_ok=True)
+        with self._lock:
+            for month, lines in by_month.items():
+                with open(self._path(month), 'ab') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                        f.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                self._months.pop(month, None)
+        ARCHIVED_TASKS.inc(len(tasks))
+        return len(tasks)
+
+    def _lines(self, path):
+        """Líneas de un archivo; un miembro truncado por un crash corta la lectura"""
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                yield from f
+        except FileNotFoundError:
+            return
+        except (EOFError, gzip.BadGzipFile):
+            logging.warning(f"⚠️ Truncated archive {path}, read up to the last complete member")
+
+    def _read(self, path, needle=None):
+        for line in self._lines(path):
+            if needle is not None and needle not in line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"⚠️ Skipping corrupt archive line in {path}")
+
+    def _month(self, month):
+        with self._lock:
+            tasks = self._months.get(month)
+            metrics.record_cache('task_archive_months', hit=tasks is not None)
+            if tasks is not None:
+                self._months.move_to_end(month)
+                return tasks
+            tasks = {record['k']: record['task'] for record in self._read(self._path(month))}
+            self._months[month] = tasks
+            while len(self._months) > self._cache_months:
+                self._months.popitem(last=False)
+            return tasks
+
+    def lookup(self, task_key):
+        """Datos de la tarea archivada con esa clave, o None"""
+        return self._month(month_of(task_key)).get(task_key)
+
+    def find_by_gid(self, asana_gid):
+        """(task_key, task) de la tarea de Asana archivada, o None; recorre todo el archivo"""
+        # Solo se parsean las líneas que contienen el gid
+        needle = f'"asana_gid":"{asana_gid}"'
+        for path in self._files():
+            for record in self._read(path, needle):
+                if record['task'].get('asana_gid') == asana_gid:
+                    return record['k'], record['task']
+        return None
+
+    def stats(self):
+        files = self._files()
+        return {
+            'files': len(files),
+            'bytes': sum(os.path.getsize(path) for path in files),
+            'tasks': sum(1 for path in files for _ in self._lines(path)),
+        }
+
+
+class RetentionJob:
+    """Thread que corre `run` (mover las tareas vencidas al archivo) cada `interval` segundos"""
+
+    def __init__(self, run, interval=RETENTION_INTERVAL):
+        self._run_once = run
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        if self._interval <= 0 or (RETENTION_DAYS <= 0 and OPEN_RETENTION_DAYS <= 0):
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='task-retention')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._run_once()
+            except Exception:
+                logging.exception("❌ Error archivando tareas vencidas")
+            self._stop.wait(self._interval)
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'stats'
+    archive = TaskArchive()
+    if command == 'lookup' and len(argv) > 2:
+        print(json.dumps(archive.lookup(argv[2]), indent=2, ensure_ascii=False))
+    elif command == 'gid' and len(argv) > 2:
+        found = archive.find_by_gid(argv[2])
+        print(json.dumps({'task_key': found[0], 'task': found[1]} if found else None, indent=2, ensure_ascii=False))
+    elif command == 'stats':
+        print(json.dumps(archive.stats(), indent=2))
+    else:
+        print("❌ Uso: task_archive.py lookup <canal:ts> | gid <asana_gid> | stats")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
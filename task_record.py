@@ -0,0 +1,160 @@
+"""
+Entrada compacta del mapeo de tareas.
+
+Cada entrada de task_mapping era un dict de ~11 claves: la tabla del dict
+más un string propio por valor, aunque el canal, los usuarios y el proyecto
+se repiten en miles de entradas. TaskRecord guarda lo mismo en __slots__,
+con los IDs de canal/usuario/proyecto internados (una sola copia por valor)
+y los ts de Slack como enteros en microsegundos en lugar de strings.
+
+Para no tocar a quien lo usa, se lee y escribe como el dict de antes:
+
+    task_info['asana_gid'], task_info.get('completed_at')
+    task_info['completed_at'] = time.time()
+    task_info.update({'task_name': ...})
+
+También con su semántica: una clave guardada con None está (`in`, get()
+devuelve None y no el default) y una que nunca se guardó no (KeyError). Un
+bit por campo en `_present` recuerda cuáles se guardaron.
+
+En disco (task_mapping.json, log de eventos, archivo) se sigue guardando el
+dict, vía to_dict() / json_default. Las claves que no son campos conocidos
+van a `extra`, así un JSON con claves nuevas no pierde nada al cargarse.
+
+Comparación de memoria contra el dict: python -m benchmarks.bench_task_record
+"""
+
+import sys
+
+# Campos que se internan: se repiten en muchas entradas
+INTERNED_FIELDS = frozenset(('channel', 'user_who_posted', 'assigned_to', 'project_id', 'source'))
+
+# Máscaras de campos guardados; casi todas las entradas comparten la misma,
+# así que se guarda una sola copia de cada int
+_MASKS = {}
+
+
+def ts_to_int(ts):
+    """"1712345678.000100" -> 1712345678000100; lo que no es un ts de Slack queda igual"""
+    if not isinstance(ts, str):
+        return ts
+    seconds, _, fraction = ts.partition('.')
+    if not seconds.isdigit() or len(fraction) > 6 or (fraction and not fraction.isdigit()):
+        return ts
+    return int(seconds) * 1_000_000 + int(fraction.ljust(6, '0'))
+
+
+def ts_to_str(value):
+    if not isinstance(value, int):
+        return value
+    return f"{value // 1_000_000}.{value % 1_000_000:06d}"
+
+
+class TaskRecord:
+    """Una tarea del mapeo; acceso por atributo o como dict"""
+
+    __slots__ = ('asana_gid', 'channel', '_message_ts', '_thread_ts', 'user_who_posted', 'assigned_to',
+                 'project_id', 'created_at', 'completed_at', 'can_be_cancelled', 'task_name', 'text_hash',
+                 'source', 'extra', '_present')
+
+    FIELDS = ('asana_gid', 'channel', 'message_ts', 'thread_ts', 'user_who_posted', 'assigned_to',
+              'project_id', 'created_at', 'completed_at', 'can_be_cancelled', 'task_name', 'text_hash', 'source')
+    _FIELD_SET = frozenset(FIELDS)
+    _FIELD_BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, None)
+        self._present = 0
+        self.update(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        return data if isinstance(data, cls) else cls(**data)
+
+    @property
+    def message_ts(self):
+        return ts_to_str(self._message_ts)
+
+    @message_ts.setter
+    def message_ts(self, value):
+        self._message_ts = ts_to_int(value)
+
+    @property
+    def thread_ts(self):
+        return ts_to_str(self._thread_ts)
+
+    @thread_ts.setter
+    def thread_ts(self, value):
+        self._thread_ts = ts_to_int(value)
+
+    def __setitem__(self, key, value):
+        if key in INTERNED_FIELDS and isinstance(value, str):
+            value = sys.intern(value)
+        if key in self._FIELD_SET:
+            setattr(self, key, value)
+            mask = self._present | self._FIELD_BITS[key]
+            self._present = _MASKS.setdefault(mask, mask)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def _has_field(self, name):
+        # Un valor asignado por atributo también cuenta
+        return getattr(self, name) is not None or bool(self._present & self._FIELD_BITS[name])
+
+    def __getitem__(self, key):
+        bit = self._FIELD_BITS.get(key)
+        if bit is not None:
+            value = getattr(self, key)
+            if value is not None or self._present & bit:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._FIELD_SET:
+            return self._has_field(key)
+        return self.extra is not None and key in self.extra
+
+    def get(self, key, default=None):
+        bit = self._FIELD_BITS.get(key)
+        if bit is not None:
+            value = getattr(self, key)
+            return value if value is not None or self._present & bit else default
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def update(self, fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def to_dict(self):
+        """El dict equivalente: los campos guardados, aunque sea con None"""
+        data = {}
+        present = self._present
+        for name, bit in self._FIELD_BITS.items():
+            value = getattr(self, name)
+            if value is not None or present & bit:
+                data[name] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, (TaskRecord, dict)):
+            return self.to_dict() == TaskRecord.from_dict(other).to_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TaskRecord({self.to_dict()!r})"
+
+
+def json_default(value):
+    """`default` de json.dump para mapeos con TaskRecord"""
+    if isinstance(value, TaskRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
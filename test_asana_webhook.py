@@ -0,0 +1,122 @@
+"""
+Handshake y firma de /asana/webhook (main.handle_asana_webhook): un
+handshake sin un token de creación válido no puede reemplazar el secreto de
+un webhook existente.
+"""
+
+import hmac
+import json
+import time
+import hashlib
+
+import pytest
+
+import main
+import webhook_secrets
+from webhook_secrets import WebhookSecretStore, handshake_token
+
+KEY = 'test-handshake-key'
+SECRET = 'real-asana-secret'
+BODY = json.dumps({'events': []}).encode()
+
+
+def sign(secret, body=BODY):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def handshake(secret, token=None, resource='123'):
+    args = {'resource': resource}
+    if token is not None:
+        args['token'] = token
+    return main.handle_asana_webhook({'X-Hook-Secret': secret}, b'', args)
+
+
+def deliver(secret, resource='123'):
+    return main.handle_asana_webhook({'X-Hook-Signature': sign(secret)}, BODY, {'resource': resource})
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(webhook_secrets, 'HANDSHAKE_TOKEN', KEY)
+    store = WebhookSecretStore(str(tmp_path / 'asana_webhook_secrets.json'))
+    monkeypatch.setitem(main.state.__dict__, 'webhook_secrets', store)
+    monkeypatch.setattr(main.state.asana_event_worker, 'enqueue', lambda events: None)
+    return store
+
+
+def test_handshake_with_creation_token_stores_secret(store):
+    payload, status, headers = handshake(SECRET, handshake_token('123'))
+    assert status == 200
+    assert headers == {'X-Hook-Secret': SECRET}
+    assert deliver(SECRET)[1] == 200
+
+
+def test_handshake_without_token_cannot_overwrite_secret(store):
+    assert handshake(SECRET, handshake_token('123'))[1] == 200
+
+    assert handshake('attacker-secret')[1] == 403
+    assert handshake('attacker-secret', 'garbage')[1] == 403
+    assert deliver('attacker-secret')[1] == 401
+    assert deliver(SECRET)[1] == 200
+
+
+def test_replayed_token_cannot_overwrite_secret(store):
+    token = handshake_token('123')
+    assert handshake(SECRET, token)[1] == 200
+
+    assert handshake('attacker-secret', token)[1] == 403
+    assert deliver(SECRET)[1] == 200
+
+
+def test_token_is_bound_to_its_webhook(store):
+    assert handshake('attacker-secret', handshake_token('999'), resource='123')[1] == 403
+    assert '123' not in store
+
+
+def test_expired_token_is_rejected(store):
+    token = handshake_token('123', now=time.time() - webhook_secrets.HANDSHAKE_WINDOW - 1)
+    assert handshake(SECRET, token)[1] == 403
+    assert '123' not in store
+
+
+def test_new_creation_replaces_secret(store):
+    assert handshake(SECRET, handshake_token('123', now=time.time() - 10))[1] == 200
+    assert handshake('rotated-secret', handshake_token('123'))[1] == 200
+    assert deliver('rotated-secret')[1] == 200
+    assert deliver(SECRET)[1] == 401
+
+
+def test_handshakes_rejected_without_configured_key(store, monkeypatch):
+    token = handshake_token('123')
+    monkeypatch.setattr(webhook_secrets, 'HANDSHAKE_TOKEN', None)
+    assert handshake(SECRET, token)[1] == 403
+    assert '123' not in store
+
+
+def test_accepted_handshake_survives_restart(store, tmp_path):
+    token = handshake_token('123')
+    assert handshake(SECRET, token)[1] == 200
+
+    reloaded = WebhookSecretStore(str(tmp_path / 'asana_webhook_secrets.json'))
+    assert reloaded.verify('123', BODY, sign(SECRET))
+    assert not reloaded.handshake('123', 'attacker-secret', token)
+
+
+def test_handshake_on_another_instance_is_picked_up(store, tmp_path):
+    other = WebhookSecretStore(str(tmp_path / 'asana_webhook_secrets.json'))
+    assert other.handshake('456', 'other-secret', handshake_token('456'))
+
+    assert store.verify('456', BODY, sign('other-secret'))
+    assert handshake(SECRET, handshake_token('123'))[1] == 200
+    assert WebhookSecretStore(str(tmp_path / 'asana_webhook_secrets.json')).verify('456', BODY, sign('other-secret'))
+
+
+def test_cloud_run_requires_a_mounted_state_dir(tmp_path, monkeypatch):
+    import persistence
+    monkeypatch.setenv('K_SERVICE', 'track')
+    monkeypatch.setattr(persistence, 'ALLOW_EPHEMERAL_STATE', False)
+    monkeypatch.setattr(persistence, 'STATE_DIR', str(tmp_path))
+    with pytest.raises(RuntimeError):
+        persistence.check_durable_state()
+    monkeypatch.setattr(persistence, 'ALLOW_EPHEMERAL_STATE', True)
+    persistence.check_durable_state()
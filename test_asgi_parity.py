@@ -0,0 +1,215 @@
+"""
+La app Flask (main.create_app) y asgi.app sirven las mismas rutas con la
+misma lógica: los mismos requests firmados tienen que dar el mismo status y
+el mismo body en las dos.
+"""
+
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+from urllib.parse import urlencode
+
+import pytest
+
+import main
+import webhook_secrets
+from webhook_secrets import WebhookSecretStore, handshake_token
+
+SIGNING_SECRET = 'test-signing-secret'
+HANDSHAKE_KEY = 'test-handshake-key'
+ASANA_SECRET = 'asana-secret'
+
+
+@pytest.fixture(scope='module')
+def apps(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        # Archivos de estado y log fuera del repo, y sin jobs de fondo
+        mp.chdir(tmp_path_factory.mktemp('parity'))
+        mp.setattr(main, 'start_background_jobs', lambda: None)
+        import asgi
+        yield main.create_app().test_client(), asgi.app
+
+
+@pytest.fixture(autouse=True)
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'SLACK_SIGNING_SECRET', SIGNING_SECRET)
+    monkeypatch.setattr(webhook_secrets, 'HANDSHAKE_TOKEN', HANDSHAKE_KEY)
+    monkeypatch.setitem(main.state.__dict__, 'webhook_secrets', WebhookSecretStore(str(tmp_path / 'secrets.json')))
+    dispatched = []
+    monkeypatch.setattr(main, 'dispatch_slack_event', lambda data, *args: dispatched.append(data))
+    monkeypatch.setattr(main.state.asana_event_worker, 'enqueue', lambda events: dispatched.append(events))
+    monkeypatch.setattr(main.state.interaction_worker, 'enqueue', lambda fields: dispatched.append(fields))
+    return dispatched
+
+
+def slack_headers(body, content_type, secret=SIGNING_SECRET):
+    timestamp = str(int(time.time()))
+    signature = 'v0=' + hmac.new(secret.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256).hexdigest()
+    return {
+        'Content-Type': content_type,
+        'X-Slack-Request-Timestamp': timestamp,
+        'X-Slack-Signature': signature,
+    }
+
+
+def call_flask(client, method, path, body=b'', headers=None, query=''):
+    response = client.open(f"{path}?{query}" if query else path, method=method, data=body, headers=headers or {})
+    return response.status_code, response.get_data(), {k.lower(): v for k, v in response.headers.items()}
+
+
+def call_asgi(app, method, path, body=b'', headers=None, query=''):
+    if isinstance(body, str):
+        body = body.encode()
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    response_headers = {k.decode(): v.decode() for k, v in start['headers']}
+    return start['status'], b''.join(m.get('body', b'') for m in messages[1:]), response_headers
+
+
+def decoded(body):
+    """El body como JSON si lo es (Flask y asgi serializan con distinto espaciado)"""
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body
+
+
+def assert_same(apps, method, path, make_request, setup=None):
+    """
+    Manda el request a las dos apps; make_request() arma (body, headers,
+    query) en el momento, así la firma y el timestamp son frescos
+    """
+    client, asgi_app = apps
+    results = []
+    for call, app in ((call_flask, client), (call_asgi, asgi_app)):
+        if setup:
+            setup()
+        body, headers, query = make_request()
+        results.append(call(app, method, path, body, headers, query))
+    (flask_status, flask_body, flask_headers), (asgi_status, asgi_body, asgi_headers) = results
+    assert flask_status == asgi_status
+    assert decoded(flask_body) == decoded(asgi_body)
+    return flask_status, decoded(flask_body), flask_headers, asgi_headers
+
+
+def event_request(payload, secret=SIGNING_SECRET):
+    def make():
+        body = json.dumps(payload)
+        return body, slack_headers(body, 'application/json', secret), ''
+    return make
+
+
+def interaction_request(payload, secret=SIGNING_SECRET):
+    def make():
+        body = urlencode({'payload': json.dumps(payload)})
+        return body, slack_headers(body, 'application/x-www-form-urlencoded', secret), ''
+    return make
+
+
+def test_health(apps):
+    status, body, _, _ = assert_same(apps, 'GET', '/health', lambda: (b'', {}, ''))
+    assert status == 200
+    assert body['status'] == 'healthy'
+
+
+def test_slack_url_verification(apps):
+    status, body, _, _ = assert_same(apps, 'POST', '/slack/events',
+                                     event_request({'type': 'url_verification', 'challenge': 'abc123'}))
+    assert (status, body) == (200, {'challenge': 'abc123'})
+
+
+def test_slack_events_bad_signature(apps, service):
+    status, body, _, _ = assert_same(apps, 'POST', '/slack/events',
+                                     event_request({'type': 'event_callback'}, secret='wrong-secret'))
+    assert status in (400, 401, 403)
+    assert service == []
+
+
+def test_slack_message_event(apps, service):
+    payload = {
+        'type': 'event_callback',
+        'event_id': 'Ev123',
+        'event': {'type': 'message', 'channel': 'C1', 'user': 'U1', 'text': 'mañana mando el informe', 'ts': '1.0'},
+    }
+    status, body, _, _ = assert_same(apps, 'POST', '/slack/events', event_request(payload))
+    assert (status, body) == (200, {'status': 'ok'})
+    assert service == [payload, payload]
+
+
+def test_slack_interactions_invalid_modal(apps, service):
+    payload = {
+        'type': 'view_submission',
+        'user': {'id': 'U1'},
+        'view': {'callback_id': main.TASK_MODAL_CALLBACK, 'state': {'values': {}}, 'private_metadata': '{}'},
+    }
+    status, body, _, _ = assert_same(apps, 'POST', '/slack/interactions', interaction_request(payload))
+    assert status == 200
+    assert body['response_action'] == 'errors'
+    assert service == []
+
+
+def test_slack_interactions_ignored_action(apps):
+    payload = {'type': 'block_actions', 'actions': [{'action_id': 'something_else'}]}
+    status, body, _, _ = assert_same(apps, 'POST', '/slack/interactions', interaction_request(payload))
+    assert (status, body) == (200, b'')
+
+
+def test_slack_interactions_bad_signature(apps):
+    payload = {'type': 'block_actions', 'actions': []}
+    status, _, _, _ = assert_same(apps, 'POST', '/slack/interactions', interaction_request(payload, secret='wrong'))
+    assert status in (400, 401, 403)
+
+
+def test_asana_handshake(apps, tmp_path):
+    def fresh_store():
+        main.state.__dict__['webhook_secrets'] = WebhookSecretStore(str(tmp_path / f'secrets-{time.monotonic_ns()}.json'))
+
+    def make():
+        return b'', {'X-Hook-Secret': ASANA_SECRET}, urlencode({'resource': '123', 'token': handshake_token('123')})
+
+    status, _, flask_headers, asgi_headers = assert_same(apps, 'POST', '/asana/webhook', make, setup=fresh_store)
+    assert status == 200
+    assert flask_headers['x-hook-secret'] == asgi_headers['x-hook-secret'] == ASANA_SECRET
+
+
+def test_asana_handshake_without_token(apps):
+    status, _, _, _ = assert_same(apps, 'POST', '/asana/webhook',
+                                  lambda: (b'', {'X-Hook-Secret': 'attacker'}, 'resource=123'))
+    assert status == 403
+
+
+def asana_delivery(secret):
+    body = json.dumps({'events': [{'action': 'changed', 'resource': {'gid': '1', 'resource_type': 'task'}}]}).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return lambda: (body, {'X-Hook-Signature': signature, 'Content-Type': 'application/json'}, 'resource=123')
+
+
+def test_asana_events(apps, service):
+    assert main.state.webhook_secrets.handshake('123', ASANA_SECRET, handshake_token('123'))
+    status, _, _, _ = assert_same(apps, 'POST', '/asana/webhook', asana_delivery(ASANA_SECRET))
+    assert status == 200
+    assert len(service) == 2 and service[0] == service[1]
+
+
+def test_asana_events_bad_signature(apps, service):
+    assert main.state.webhook_secrets.handshake('123', ASANA_SECRET, handshake_token('123'))
+    status, _, _, _ = assert_same(apps, 'POST', '/asana/webhook', asana_delivery('wrong-secret'))
+    assert status == 401
+    assert service == []
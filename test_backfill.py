@@ -0,0 +1,22 @@
+"""
+El backfill escribe el mismo estado que el servicio: sin --dry-run no corre
+mientras un proceso del servicio tiene tomado STATE_DIR/.service.lock.
+"""
+
+import main
+import backfill
+import persistence
+
+
+def test_backfill_refuses_to_run_next_to_the_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistence, 'STATE_DIR', str(tmp_path))
+    monkeypatch.setattr(persistence, '_service_lock', None)
+    monkeypatch.setattr(main, 'init', lambda: None)
+    persistence.hold_service_lock()
+    try:
+        assert backfill.run(['--channels', 'C1']) == 2
+    finally:
+        persistence._service_lock.close()
+    lock = persistence.exclusive_state_lock()
+    assert lock is not None
+    lock.close()
@@ -1,52 +1,117 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Script de prueba para verificar el procesamiento de fechas
+Pruebas del procesamiento de fechas (asana_client.parse_date) contra un
+`today` fijo: miércoles 13/08/2025.
+
+`python test_dates.py` además corre el evaluador LLM sobre mensajes con
+fechas (necesita OPENAI_API_KEY; no tiene asserts, es para mirar).
 """
 
-from datetime import datetime
-from asana_client import parse_date
-from llm_evaluator import evaluate_commitment
+from datetime import date, datetime
+
+import pytest
+
+from asana_client import _parse_date_on, parse_date
+
+TODAY = date(2025, 8, 13)
+
+
+@pytest.mark.parametrize('expr, expected', [
+    ("hoy", "2025-08-13"),
+    ("ayer", "2025-08-12"),
+    ("mañana", "2025-08-14"),
+    ("manana", "2025-08-14"),
+    ("tomorrow", "2025-08-14"),
+    ("esta semana", "2025-08-15"),
+    ("fin de semana", "2025-08-16"),
+    ("próxima semana", "2025-08-20"),
+    ("next week", "2025-08-20"),
+    ("en 3 días", "2025-08-16"),
+    ("en 5 dias", "2025-08-18"),
+    ("en 2 semanas", "2025-08-27"),
+    ("in 1 week", "2025-08-20"),
+])
+def test_relative_dates(expr, expected):
+    assert _parse_date_on(expr, TODAY) == expected
+
+
+@pytest.mark.parametrize('expr, expected', [
+    ("pasado mañana", "2025-08-15"),
+    ("pasado manana", "2025-08-15"),
+    ("tenemos que entregar esto pasado mañana sin falta", "2025-08-15"),
+    ("revisemos esto mañana por la mañana", "2025-08-14"),
+    ("day after tomorrow", "2025-08-15"),
+])
+def test_pasado_manana_wins_over_manana(expr, expected):
+    assert _parse_date_on(expr, TODAY) == expected
+
+
+@pytest.mark.parametrize('expr, expected', [
+    ("lunes", "2025-08-18"),
+    ("martes", "2025-08-19"),
+    ("jueves", "2025-08-14"),
+    ("viernes", "2025-08-15"),
+    ("sábado", "2025-08-16"),
+    ("domingo", "2025-08-17"),
+    # Hoy es miércoles: siempre el próximo, nunca hoy
+    ("miércoles", "2025-08-20"),
+    ("miercoles", "2025-08-20"),
+    ("próximo lunes", "2025-08-18"),
+    ("el proximo viernes", "2025-08-15"),
+    ("next monday", "2025-08-18"),
+    ("friday", "2025-08-15"),
+    ("podés mandar el reporte el viernes?", "2025-08-15"),
+])
+def test_weekdays(expr, expected):
+    assert _parse_date_on(expr, TODAY) == expected
 
-def test_parse_dates():
-    """Prueba la función parse_date con diferentes formatos"""
-    print("=" * 50)
-    print("PRUEBAS DE PARSE_DATE")
-    print("=" * 50)
-    
-    test_cases = [
-        "hoy",
-        "mañana",
-        "pasado mañana",
-        "lunes",
-        "martes",
-        "viernes",
-        "esta semana",
-        "próxima semana",
-        "fin de semana",
-        "en 3 días",
-        "en 5 días",
-        "15/08/2025",
-        "2025-08-15",
-        "15 de agosto",
-        "20 de diciembre",
-        "ayer",
-        "15-08-2025",
-        "08/15/2025",
-    ]
-    
-    for test_date in test_cases:
-        result = parse_date(test_date)
-        print(f"'{test_date}' -> {result}")
-    
-    print()
 
-def test_llm_evaluator():
-    """Prueba el evaluador LLM con mensajes que contienen fechas"""
+@pytest.mark.parametrize('expr', ["lunesito", "domingos", "martesxx"])
+def test_weekday_needs_a_whole_word(expr):
+    assert _parse_date_on(expr, TODAY) is None
+
+
+@pytest.mark.parametrize('expr, expected', [
+    ("2025-08-15", "2025-08-15"),
+    ("15/08/2025", "2025-08-15"),
+    ("15-08-2025", "2025-08-15"),
+    # Mes/día cuando día/mes no es válido (formato US)
+    ("08/15/2025", "2025-08-15"),
+    ("15/08", "2025-08-15"),
+    # Sin año y ya pasó: el año que viene
+    ("10/08", "2026-08-10"),
+    ("15 de agosto", "2025-08-15"),
+    ("20 de diciembre", "2025-12-20"),
+    ("10 de agosto", "2026-08-10"),
+    ("agosto 15", "2025-08-15"),
+    ("august 15, 2025", "2025-08-15"),
+    ("1 de enero de 2027", "2027-01-01"),
+    ("antes del 15/08/2025", "2025-08-15"),
+])
+def test_absolute_dates(expr, expected):
+    assert _parse_date_on(expr, TODAY) == expected
+
+
+@pytest.mark.parametrize('expr', ["sin fecha", "31/02/2025", "cuando puedas"])
+def test_unparseable_dates(expr):
+    assert _parse_date_on(expr, TODAY) is None
+
+
+def test_parse_date_normalizes_the_expression():
+    assert parse_date("  Pasado   MAÑANA ") == _parse_date_on("pasado mañana", date.today())
+    assert parse_date("") is None
+    assert parse_date(None) is None
+
+
+def check_llm_evaluator():
+    """Corre el evaluador LLM con mensajes que contienen fechas"""
+    from llm_evaluator import evaluate_commitment
+
     print("=" * 50)
     print("PRUEBAS DE EVALUADOR LLM")
     print("=" * 50)
-    
+
     test_messages = [
         "@juan necesito que termines el informe hoy antes de las 5pm",
         "Equipo, revisemos esto mañana por la mañana",
@@ -59,7 +124,7 @@ def test_llm_evaluator():
         "@ana completá la tarea antes del 15/08/2025",
         "Hagamos la demo el 20 de agosto",
     ]
-    
+
     for message in test_messages:
         print(f"\nMensaje: {message}")
         try:
@@ -71,14 +136,13 @@ def test_llm_evaluator():
                     print(f"Fecha parseada: {parsed}")
         except Exception as e:
             print(f"Error: {e}")
-    
+
     print()
 
 if __name__ == "__main__":
     print(f"Fecha actual: {datetime.now().strftime('%Y-%m-%d %A')}")
     print()
-    
-    test_parse_dates()
-    test_llm_evaluator()
-    
-    print("\n✅ Pruebas completadas")
\ No newline at end of file
+
+    check_llm_evaluator()
+
+    print("\n✅ Pruebas completadas")
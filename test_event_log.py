@@ -0,0 +1,86 @@
+"""
+Compactación automática del log de eventos de tareas (event_log.py): el
+replay del arranque no tiene que leer todos los segmentos desde el último
+snapshot.
+"""
+
+import pytest
+
+import event_log
+from event_log import TaskEventLog, CREATED, CANCELLED, compact, list_segments, maybe_compact, replay
+
+
+@pytest.fixture(autouse=True)
+def no_background_compaction(monkeypatch):
+    monkeypatch.setattr(event_log, 'COMPACT_AFTER_SEGMENTS', 100)
+
+
+def write_segments(directory, count, start=0):
+    """Cada segmento lo escribe un proceso distinto (un writer nuevo)"""
+    for i in range(start, start + count):
+        log = TaskEventLog(directory=directory, flush_interval=60)
+        log.append(CREATED, f'task-{i}', task={'task_gid': str(i)})
+        log.flush()
+        log._rotate()
+
+
+def test_startup_compacts_once_segments_pile_up(tmp_path):
+    directory = str(tmp_path)
+    write_segments(directory, 6)
+    assert maybe_compact(directory, threshold=4) == 5
+    assert [seq for seq, _ in list_segments(directory)] == [6]
+    assert sorted(replay(directory)) == [f'task-{i}' for i in range(6)]
+
+
+def test_startup_leaves_few_segments_alone(tmp_path):
+    directory = str(tmp_path)
+    write_segments(directory, 3)
+    assert maybe_compact(directory, threshold=4) == 0
+    assert len(list_segments(directory)) == 3
+
+
+def test_rotation_compacts_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_log, 'COMPACT_AFTER_SEGMENTS', 2)
+    directory = str(tmp_path)
+    log = TaskEventLog(directory=directory, segment_max_bytes=1, flush_interval=60)
+    for i in range(4):
+        log.append(CREATED, f'task-{i}', task={'task_gid': str(i)})
+        log.flush()
+    log.append(CANCELLED, 'task-0')
+    log.flush()
+    for thread in list(event_log.threading.enumerate()):
+        if thread.name == 'task-event-log-compact':
+            thread.join(5)
+
+    assert len(list_segments(directory)) < 5
+    assert sorted(replay(directory)) == ['task-1', 'task-2', 'task-3']
+
+
+def test_segment_open_in_another_writer_is_not_compacted(tmp_path):
+    directory = str(tmp_path)
+    write_segments(directory, 2)
+    active = TaskEventLog(directory=directory, flush_interval=60)
+    active.append(CREATED, 'active', task={'task_gid': 'a'})
+    active.flush()
+    write_segments(directory, 2, start=2)
+
+    assert compact(directory) == 2
+    active.append(CANCELLED, 'task-0')
+    active.flush()
+    assert [seq for seq, _ in list_segments(directory)] == [3, 4, 5]
+    assert sorted(replay(directory)) == ['active', 'task-1', 'task-2', 'task-3']
+
+
+def test_concurrent_writers_never_share_a_segment(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    first = TaskEventLog(directory=directory, flush_interval=60)
+    second = TaskEventLog(directory=directory, flush_interval=60)
+    # Los dos ven el mismo último segmento antes de crear el suyo
+    monkeypatch.setattr(event_log, 'list_segments', lambda d: [])
+    first.append(CREATED, 'a', task={'task_gid': 'a'})
+    first.flush()
+    second.append(CREATED, 'b', task={'task_gid': 'b'})
+    second.flush()
+    monkeypatch.undo()
+    assert first._seq != second._seq
+    assert sorted(replay(directory)) == ['a', 'b']
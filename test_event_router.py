@@ -0,0 +1,53 @@
+"""
+Descarte sin parsear de event_router.EventRouter.should_drop: los mensajes
+de bots se descartan, pero no los de personas que traen un mensaje de bot
+anidado (attachments de un mensaje compartido, message_changed...).
+"""
+
+import json
+
+import main
+from event_router import EventRouter
+
+
+def body(event):
+    return json.dumps({'type': 'event_callback', 'event_id': 'Ev1', 'event': event})
+
+
+def human(**fields):
+    return dict({'type': 'message', 'channel': 'C1', 'user': 'U1', 'text': 'mañana lo mando', 'ts': '1.0'}, **fields)
+
+
+def test_top_level_bot_message_is_dropped():
+    assert main.router.should_drop(body(human(bot_id='B1'))) == 'bot'
+
+
+def test_human_message_sharing_a_bot_message_is_kept():
+    shared = {'is_share': True, 'bot_id': 'B1', 'text': 'alerta del bot', 'fallback': 'alerta'}
+    assert main.router.should_drop(body(human(attachments=[shared]))) is None
+
+
+def test_bot_message_with_attachments_is_left_to_the_parsed_check():
+    event = human(bot_id='B1', attachments=[{'text': 'detalle'}])
+    assert main.router.should_drop(body(event)) is None
+
+    router = EventRouter()
+    handled = []
+    router.on('message')(lambda event, data: handled.append(event) if not event.get('bot_id') else None)
+    assert router.dispatch(json.loads(body(event)))
+    assert handled == []
+
+
+def test_edit_of_a_bot_message_is_left_to_the_parsed_check():
+    event = {'type': 'message', 'subtype': 'message_changed', 'channel': 'C1',
+             'message': {'bot_id': 'B1', 'text': 'editado', 'ts': '1.0'}}
+    assert main.router.should_drop(body(event)) is None
+
+
+def test_unhandled_subtypes_and_types_are_dropped():
+    assert main.router.should_drop(body(human(subtype='channel_join'))) == 'subtype'
+    assert main.router.should_drop(body({'type': 'app_mention', 'text': 'hola'})) == 'type'
+
+
+def test_non_event_payloads_are_parsed():
+    assert main.router.should_drop(json.dumps({'type': 'url_verification', 'challenge': 'x'})) is None
@@ -0,0 +1,115 @@
+"""
+Jobs pendientes al apagar (lifecycle.py) y reintentos del submit del modal:
+cada instancia guarda sus jobs en su propio archivo del volumen compartido, y
+un submit que se corre de nuevo no crea la tarea otra vez. Los eventos de
+Asana sin procesar también pasan a la próxima instancia.
+"""
+
+import json
+
+import pytest
+
+import main
+import asana_client
+from lifecycle import Lifecycle
+from interactions import SubmissionLog
+
+
+def test_instances_do_not_overwrite_each_other(tmp_path):
+    path = str(tmp_path / 'pending_jobs.json')
+    first, second = Lifecycle(path), Lifecycle(path)
+    first.shutdown(grace=0)
+    second.shutdown(grace=0)
+    first.spawn('create_task', event={'ts': '1.0'})
+    second.spawn('create_task', event={'ts': '2.0'})
+
+    resumed = []
+    nxt = Lifecycle(path)
+    nxt.register('create_task', lambda event: resumed.append(event['ts']))
+    nxt._accepting = False  # se guardarían de nuevo en vez de correr
+    assert nxt.resume() == 2
+    assert sorted(job['payload']['event']['ts'] for job in json.load(open(nxt._own_path))) == ['1.0', '2.0']
+    assert sorted(p.name for p in tmp_path.iterdir()) == [nxt._own_path.rsplit('/', 1)[1]]
+
+
+def test_resume_takes_the_legacy_file(tmp_path):
+    path = tmp_path / 'pending_jobs.json'
+    path.write_text(json.dumps([{'kind': 'noop', 'payload': {}}]))
+    lifecycle = Lifecycle(str(path))
+    lifecycle.register('noop', lambda: None)
+    assert lifecycle.resume() == 1
+    assert not path.exists()
+    assert lifecycle.resume() == 0
+
+
+def test_submission_log_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'task_submissions.json')
+    first = SubmissionLog(path)
+    assert first.claim('V1')
+    assert not first.claim('V1')
+    first.done('V1', '111')
+
+    # Otra instancia, con el mismo volumen
+    second = SubmissionLog(path)
+    assert not second.claim('V1')
+    assert second.claim('V2')
+    second.release('V2')
+    assert second.claim('V2')
+
+
+@pytest.fixture
+def submissions(tmp_path, monkeypatch):
+    log = SubmissionLog(str(tmp_path / 'task_submissions.json'))
+    monkeypatch.setitem(main.state.__dict__, 'task_submissions', log)
+    monkeypatch.setattr(main, 'get_asana_gid_from_slack_user', lambda user: 'A1')
+    monkeypatch.setattr(main, 'send_slack', lambda text: None)
+    return log
+
+
+FIELDS = {'title': 'Informe', 'project_id': 'P1', 'assignee': 'U2', 'due_on': None, 'description': '',
+          'subtasks': [], 'metadata': {}, 'view_id': 'V1', 'user': 'U1'}
+
+
+def test_resubmitted_view_creates_one_task(submissions, monkeypatch):
+    created = []
+    monkeypatch.setattr(asana_client, 'create_asana_task', lambda **kwargs: created.append(kwargs) or
+                        {'gid': '111', 'url': 'https://app.asana.com/0/1/111', 'assignee_found': True})
+    main.process_task_submission(dict(FIELDS))
+    main.process_task_submission(dict(FIELDS))
+    assert len(created) == 1
+
+
+def test_failed_submission_can_be_retried(submissions, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError('asana down')
+
+    monkeypatch.setattr(asana_client, 'create_asana_task', fail)
+    main.process_task_submission(dict(FIELDS))
+    assert submissions.claim('V1')
+
+
+def completion(task_gid):
+    return {'action': 'changed', 'resource': {'gid': task_gid, 'resource_type': 'task'},
+            'change': {'field': 'completed', 'new_value': {'resource_subtype': 'completed'}},
+            'created_at': '2025-08-13T10:00:00Z'}
+
+
+def test_shutdown_saves_unprocessed_asana_events(tmp_path, monkeypatch):
+    from asana_events import AsanaEventWorker
+
+    worker = AsanaEventWorker(lambda task_gid, event: None)
+    # Un lote sin tomar y una notificación en el pool que no empezó
+    worker._queue.put([completion('1')])
+    worker._pending['job'] = ('2', completion('2'))
+    monkeypatch.setitem(main.state.__dict__, 'asana_event_worker', worker)
+
+    jobs = main.drain_asana_events()
+    assert jobs == [('asana_events', {'events': [completion('1')]}),
+                    ('task_completed', {'task_gid': '2', 'event': completion('2')})]
+    assert worker.qsize() == 0
+
+    # La notificación entregada a la próxima instancia ya no corre acá
+    notified = []
+    worker._on_task_completed = lambda task_gid, event: notified.append(task_gid)
+    worker._notify('job', '2', completion('2'))
+    assert notified == []
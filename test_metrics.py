@@ -0,0 +1,54 @@
+"""
+Outcome de las llamadas salientes (metrics.track_upstream): los errores de
+Slack vuelven con HTTP 200 y ok:false, y tienen que contar como error.
+"""
+
+import pytest
+
+import metrics
+from metrics import UPSTREAM_REQUESTS, track_upstream
+
+
+def outcome_count(outcome, method='test.method'):
+    return UPSTREAM_REQUESTS.value(service='test', method=method, outcome=outcome)
+
+
+def test_ok_body_counts_as_ok():
+    before = outcome_count('ok')
+    with track_upstream('test', 'test.method') as call:
+        call.status = 200
+        call.ok = True
+    assert outcome_count('ok') == before + 1
+
+
+def test_error_in_body_with_200_uses_the_error_code():
+    before = outcome_count('channel_not_found')
+    with track_upstream('test', 'test.method') as call:
+        call.status = 200
+        call.ok, call.error = False, 'channel_not_found'
+    assert outcome_count('channel_not_found') == before + 1
+
+
+def test_not_ok_without_error_code():
+    before = outcome_count('error')
+    with track_upstream('test', 'test.method') as call:
+        call.status = 200
+        call.ok = False
+    assert outcome_count('error') == before + 1
+
+
+def test_http_status_wins_over_body():
+    before = outcome_count('500')
+    with track_upstream('test', 'test.method') as call:
+        call.status = 500
+        call.ok, call.error = False, 'internal_error'
+    assert outcome_count('500') == before + 1
+
+
+def test_exception():
+    before = outcome_count('exception')
+    with pytest.raises(RuntimeError):
+        with track_upstream('test', 'test.method'):
+            raise RuntimeError('boom')
+    assert outcome_count('exception') == before + 1
+    assert metrics.render()
@@ -0,0 +1,108 @@
+"""
+Outbox de Slack (outbox.py): las claves de la 💡 van por gid de Asana, al
+borrar una tarea se descartan sus efectos pendientes, lo que no se entregó
+al apagar pasa a la próxima instancia con los jobs pendientes, y el archivo
+de una instancia muerta lo toma otra.
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+import outbox as outbox_module
+from outbox import SlackOutbox
+
+BULB = {'channel': 'C1', 'timestamp': '1.0', 'reaction': 'bulb'}
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    # Sin start(): add() lo arranca, así que el despachador no hace nada
+    box = SlackOutbox(str(tmp_path / 'outbox.json'), send=lambda method, params: 'retry')
+    box.start = lambda: None
+    return box
+
+
+def test_recreated_task_gets_its_own_bulb(outbox):
+    assert outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    outbox.drop_task('C1:1.0')
+    # Misma clave de mensaje, tarea nueva en Asana
+    assert outbox.add('222:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    assert not outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+
+
+def test_drop_task_removes_only_that_task(outbox):
+    outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    outbox.add('111:ephemeral', 'chat.postEphemeral', {'channel': 'C1', 'user': 'U1', 'text': 'x'}, task_key='C1:1.0')
+    outbox.add('333:bulb', 'reactions.add', dict(BULB, timestamp='2.0'), task_key='C1:2.0')
+    assert outbox.drop_task('C1:1.0') == 2
+    assert [entry['key'] for entry in outbox.drain()] == ['333:bulb']
+
+
+def test_drop_task_waits_for_an_entry_being_sent(outbox):
+    outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    outbox._in_flight.add('111:bulb')
+
+    def delivered():
+        with outbox._cond:
+            outbox._in_flight.discard('111:bulb')
+            outbox._entries.pop('111:bulb')
+            outbox._cond.notify_all()
+
+    threading.Timer(0.05, delivered).start()
+    assert outbox.drop_task('C1:1.0', timeout=2) == 0
+    assert outbox.pending() == 0
+
+
+def test_drained_entries_are_restored_once(outbox, tmp_path):
+    outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    entries = outbox.drain()
+    assert outbox.pending() == 0
+
+    other = SlackOutbox(str(tmp_path / 'other.json'))
+    other.start = lambda: None
+    assert other.restore(entries[0])
+    assert not other.restore(entries[0])
+    assert other.pending() == 1
+
+
+def test_drain_leaves_entries_being_sent(outbox):
+    outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    outbox.add('111:ephemeral', 'chat.postEphemeral', {'channel': 'C1', 'user': 'U1', 'text': 'x'}, task_key='C1:1.0')
+    outbox._in_flight.add('111:bulb')
+    assert [entry['key'] for entry in outbox.drain(timeout=0.05)] == ['111:ephemeral']
+    # Sigue en el archivo propio: no se entrega a la próxima instancia
+    assert outbox.pending() == 1
+
+
+def test_drain_waits_for_sends_in_progress(outbox):
+    outbox.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    outbox._in_flight.add('111:bulb')
+
+    def delivered():
+        with outbox._cond:
+            outbox._in_flight.discard('111:bulb')
+            outbox._cond.notify_all()
+
+    threading.Timer(0.05, delivered).start()
+    assert [entry['key'] for entry in outbox.drain(timeout=2)] == ['111:bulb']
+
+
+def test_files_of_dead_instances_are_claimed(tmp_path):
+    base = str(tmp_path / 'slack_outbox.json')
+    dead = SlackOutbox(base)
+    dead.start = lambda: None
+    dead.add('111:bulb', 'reactions.add', BULB, task_key='C1:1.0')
+    dead._writer.flush()
+
+    alive = SlackOutbox(base)
+    alive.start = lambda: None
+    # Todavía late: no se toca
+    assert alive.pending() == 0
+    assert alive.claim_stale(now=time.time() + outbox_module.OUTBOX_STALE_AFTER + 1) == 1
+    assert alive.pending() == 1
+    # Se toma con un rename: otra instancia ya no lo encuentra
+    assert not os.path.exists(dead._path)
+    assert not list(tmp_path.glob('*.claimed'))
@@ -0,0 +1,105 @@
+"""
+Límites de tasa (rate_limit.py): los aplican los helpers de cada cliente,
+no metrics.track_upstream; un 429 pausa el bucket por su Retry-After y el
+backfill reintenta la página del historial en lugar de abandonar el canal.
+"""
+
+import pytest
+
+import rate_limit
+import slack_helpers
+from metrics import track_upstream
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def slack_limit():
+    rate_limit.configure('slack', rate=1000, burst=1000)
+    yield
+    rate_limit.configure('slack', 0)
+
+
+def test_retry_after_header():
+    assert rate_limit.retry_after({'Retry-After': '7'}) == 7.0
+    assert rate_limit.retry_after({'Retry-After': 'soon'}) is None
+    assert rate_limit.retry_after({}) is None
+
+
+def test_track_upstream_does_not_take_tokens(slack_limit):
+    bucket = rate_limit.governor('slack')
+    before = bucket.reserve(0)
+    for _ in range(10):
+        with track_upstream('slack', 'reactions.add') as call:
+            call.status = 200
+    assert bucket.reserve(0) == before == 0.0
+
+
+def test_429_pauses_for_retry_after(slack_limit):
+    waited = rate_limit.after_response('slack', 'reactions.add', FakeResponse(429, headers={'Retry-After': '30'}))
+    assert waited == 30.0
+    assert rate_limit.reserve('slack', 'reactions.add') > 25
+
+
+def test_other_statuses_do_not_pause(slack_limit):
+    assert rate_limit.after_response('slack', 'reactions.add', FakeResponse(500)) is None
+    assert rate_limit.reserve('slack', 'reactions.add') == 0.0
+
+
+def test_slack_helpers_take_a_token_per_call(slack_limit, monkeypatch):
+    monkeypatch.setattr(slack_helpers.requests, 'request', lambda *args, **kwargs: FakeResponse(200, {'ok': True}))
+    acquired = []
+    monkeypatch.setattr(rate_limit, 'acquire', lambda service, method=None: acquired.append((service, method)))
+    slack_helpers.add_reaction('C1', '1.0', 'bulb')
+    assert acquired == [('slack', 'reactions.add')]
+
+
+def test_backfill_retries_a_rate_limited_history_page(tmp_path, monkeypatch):
+    import backfill
+
+    responses = [
+        FakeResponse(200, {'ok': True, 'messages': [{'ts': '3.0'}], 'has_more': True,
+                           'response_metadata': {'next_cursor': 'page2'}}),
+        FakeResponse(429, {'ok': False, 'error': 'ratelimited'}, {'Retry-After': '4'}),
+        FakeResponse(200, {'ok': True, 'messages': [{'ts': '2.0'}, {'ts': '1.0'}], 'has_more': False}),
+    ]
+    cursors = []
+
+    def request(method, url, params=None, **kwargs):
+        cursors.append(params.get('cursor'))
+        return responses.pop(0)
+
+    sleeps = []
+    monkeypatch.setattr(slack_helpers.requests, 'request', request)
+    monkeypatch.setattr(backfill.time, 'sleep', sleeps.append)
+
+    job = backfill.Backfill([], checkpoint_path=str(tmp_path / 'checkpoint.json'))
+    progress = backfill.ChannelProgress('C1', {})
+    job._fetch(progress)
+
+    assert cursors == [None, 'page2', 'page2']
+    assert sleeps == [4.0]
+    assert [job._messages.get_nowait()[2]['ts'] for _ in range(3)] == ['3.0', '2.0', '1.0']
+    assert progress.fetched_all
+    assert job.stats['rate_limited'] == 1
+
+
+def test_backfill_gives_up_after_repeated_429s(tmp_path, monkeypatch):
+    import backfill
+
+    monkeypatch.setattr(slack_helpers.requests, 'request',
+                        lambda *args, **kwargs: FakeResponse(429, {'ok': False}, {'Retry-After': '1'}))
+    monkeypatch.setattr(backfill.time, 'sleep', lambda seconds: None)
+
+    job = backfill.Backfill([], checkpoint_path=str(tmp_path / 'checkpoint.json'))
+    with pytest.raises(slack_helpers.SlackRateLimited):
+        job._fetch(backfill.ChannelProgress('C1', {}))
+    assert job.stats['rate_limited'] == backfill.HISTORY_RETRIES
@@ -0,0 +1,74 @@
+"""
+Sync tokens del reconciler (reconciler.SyncTokenStore): van en STATE_DIR y
+sobreviven al reinicio, así un arranque en frío no relista cada proyecto.
+"""
+
+import importlib
+
+import persistence
+import reconciler
+from reconciler import SyncTokenStore
+
+
+def test_sync_tokens_default_to_state_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv('ASANA_SYNC_TOKENS_FILE', raising=False)
+    monkeypatch.setattr(persistence, 'STATE_DIR', str(tmp_path))
+    try:
+        assert importlib.reload(reconciler).SYNC_TOKENS_FILE == str(tmp_path / 'asana_sync_tokens.json')
+    finally:
+        monkeypatch.undo()
+        importlib.reload(reconciler)
+
+
+def test_sync_tokens_survive_restart(tmp_path):
+    path = str(tmp_path / 'asana_sync_tokens.json')
+    SyncTokenStore(path).update({'P1': 'token-1', 'P2': 'token-2'}, keep={'P1'})
+
+    restarted = SyncTokenStore(path)
+    assert restarted.get('P1') == 'token-1'
+    assert restarted.get('P2') is None
+
+
+class FakeTokens:
+    def __init__(self, tokens=None):
+        self.tokens = dict(tokens or {})
+
+    def get(self, project_id):
+        return self.tokens.get(project_id)
+
+    def update(self, tokens, keep):
+        self.tokens.update(tokens)
+
+
+TASKS = [
+    {'asana_gid': '1', 'project_id': 'P1'},
+    {'asana_gid': '2', 'project_id': 'P1', 'completed_at': 1700000000.0},
+    {'asana_gid': '3', 'project_id': 'P1'},
+]
+
+
+def run_reconcile(monkeypatch, tokens, events=None):
+    import asana_client
+    monkeypatch.setattr(asana_client, 'get_project_events', lambda project_id, sync=None: (events, 'token-2', False))
+    monkeypatch.setattr(asana_client, 'get_project_tasks', lambda project_id: [
+        {'gid': '1', 'completed': True}, {'gid': '2', 'completed': True}, {'gid': '3', 'completed': False}])
+    notified, marked = [], []
+    job = reconciler.Reconciler(lambda: TASKS, lambda gid, event: notified.append(gid), lambda gid: None,
+                                interval=0, tokens=FakeTokens(tokens), on_task_marked_completed=marked.append)
+    stats = job.run_once()
+    return notified, marked, stats
+
+
+def test_first_sync_marks_completed_tasks_silently(monkeypatch):
+    notified, marked, stats = run_reconcile(monkeypatch, tokens={})
+    assert notified == []
+    assert marked == ['1']
+    assert stats['marked_completed'] == 1
+
+
+def test_resync_after_an_expired_token_notifies(monkeypatch):
+    # events None = el token venció
+    notified, marked, stats = run_reconcile(monkeypatch, tokens={'P1': 'old'}, events=None)
+    assert notified == ['1']
+    assert marked == []
+    assert stats['completed'] == 1
@@ -0,0 +1,34 @@
+"""
+setup_asana_webhooks.main: el token de handshake solo hace falta para crear
+webhooks; --list y --dry-run corren sin él.
+"""
+
+import pytest
+
+import setup_asana_webhooks
+
+
+@pytest.fixture
+def synced(monkeypatch):
+    monkeypatch.delenv('ASANA_WEBHOOK_HANDSHAKE_TOKEN', raising=False)
+    monkeypatch.setattr(setup_asana_webhooks, 'ASANA_PAT', 'pat')
+    calls = []
+    monkeypatch.setattr(setup_asana_webhooks, 'sync_webhooks', lambda args: calls.append(args) or 0)
+    return calls
+
+
+@pytest.mark.parametrize('argv', [['--list'], ['--sync', '--dry-run'], ['--recreate', '--dry-run']])
+def test_read_only_modes_do_not_need_the_token(synced, argv):
+    assert setup_asana_webhooks.main(argv) == 0
+    assert len(synced) == 1
+
+
+@pytest.mark.parametrize('argv', [['--sync'], ['--recreate'], ['--prune'], ['--list', '--sync']])
+def test_creating_webhooks_needs_the_token(synced, argv):
+    assert setup_asana_webhooks.main(argv) == 1
+    assert synced == []
+
+
+def test_token_present(synced, monkeypatch):
+    monkeypatch.setenv('ASANA_WEBHOOK_HANDSHAKE_TOKEN', 'secret')
+    assert setup_asana_webhooks.main(['--sync']) == 0
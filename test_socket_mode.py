@@ -0,0 +1,106 @@
+"""
+Socket Mode (socket_mode.SocketModeRunner) contra el stand-in local de
+benchmarks/mock_socket_mode.py: ack antes de despachar, manejo de
+envelopes, descarte sin parsear y reconexión.
+"""
+
+import threading
+
+import pytest
+
+import main
+import socket_mode
+from benchmarks import mock_socket_mode
+
+
+def message(subtype=None, text='mañana mando el informe'):
+    event = {'type': 'message', 'channel': 'C1', 'user': 'U1', 'text': text, 'ts': '1.0'}
+    if subtype:
+        event['subtype'] = subtype
+    return {'type': 'event_callback', 'event_id': 'Ev1', 'event': event}
+
+
+class Dispatched:
+    """dispatch que registra los payloads y puede quedar bloqueado"""
+
+    def __init__(self):
+        self.payloads = []
+        self.release = threading.Event()
+        self.release.set()
+        self._cond = threading.Condition()
+
+    def __call__(self, payload):
+        with self._cond:
+            self.payloads.append(payload)
+            self._cond.notify_all()
+        self.release.wait(10)
+
+    def wait(self, count, timeout=10):
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self.payloads) >= count, timeout)
+
+
+@pytest.fixture
+def socket(monkeypatch):
+    server, socket_state, ws_url = mock_socket_mode.start()
+    dispatched = Dispatched()
+    runner = socket_mode.SocketModeRunner(app_token='xapp-test', workers=2, dispatch=dispatched, router=main.router)
+    monkeypatch.setattr(runner, 'open_connection_url', lambda: ws_url)
+    runner.start()
+    thread = threading.Thread(target=runner.run_forever, daemon=True)
+    thread.start()
+    socket_state.wait_connected(timeout=10)
+    yield socket_state, dispatched
+    dispatched.release.set()
+    runner.stop()
+    thread.join(5)
+    server.shutdown()
+    server.server_close()
+
+
+def test_ack_is_sent_before_dispatch_finishes(socket):
+    socket_state, dispatched = socket
+    dispatched.release.clear()
+    envelope_id = socket_state.send_event(message())
+
+    assert socket_state.wait_acks(1, timeout=10)
+    assert envelope_id in socket_state.acks
+    assert dispatched.wait(1)
+    # El handler sigue bloqueado y el ack ya llegó
+    assert not dispatched.release.is_set()
+    assert dispatched.payloads == [message()]
+
+
+def test_envelopes_without_events_are_acked_not_dispatched(socket):
+    socket_state, dispatched = socket
+    socket_state.send_event({'command': '/tarea'}, envelope_type='slash_commands')
+    socket_state.send_event(message(text='evento'))
+
+    assert socket_state.wait_acks(2, timeout=10)
+    assert dispatched.wait(1)
+    assert dispatched.payloads == [message(text='evento')]
+
+
+def test_unhandled_events_are_acked_and_dropped_before_parsing(socket):
+    socket_state, dispatched = socket
+    dropped = socket_state.send_event(message(subtype='channel_join'))
+    bot = message()
+    bot['event']['bot_id'] = 'B1'
+    socket_state.send_event(bot)
+    socket_state.send_event(message(text='humano'))
+
+    assert socket_state.wait_acks(3, timeout=10)
+    assert dropped in socket_state.acks
+    assert dispatched.wait(1)
+    assert dispatched.payloads == [message(text='humano')]
+
+
+def test_reconnects_when_slack_asks(socket):
+    socket_state, dispatched = socket
+    socket_state.request_reconnect()
+    socket_state.wait_connected(connects=2, timeout=10)
+
+    envelope_id = socket_state.send_event(message())
+    assert socket_state.wait_acks(1, timeout=10)
+    assert envelope_id in socket_state.acks
+    assert dispatched.wait(1)
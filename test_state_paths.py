@@ -0,0 +1,48 @@
+"""
+El estado que tiene que sobrevivir a la instancia va por defecto a STATE_DIR
+(persistence.state_path). Se importa en un proceso aparte para que los
+defaults se calculen con STATE_DIR definido.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# constante -> (variable de entorno que la pisa, nombre bajo STATE_DIR)
+DURABLE = {
+    'task_archive.TASK_ARCHIVE_DIR': ('TASK_ARCHIVE_DIR', 'task_archive'),
+    'event_log.EVENT_LOG_DIR': ('TASK_EVENT_LOG_DIR', 'task_events'),
+    'outbox.OUTBOX_FILE': ('SLACK_OUTBOX_FILE', 'slack_outbox.json'),
+    'main.task_mapping_file': ('TASK_MAPPING_FILE', 'task_mapping.json'),
+}
+
+
+@pytest.fixture(scope='module')
+def defaults(tmp_path_factory):
+    state_dir = str(tmp_path_factory.mktemp('state'))
+    code = (
+        "import importlib, json, sys\n"
+        "out = {}\n"
+        "for name in sys.argv[1:]:\n"
+        "    module, attr = name.rsplit('.', 1)\n"
+        "    out[name] = getattr(importlib.import_module(module), attr)\n"
+        "print(json.dumps(out))\n"
+    )
+    env = {k: v for k, v in os.environ.items() if k != 'K_SERVICE'}
+    env.update(STATE_DIR=state_dir, PYTHONPATH=HERE)
+    for variable, _ in DURABLE.values():
+        env.pop(variable, None)
+    result = subprocess.run([sys.executable, '-c', code, *DURABLE], env=env, cwd=str(tmp_path_factory.mktemp('cwd')),
+                            capture_output=True, text=True, check=True)
+    return state_dir, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('name', DURABLE)
+def test_durable_default_is_under_state_dir(defaults, name):
+    state_dir, values = defaults
+    assert values[name] == os.path.join(state_dir, DURABLE[name][1])
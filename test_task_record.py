@@ -0,0 +1,61 @@
+"""
+TaskRecord (task_record.py) se comporta como el dict que reemplaza: una
+clave guardada con None está, una que nunca se guardó no.
+"""
+
+import json
+
+import pytest
+
+from task_record import TaskRecord, json_default
+
+ENTRY = {
+    'asana_gid': '111',
+    'channel': 'C1',
+    'message_ts': '1712345678.000100',
+    'user_who_posted': 'U1',
+    'created_at': 1712345678.5,
+    'can_be_cancelled': False,
+    'thread_ts': None,
+    'custom': 'x',
+    'custom_none': None,
+}
+
+
+@pytest.mark.parametrize('key', list(ENTRY) + ['task_name', 'completed_at', 'missing'])
+def test_matches_dict_semantics(key):
+    record = TaskRecord.from_dict(ENTRY)
+    assert (key in record) == (key in ENTRY)
+    assert record.get(key) == ENTRY.get(key)
+    assert record.get(key, 'default') == ENTRY.get(key, 'default')
+    if key in ENTRY:
+        assert record[key] == ENTRY[key]
+    else:
+        with pytest.raises(KeyError):
+            record[key]
+
+
+def test_false_values_are_kept():
+    record = TaskRecord.from_dict(ENTRY)
+    assert record.get('can_be_cancelled', True) is False
+
+
+def test_setting_none_keeps_the_key():
+    record = TaskRecord.from_dict({'asana_gid': '111'})
+    record['completed_at'] = None
+    assert 'completed_at' in record
+    assert record.get('completed_at', 'default') is None
+
+
+def test_attribute_assignment_counts_as_present():
+    record = TaskRecord.from_dict({'asana_gid': '111'})
+    record.task_name = 'Informe'
+    assert 'task_name' in record
+    assert record['task_name'] == 'Informe'
+
+
+def test_round_trip_keeps_none_values():
+    record = TaskRecord.from_dict(ENTRY)
+    assert record.to_dict() == ENTRY
+    assert json.loads(json.dumps({'k': record}, default=json_default)) == {'k': ENTRY}
+    assert TaskRecord.from_dict(record.to_dict()) == record
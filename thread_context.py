@@ -0,0 +1,108 @@
+"""
+Contexto de hilos de Slack para la evaluación de compromisos.
+
+Guarda en memoria los últimos THREAD_CONTEXT_MESSAGES mensajes de cada hilo,
+tomados de los eventos que ya llegan (sin llamar a conversations.replies).
+Así una respuesta como "dale, lo hago mañana" llega al LLM junto con el
+mensaje que la originó.
+
+Los hilos se desalojan por LRU cuando el tamaño estimado supera
+THREAD_CONTEXT_MAX_BYTES. El mensaje raíz se guarda con su propio ts como
+clave, que es el thread_ts que traen después las respuestas, y no se
+descarta aunque el hilo tenga más de THREAD_CONTEXT_MESSAGES respuestas:
+suele ser el que dice cuál es la tarea.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+
+import metrics
+
+THREAD_CONTEXT_MESSAGES = int(os.getenv('THREAD_CONTEXT_MESSAGES', '10'))
+THREAD_CONTEXT_MAX_BYTES = int(os.getenv('THREAD_CONTEXT_MAX_BYTES', str(8 * 1024 * 1024)))
+# Texto máximo por mensaje que se guarda (y se manda al LLM)
+MAX_TEXT_CHARS = 500
+
+# Overhead aproximado de un hilo (clave + entrada + deque) y de cada mensaje (tupla)
+_THREAD_OVERHEAD = sys.getsizeof(deque()) + sys.getsizeof(('C', 'ts')) + sys.getsizeof([None, None]) + 100
+_MESSAGE_OVERHEAD = sys.getsizeof((None, None, None))
+
+
+def _message_size(message):
+    return _MESSAGE_OVERHEAD + sum(sys.getsizeof(value) for value in message)
+
+
+class ThreadContextCache:
+    def __init__(self, max_messages=THREAD_CONTEXT_MESSAGES, max_bytes=THREAD_CONTEXT_MAX_BYTES):
+        self._max_messages = max_messages
+        self._max_bytes = max_bytes
+        # (channel, thread_ts) -> [raíz (ts, user, text) o None,
+        #                          deque de respuestas, de la más antigua a la más reciente]
+        self._threads = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._threads)
+
+    def size_bytes(self):
+        return self._bytes
+
+    def record(self, event):
+        """Agrega el mensaje al hilo al que pertenece (o al que inicia)"""
+        channel = event.get('channel')
+        ts = event.get('ts')
+        text = event.get('text')
+        if not channel or not ts or not text:
+            return
+        key = (channel, event.get('thread_ts') or ts)
+        message = (ts, event.get('user'), text[:MAX_TEXT_CHARS])
+        size = _message_size(message)
+
+        with self._lock:
+            entry = self._threads.get(key)
+            if entry is None:
+                entry = self._threads[key] = [None, deque(maxlen=self._max_messages)]
+                self._sizes[key] = _THREAD_OVERHEAD
+                self._bytes += _THREAD_OVERHEAD
+            else:
+                self._threads.move_to_end(key)
+            if key[1] == ts:
+                if entry[0] is not None:
+                    size -= _message_size(entry[0])
+                entry[0] = message
+            else:
+                replies = entry[1]
+                if len(replies) == self._max_messages:
+                    size -= _message_size(replies[0])
+                replies.append(message)
+            self._sizes[key] += size
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self._max_bytes and len(self._threads) > 1:
+            key, _ = self._threads.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+
+    def context_for(self, event):
+        """
+        Mensajes anteriores del hilo de una respuesta, como
+        [(ts, user, text)]; vacío si no es respuesta o el hilo no está.
+        """
+        thread_ts = event.get('thread_ts')
+        if not thread_ts or thread_ts == event.get('ts'):
+            return []
+        key = (event.get('channel'), thread_ts)
+        messages = None
+        with self._lock:
+            entry = self._threads.get(key)
+            if entry is not None:
+                self._threads.move_to_end(key)
+                root, replies = entry
+                messages = ([root] if root else []) + [m for m in replies if m[0] != event.get('ts')]
+        metrics.record_cache('thread_context', hit=messages is not None)
+        return messages or []
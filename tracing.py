@@ -0,0 +1,117 @@
+"""
+Tracing local, sin colector externo.
+
+Cada evento de Slack abre un trace; los spans hijos cubren la evaluación
+del LLM, la creación de la tarea y cada llamada saliente. El contexto viaja
+en un ContextVar y se propaga a los threads de background con `wrap()`.
+
+Los spans terminados quedan en un ring buffer en memoria (expuesto en
+/debug/traces) y, si TRACE_FILE está definido, se agregan como líneas
+JSON a ese archivo.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+
+TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '2000'))
+TRACE_FILE = os.getenv('TRACE_FILE')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_finished = deque(maxlen=TRACE_BUFFER_SIZE)
+_file_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start', 'end', 'attrs', 'error', '_token')
+
+    def __init__(self, name, parent=None, **attrs):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = None
+        self.end = None
+        self.attrs = attrs
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.start = time.time()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        _export(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round((self.end - self.start) * 1000, 3),
+            'attrs': self.attrs,
+            'error': self.error,
+        }
+
+
+def span(name, **attrs):
+    """Context manager: span hijo del actual, o raíz de un trace nuevo"""
+    return Span(name, _current_span.get(), **attrs)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def wrap(func):
+    """Devuelve func atada al contexto actual, para pasarla a un Thread"""
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return ctx.run(func, *args, **kwargs)
+    return run
+
+
+def _export(finished_span):
+    data = finished_span.to_dict()
+    _finished.append(data)
+    if TRACE_FILE:
+        line = json.dumps(data, ensure_ascii=False, default=str)
+        with _file_lock:
+            with open(TRACE_FILE, 'a') as f:
+                f.write(line + '\n')
+
+
+def recent_traces(limit=20, trace_id=None):
+    """Agrupa los spans del buffer por trace, los más recientes primero"""
+    traces = {}
+    for data in reversed(list(_finished)):
+        if trace_id and data['trace_id'] != trace_id:
+            continue
+        traces.setdefault(data['trace_id'], []).append(data)
+    result = []
+    for tid, spans in list(traces.items())[:limit]:
+        spans.sort(key=lambda s: s['start'])
+        start = spans[0]['start']
+        end = max(s['start'] + s['duration_ms'] / 1000 for s in spans)
+        result.append({
+            'trace_id': tid,
+            'duration_ms': round((end - start) * 1000, 3),
+            'spans': spans,
+        })
+    return result
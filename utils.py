@@ -1,4 +1,4 @@
-import requests, json, logging
+import logging
 # import firebase_service
 
 # ACCESO = firebase_service.acces_firebase_db()
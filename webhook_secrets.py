@@ -0,0 +1,154 @@
+"""
+Secretos de los webhooks de Asana.
+
+Asana envía un `X-Hook-Secret` una sola vez, durante el handshake, y luego
+firma cada entrega con HMAC-SHA256 de ese secreto en `X-Hook-Signature`.
+Los secretos se guardan por webhook (identificado por el parámetro
+`resource` de la URL de destino) para poder verificar cada payload antes
+de hacer cualquier trabajo.
+
+El handshake es lo único que escribe un secreto, así que solo se acepta
+mientras el webhook se está creando: setup_asana_webhooks.py pone en la URL
+de destino un `token` firmado con ASANA_WEBHOOK_HANDSHAKE_TOKEN (obligatorio)
+que vence a los HANDSHAKE_WINDOW segundos, y cada token se usa una sola vez
+por webhook. Sin eso, cualquiera con un POST y un `X-Hook-Secret` podría
+reemplazar el secreto y firmar sus propias entregas.
+
+El archivo va en STATE_DIR (persistence.state_path): si se pierde, toda
+entrega falla la verificación y Asana termina desactivando los webhooks.
+Varias instancias pueden compartirlo: una entrega que no verifica vuelve a
+leer el archivo si cambió, y cada handshake se mezcla con lo que haya en
+disco. Si aun así se perdieron los secretos, la salida es un handshake nuevo
+de cada webhook: `python setup_asana_webhooks.py --recreate`.
+"""
+
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from persistence import atomic_write_json, state_path
+
+WEBHOOK_SECRETS_FILE = os.getenv('ASANA_WEBHOOK_SECRETS_FILE') or state_path('asana_webhook_secrets.json')
+# Clave con la que se firman los tokens de handshake; sin ella se rechazan todos
+HANDSHAKE_TOKEN = os.getenv('ASANA_WEBHOOK_HANDSHAKE_TOKEN')
+# Segundos que tiene Asana para hacer el handshake desde que se arma la URL
+HANDSHAKE_WINDOW = int(os.getenv('ASANA_WEBHOOK_HANDSHAKE_WINDOW', '300'))
+
+DEFAULT_WEBHOOK_ID = 'default'
+
+
+class WebhookSecretStore:
+    """Diccionario webhook_id -> secreto, persistido en un archivo JSON"""
+
+    def __init__(self, path=WEBHOOK_SECRETS_FILE):
+        self._path = path
+        self._lock = threading.Lock()
+        self._secrets = {}
+        # webhook_id -> vencimiento del último token de handshake aceptado
+        self._handshakes = {}
+        self._mtime = None
+        self._load()
+        if not self._secrets:
+            logging.warning(f"⚠️ No Asana webhook secrets in {path}: deliveries will fail verification until "
+                            "a new handshake (python setup_asana_webhooks.py --recreate)")
+
+    def _load(self):
+        """Lee el archivo si cambió desde la última lectura"""
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self._path, 'r') as f:
+                saved = json.load(f)
+        except json.JSONDecodeError:
+            logging.error(f"❌ {self._path} contains invalid JSON, keeping the webhook secrets in memory")
+            return
+        self._mtime = mtime
+        for webhook_id, entry in saved.items():
+            # Formato viejo: webhook_id -> secreto
+            if isinstance(entry, str):
+                entry = {'secret': entry}
+            # Gana el handshake más nuevo entre memoria y disco
+            if entry.get('handshake', 0) >= self._handshakes.get(webhook_id, 0):
+                self._secrets[webhook_id] = entry['secret'].encode()
+                self._handshakes[webhook_id] = entry.get('handshake', 0)
+
+    def __len__(self):
+        return len(self._secrets)
+
+    def __contains__(self, webhook_id):
+        return webhook_id in self._secrets
+
+    def handshake(self, webhook_id, secret, token, now=None):
+        """
+        Guarda el secreto de un handshake si `token` es un token de creación
+        válido y vigente para este webhook que no se usó antes; devuelve si
+        lo aceptó
+        """
+        expires = handshake_expiry(webhook_id, token, now)
+        if expires is None:
+            return False
+        with self._lock:
+            self._load()
+            if expires <= self._handshakes.get(webhook_id, 0):
+                return False
+            self._secrets[webhook_id] = secret.encode()
+            self._handshakes[webhook_id] = expires
+            atomic_write_json(self._path, {
+                webhook_id: {'secret': value.decode(), 'handshake': self._handshakes.get(webhook_id, 0)}
+                for webhook_id, value in self._secrets.items()
+            }, indent=2)
+            self._mtime = os.stat(self._path).st_mtime_ns
+        return True
+
+    def verify(self, webhook_id, body, signature):
+        """Verifica la firma HMAC-SHA256 del body crudo de una entrega"""
+        if not signature:
+            return False
+        if self._matches(webhook_id, body, signature):
+            return True
+        # El handshake pudo haberlo recibido otra instancia
+        with self._lock:
+            self._load()
+        return self._matches(webhook_id, body, signature)
+
+    def _matches(self, webhook_id, body, signature):
+        secret = self._secrets.get(webhook_id)
+        if secret is None:
+            return False
+        expected = hmac.new(secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+
+def _sign(key, webhook_id, expires):
+    message = f"{webhook_id}:{expires}".encode()
+    return hmac.new(key.encode(), message, hashlib.sha256).hexdigest()
+
+
+def handshake_token(webhook_id, now=None, key=None):
+    """Token para la URL de un webhook que se va a crear ahora ("<vence>.<firma>")"""
+    key = key or HANDSHAKE_TOKEN
+    if not key:
+        raise RuntimeError("ASANA_WEBHOOK_HANDSHAKE_TOKEN is required to create Asana webhooks")
+    expires = int((now or time.time()) + HANDSHAKE_WINDOW)
+    return f"{expires}.{_sign(key, webhook_id, expires)}"
+
+
+def handshake_expiry(webhook_id, token, now=None):
+    """Vencimiento del token si es válido y vigente para el webhook; si no, None"""
+    if not HANDSHAKE_TOKEN:
+        logging.error("❌ ASANA_WEBHOOK_HANDSHAKE_TOKEN is not set: Asana webhook handshakes are rejected")
+        return None
+    expires, _, signature = (token or '').partition('.')
+    if not expires.isdigit() or int(expires) < (now or time.time()):
+        return None
+    if not hmac.compare_digest(_sign(HANDSHAKE_TOKEN, webhook_id, int(expires)), signature):
+        return None
+    return int(expires)